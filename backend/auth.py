@@ -1,16 +1,123 @@
+import hashlib
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import jwt
 from fastapi import Header, HTTPException, Depends
-from supabase import Client
-from db import supabase
+from fastapi.concurrency import run_in_threadpool
+from db import get_async_supabase
+from cache import TTLCache
+
+# Supabase access tokens are JWTs, so we verify signature and expiry locally
+# instead of asking the auth server on every request. Legacy projects sign with
+# the shared HS256 secret (SUPABASE_JWT_SECRET); projects on asymmetric keys are
+# verified against the project's JWKS, which PyJWKClient caches.
+JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWKS_URL = os.getenv("SUPABASE_JWKS_URL") or (
+    f"{os.environ['SUPABASE_URL'].rstrip('/')}/auth/v1/.well-known/jwks.json" if os.getenv("SUPABASE_URL") else None
+)
+# Fall back to supabase.auth.get_user() when local verification fails. On by
+# default while no secret is configured, so HS256 projects keep working after
+# an upgrade until SUPABASE_JWT_SECRET is set.
+REMOTE_FALLBACK = os.getenv("AUTH_REMOTE_FALLBACK", "false" if JWT_SECRET else "true").lower() in ("1", "true", "yes")
+if not JWT_SECRET:
+    print("SUPABASE_JWT_SECRET is not set: HS256 tokens "
+          + ("are checked with the auth server on every request" if REMOTE_FALLBACK else "will be rejected"))
+
+_verified_tokens = TTLCache(maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096")), ttl=3600, name="auth_tokens")
+_jwks_client: Optional[jwt.PyJWKClient] = None
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    """The subset of a Supabase user the routers rely on, built from JWT claims."""
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    claims: Dict[str, Any] = field(default_factory=dict, compare=False, repr=False)
+
+
+def _token_key(token: str) -> str:
+    # Never keep raw bearer tokens around as cache keys
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _signing_key(token: str, alg: str):
+    global _jwks_client
+    if alg.startswith("HS"):
+        if not JWT_SECRET:
+            raise jwt.InvalidTokenError("SUPABASE_JWT_SECRET is not configured")
+        return JWT_SECRET
+    if not JWKS_URL:
+        raise jwt.InvalidTokenError("No JWKS URL configured")
+    if _jwks_client is None:
+        _jwks_client = jwt.PyJWKClient(JWKS_URL, cache_keys=True, lifespan=3600)
+    return _jwks_client.get_signing_key_from_jwt(token).key
+
+
+def verify_token(token: str) -> AuthUser:
+    """
+    Verifies a Supabase access token locally and returns its user.
+
+    Successful results are cached (keyed by token hash) until the token's own
+    `exp`, so repeat requests with the same token skip the crypto as well.
+    """
+    key = _token_key(token)
+    user = _verified_tokens.get(key)
+    if user is not None:
+        return user
+    return _verify_uncached(token, key)
+
+
+def _verify_uncached(token: str, key: str) -> AuthUser:
+    alg = jwt.get_unverified_header(token).get("alg", "")
+    if alg not in ("HS256", "RS256", "ES256"):
+        raise jwt.InvalidTokenError(f"Unsupported token algorithm: {alg}")
+
+    claims = jwt.decode(
+        token,
+        _signing_key(token, alg),
+        algorithms=[alg],
+        audience=JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+    user = AuthUser(id=claims["sub"], email=claims.get("email"), role=claims.get("role"), claims=claims)
+    _verified_tokens.set(key, user, ttl=claims["exp"] - time.time())
+    return user
+
+
+def token_cache_stats() -> Dict[str, Any]:
+    return _verified_tokens.stats()
+
 
 async def get_current_user(authorization: str = Header(None)):
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authentication Token")
-    
+
+    token = authorization.replace("Bearer ", "")
+    try:
+        key = _token_key(token)
+        user = _verified_tokens.get(key)
+        if user is None:
+            # A JWKS refresh is blocking I/O, so first sightings verify off the loop
+            user = await run_in_threadpool(_verify_uncached, token, key)
+        return user
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Authentication Token expired")
+    except Exception as e:
+        if not REMOTE_FALLBACK:
+            raise HTTPException(status_code=401, detail=str(e))
+
     try:
-        token = authorization.replace("Bearer ", "")
-        user = supabase.auth.get_user(token)
+        db = await get_async_supabase()
+        user = await db.auth.get_user(token)
         if not user:
              raise HTTPException(status_code=401, detail="Invalid Authentication Token")
         return user.user
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
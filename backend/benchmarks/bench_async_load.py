@@ -0,0 +1,198 @@
+"""
+Load test of the read endpoints against a local PostgREST stand-in.
+
+Starts a fake PostgREST with injected latency in a child process, serves the
+app with uvicorn in this one, and drives GET /api/recipes/ and
+GET /api/meal-plans/ from N concurrent simulated users for a fixed duration.
+The users run in separate load processes (LOAD_USERS_PER_PROCESS each), so
+neither the client nor the fake competes with the app for its GIL.
+
+Every step runs twice: against the async routes, and against the sync
+reference below (the same reads as `def` routes on the sync client, the way
+the routers served them before), so the two paths are compared under the
+same load. The listing cache is disabled and each meal-plan request asks for
+a different week, so every request reaches PostgREST.
+
+    python benchmarks/bench_async_load.py [latency_ms] [users ...]
+"""
+import asyncio
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import jwt
+import uvicorn
+
+from fake_servers import FakePostgrest
+
+DURATION_S = 5.0
+LOAD_USERS_PER_PROCESS = 50
+JWT_SECRET = "bench-secret-bench-secret-bench-secret"
+PATHS = {"async": "/api", "sync": "/sync"}
+
+
+def serve_fake(latency_s, user_id, conn):
+    with FakePostgrest(latency_s=latency_s, user_id=user_id) as fake:
+        conn.send(fake.url)
+        conn.recv()
+
+
+def sync_router():
+    """The listing reads as `def` routes on the sync client; each request holds a threadpool worker."""
+    from datetime import date
+    from typing import Optional
+    from fastapi import APIRouter, Depends, Header
+    from auth import get_current_user
+    from db import get_supabase
+    from serialization import meal_plans_response, recipes_response
+    import pagination
+
+    router = APIRouter(prefix="/sync")
+
+    @router.get("/recipes/")
+    def get_recipes(current_user: dict = Depends(get_current_user), authorization: Optional[str] = Header(None)):
+        query = get_supabase().table("recipes")
+        query.headers = {**query.headers, "authorization": authorization}
+        rows = query.select("*, recipe_ingredients(amount_g, ingredients(*))").eq("user_id", current_user.id)\
+            .order("usage_count", desc=True).order("id").limit(pagination.DEFAULT_PAGE_SIZE + 1).execute().data
+        return recipes_response(rows[:pagination.DEFAULT_PAGE_SIZE])
+
+    @router.get("/meal-plans/")
+    def get_meal_plans(start_date: date, end_date: date, current_user: dict = Depends(get_current_user),
+                       authorization: Optional[str] = Header(None)):
+        query = get_supabase().table("meal_plans")
+        query.headers = {**query.headers, "authorization": authorization}
+        rows = query.select("*, recipe:recipes(*, recipe_ingredients(amount_g, ingredients(*)))")\
+            .eq("user_id", current_user.id).gte("date", start_date).lte("date", end_date).order("date").execute().data
+        return meal_plans_response(rows)
+
+    return router
+
+
+def start_app():
+    from main import app
+    app.include_router(sync_router())
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}"
+
+
+def paths_for(prefix, i):
+    # A different week of the fixture month per request
+    day = i % 22 + 1
+    return (f"{prefix}/recipes/" if i % 2 == 0
+            else f"{prefix}/meal-plans/?start_date=2026-02-{day:02d}&end_date=2026-02-{day + 6:02d}")
+
+
+async def run_users(base_url, token, prefix, first_user, users, conn):
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        conn.send("ready")
+        start_at = conn.recv()
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        stop_at = time.perf_counter() + DURATION_S
+
+        async def user(n):
+            nonlocal errors
+            i = n
+            while time.perf_counter() < stop_at:
+                start = time.perf_counter()
+                try:
+                    res = await client.get(paths_for(prefix, i))
+                    if res.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+                i += 1
+
+        await asyncio.gather(*(user(first_user + n) for n in range(users)))
+    return latencies, errors
+
+
+def drive(base_url, token, prefix, first_user, users, conn):
+    conn.send(asyncio.run(run_users(base_url, token, prefix, first_user, users, conn)))
+
+
+def run_step(ctx, base_url, token, prefix, users):
+    """Splits `users` over load processes, starts them together and merges their results."""
+    workers = []
+    for p in range(math.ceil(users / LOAD_USERS_PER_PROCESS)):
+        count = min(LOAD_USERS_PER_PROCESS, users - p * LOAD_USERS_PER_PROCESS)
+        parent, child = ctx.Pipe()
+        proc = ctx.Process(target=drive, args=(base_url, token, prefix, p * LOAD_USERS_PER_PROCESS, count, child),
+                           daemon=True)
+        proc.start()
+        workers.append((proc, parent))
+    for _, conn in workers:
+        conn.recv()
+    start_at = time.time() + 0.2
+    for _, conn in workers:
+        conn.send(start_at)
+
+    latencies, errors = [], 0
+    for proc, conn in workers:
+        lat, err = conn.recv()
+        latencies += lat
+        errors += err
+        proc.join()
+    latencies.sort()
+    if not latencies:
+        return 0.0, 0.0, 0.0, errors
+    return (len(latencies) / DURATION_S, latencies[len(latencies) // 2] * 1e3,
+            latencies[int(len(latencies) * 0.99)] * 1e3, errors)
+
+
+def main():
+    latency_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    user_counts = [int(a) for a in sys.argv[2:]] or [1, 10, 100, 200]
+
+    user_id = str(uuid.uuid4())
+    parent, child = multiprocessing.Pipe()
+    fake = multiprocessing.Process(target=serve_fake, args=(latency_ms / 1000.0, user_id, child), daemon=True)
+    fake.start()
+
+    os.environ["SUPABASE_URL"] = parent.recv()
+    os.environ["SUPABASE_KEY"] = "bench-anon-key"
+    os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    # Measure the request path, not listing-cache hits
+    os.environ["LISTING_CACHE_SIZE"] = "0"
+    token = jwt.encode({"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 3600},
+                       JWT_SECRET, algorithm="HS256")
+    server, base_url = start_app()
+    # Load processes start fresh rather than forking this one's server threads
+    ctx = multiprocessing.get_context("spawn")
+
+    print(f"Fake PostgREST latency {latency_ms:.0f} ms, {DURATION_S:.0f}s per step, "
+          f"{LOAD_USERS_PER_PROCESS} users per load process")
+    print(f"{'':>6} {'async':^37} {'sync':^37}")
+    print(f"{'users':>6}" + f" {'req/s':>9} {'p50':>9} {'p99':>9} {'errors':>7}" * 2)
+    for users in user_counts:
+        row = f"{users:>6}"
+        for mode in ("async", "sync"):
+            rps, p50, p99, errors = run_step(ctx, base_url, token, PATHS[mode], users)
+            row += f" {rps:>9.1f} {p50:>7.1f}ms {p99:>7.1f}ms {errors:>7}"
+        print(row, flush=True)
+
+    server.should_exit = True
+    parent.send("stop")
+    fake.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Recipe image upload with large phone photos: the old read-everything-and-send
+path vs streaming from the spooled file with local resize/WebP and content-hash
+dedup. Reports peak RSS growth of each run (measured in a fresh child process,
+since Pillow's pixel buffers are invisible to tracemalloc) and the multipart
+bytes a fake uploader would have put on the wire.
+
+    python benchmarks/bench_image_upload.py [photos] [megapixels]
+"""
+import io
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageFilter
+from urllib3.filepost import encode_multipart_formdata
+
+# Starlette spools multipart files to disk past this size
+SPOOL_MAX = 1024 * 1024
+
+
+class CountingUploader:
+    """Builds the multipart body the way cloudinary's urllib3 transport does, then drops it."""
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.calls = 0
+
+    def upload(self, file, public_id=None, folder=None, **options):
+        data = file.read() if hasattr(file, "read") else file
+        body, _ = encode_multipart_formdata({"file": ("file", data), "public_id": str(public_id), "folder": str(folder)})
+        self.bytes_sent += len(body)
+        self.calls += 1
+        return {"secure_url": f"https://res.cloudinary.test/{folder}/{public_id or self.calls}"}
+
+
+class EmptyAdminApi:
+    def resource(self, public_id, **options):
+        import cloudinary.exceptions
+        raise cloudinary.exceptions.NotFound(public_id)
+
+
+def make_photo(megapixels: float, seed: int) -> bytes:
+    """Noisy, slightly blurred 4:3 JPEG: compresses about like a real photo."""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    img = Image.fromarray(pixels).filter(ImageFilter.GaussianBlur(1.2))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def spooled(path: str):
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX)
+    with open(path, "rb") as src:
+        shutil.copyfileobj(src, f, 64 * 1024)
+    f.seek(0)
+    return f
+
+
+def _status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def reset_peak_rss() -> int:
+    """Resets the peak-RSS mark (Linux) and returns the current RSS in KB."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return _status_kb("VmRSS")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def peak_rss_kb() -> int:
+    try:
+        return _status_kb("VmHWM")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run(variant: str, paths, repeat: int, results) -> None:
+    import providers
+    import services.cloudinary_service as cloudinary_service
+    uploader = CountingUploader()
+    providers.override("cloudinary", SimpleNamespace(uploader=uploader, admin_api=EmptyAdminApi()))
+    files = [spooled(path) for path in paths]
+
+    baseline = reset_peak_rss()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for f in files:
+            f.seek(0)
+            if variant == "old":
+                # Before: content = await file.read(); upload_image(content, ...)
+                content = f.read()
+                uploader.upload(content, public_id="photo", folder="meal_planner_recipes")
+                del content
+            else:
+                cloudinary_service.upload_image(f, "photo.jpg")
+    elapsed = time.perf_counter() - start
+    results.put((variant, peak_rss_kb() - baseline, uploader.bytes_sent, uploader.calls, elapsed))
+
+
+def measure(variant: str, paths, repeat: int):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=run, args=(variant, paths, repeat, results))
+    proc.start()
+    result = results.get()
+    proc.join()
+    return result
+
+
+def main():
+    photos = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    megapixels = float(sys.argv[2]) if len(sys.argv) > 2 else 12
+    repeat = 2  # every photo is saved twice, like re-saving a recipe
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(photos):
+            path = os.path.join(tmp, f"photo{i}.jpg")
+            with open(path, "wb") as f:
+                f.write(make_photo(megapixels, seed=i))
+            paths.append(path)
+        total_in = sum(os.path.getsize(p) for p in paths) * repeat
+        print(f"{photos} photos x {repeat} saves, {megapixels:g} MP, {total_in / 1e6:.1f} MB received")
+
+        for variant in ("old", "new"):
+            name, rss_kb, sent, calls, elapsed = measure(variant, paths, repeat)
+            print(f"  {name:>3}: peak RSS +{rss_kb / 1024:6.1f} MB  sent {sent / 1e6:6.2f} MB in {calls} uploads  "
+                  f"({sent / total_in:6.1%} of input)  {elapsed * 1000 / (photos * repeat):6.1f} ms/save")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Cold-start import cost of the serverless entry point (`import main`), from
+`python -X importtime` in fresh interpreters. Prints the median total, the
+slowest top-level imports, and fails (exit 1) when the budget is exceeded or a
+lazily-initialized SDK shows up at import time.
+
+    python benchmarks/bench_import_time.py [runs] [--max-ms N] [--top N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must only load on first use (see providers.py)
+LAZY_MODULES = ["google.generativeai", "cloudinary", "PIL", "numpy"]
+
+
+def import_profile(module: str = "main") -> List[Tuple[str, int, int, int]]:
+    """One fresh `-X importtime` run: (name, depth, self_us, cumulative_us) per import."""
+    env = {
+        **os.environ,
+        "SUPABASE_URL": os.environ.get("SUPABASE_URL", "http://127.0.0.1:9"),
+        "SUPABASE_KEY": os.environ.get("SUPABASE_KEY", "bench"),
+        "PYTHONDONTWRITEBYTECODE": "1",
+    }
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("runs", nargs="?", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1000")))
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    totals: List[float] = []
+    cumulative: Dict[str, List[int]] = {}
+    loaded = set()
+    for _ in range(args.runs):
+        rows = import_profile()
+        for name, depth, _, cum in rows:
+            loaded.add(name)
+            if depth == 1:
+                cumulative.setdefault(name, []).append(cum)
+        totals.append(next(cum for name, depth, _, cum in rows if name == "main") / 1000)
+
+    total_ms = statistics.median(totals)
+    print(f"import main: median {total_ms:.0f} ms, min {min(totals):.0f} ms over {args.runs} runs")
+    print(f"{'module':<44}{'cumulative ms':>14}")
+    slowest = sorted(cumulative.items(), key=lambda kv: statistics.median(kv[1]), reverse=True)
+    for name, values in slowest[:args.top]:
+        print(f"  {name:<42}{statistics.median(values) / 1000:>14.1f}")
+
+    failures = []
+    if total_ms > args.max_ms:
+        failures.append(f"import main took {total_ms:.0f} ms (budget {args.max_ms:.0f} ms)")
+    for module in LAZY_MODULES:
+        if any(name == module or name.startswith(module + ".") for name in loaded):
+            failures.append(f"{module} is imported at cold start")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Build time and per-query latency of the in-memory ingredient index at
+increasing table sizes, using synthetic ingredient names.
+
+    python benchmarks/bench_ingredient_index.py [rows ...]
+
+Defaults to 10k, 100k and 1M rows.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingredient_index import IngredientIndex
+
+BASES = [
+    "chicken", "beef", "pork", "salmon", "tuna", "rice", "quinoa", "oats", "lentils",
+    "chickpeas", "tofu", "egg", "milk", "yogurt", "cheddar", "mozzarella", "spinach",
+    "broccoli", "carrot", "onion", "garlic", "tomato", "potato", "apple", "banana",
+    "almond", "peanut", "olive oil", "butter", "flour", "sugar", "honey", "pasta",
+]
+MODIFIERS = [
+    "raw", "cooked", "roasted", "smoked", "organic", "low fat", "whole", "ground",
+    "fresh", "frozen", "canned", "dried", "sweet", "brown", "wild", "baby", "red",
+]
+QUERIES = ["chicken", "chick", "ch", "smoked salm", "olive", "tomat", "brocoli", "oil", "zzz"]
+
+
+def make_rows(n, rng):
+    rows = []
+    for i in range(n):
+        words = rng.sample(MODIFIERS, rng.randint(0, 2)) + [rng.choice(BASES)]
+        rows.append({
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "api_id": None,
+            "name": f"{' '.join(words)} {i % 997}",
+            "calories_per_g": 1.0,
+            "protein_per_g": 0.1,
+            "image_url": None,
+        })
+    return rows
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    rng = random.Random(42)
+    print(f"{'rows':>9} {'build':>9} {'p50':>10} {'p99':>10} {'max':>10}")
+    for n in sizes:
+        rows = make_rows(n, rng)
+        start = time.perf_counter()
+        index = IngredientIndex(rows)
+        build = time.perf_counter() - start
+
+        samples = []
+        for _ in range(50):
+            for q in QUERIES:
+                t0 = time.perf_counter()
+                index.search(q, limit=10)
+                samples.append(time.perf_counter() - t0)
+        samples.sort()
+        p50 = samples[len(samples) // 2] * 1e3
+        p99 = samples[int(len(samples) * 0.99)] * 1e3
+        print(f"{n:>9} {build:>8.2f}s {p50:>8.3f}ms {p99:>8.3f}ms {samples[-1] * 1e3:>8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
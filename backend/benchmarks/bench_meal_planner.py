@@ -0,0 +1,116 @@
+"""
+Automatic meal planning (planner.generate) on synthetic recipe libraries:
+wall time and how close each day lands to the calorie/protein targets,
+against picking a random recipe of the right category for every slot.
+
+    python benchmarks/bench_meal_planner.py [recipes] [days] [--snacks]
+"""
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import planner
+
+CALORIES_TARGET = 2200
+PROTEIN_TARGET_G = 140
+
+# (share of library, calorie range) per category
+LIBRARY_MIX = {
+    "Breakfast": (0.2, (250, 600)),
+    "Lunch": (0.25, (400, 850)),
+    "Dinner": (0.3, (450, 1100)),
+    "Snack": (0.15, (80, 350)),
+    "Other": (0.1, (100, 900)),
+}
+
+
+def make_library(n, seed=0):
+    rng = random.Random(seed)
+    categories = list(LIBRARY_MIX)
+    weights = [LIBRARY_MIX[c][0] for c in categories]
+    recipes = []
+    for _ in range(n):
+        category = rng.choices(categories, weights)[0]
+        low, high = LIBRARY_MIX[category][1]
+        calories = rng.randint(low, high)
+        recipes.append({
+            "id": str(uuid.uuid4()),
+            "category": category,
+            "calories_per_serving": calories,
+            "protein_g": round(calories * rng.uniform(0.015, 0.09), 1),
+        })
+    return recipes
+
+
+def random_plan(recipes, start, days, meal_types, seed=0):
+    rng = random.Random(seed)
+    by_category = {}
+    for r in recipes:
+        by_category.setdefault(r["category"], []).append(r)
+    items = []
+    for d in range(days):
+        for t in meal_types:
+            items.append({"date": (start + timedelta(days=d)).isoformat(), "meal_type": t,
+                          "recipe_id": rng.choice(by_category[t])["id"]})
+    return items
+
+
+def quality(recipes, items, min_gap_days):
+    by_id = {r["id"]: r for r in recipes}
+    cal, pro, seen = {}, {}, {}
+    repeats = 0
+    for item in sorted(items, key=lambda i: i["date"]):
+        recipe = by_id[item["recipe_id"]]
+        cal[item["date"]] = cal.get(item["date"], 0) + recipe["calories_per_serving"]
+        pro[item["date"]] = pro.get(item["date"], 0) + recipe["protein_g"]
+        day = date.fromisoformat(item["date"])
+        last = seen.get(item["recipe_id"])
+        if last is not None and (day - last).days < min_gap_days:
+            repeats += 1
+        seen[item["recipe_id"]] = day
+    cal_err = np.abs(np.array(list(cal.values())) / CALORIES_TARGET - 1) * 100
+    pro_err = np.abs(np.array(list(pro.values())) / PROTEIN_TARGET_G - 1) * 100
+    return cal_err, pro_err, repeats
+
+
+def report(name, elapsed_ms, items, recipes, min_gap_days):
+    cal_err, pro_err, repeats = quality(recipes, items, min_gap_days)
+    print(f"  {name:<8} {elapsed_ms:8.1f} ms  {len(items):4d} slots  "
+          f"calories off median {np.median(cal_err):5.1f}% p95 {np.percentile(cal_err, 95):5.1f}%  "
+          f"protein off median {np.median(pro_err):5.1f}% p95 {np.percentile(pro_err, 95):5.1f}%  "
+          f"repeats<{min_gap_days}d {repeats}")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    sizes = [(int(args[0]), int(args[1]))] if len(args) >= 2 else [(200, 14), (1000, 30), (5000, 90)]
+    meal_types = ["Breakfast", "Lunch", "Dinner"] + (["Snack"] if "--snacks" in sys.argv else [])
+    start = date(2026, 1, 5)
+    min_gap_days = 3
+
+    planner.generate(make_library(50), start, start, CALORIES_TARGET, PROTEIN_TARGET_G)  # warm NumPy import
+    print(f"targets {CALORIES_TARGET} kcal / {PROTEIN_TARGET_G} g protein per day, meal types {', '.join(meal_types)}")
+    for n_recipes, days in sizes:
+        recipes = make_library(n_recipes)
+        end = start + timedelta(days=days - 1)
+        print(f"{n_recipes} recipes, {days} days")
+
+        t0 = time.perf_counter()
+        items = random_plan(recipes, start, days, meal_types)
+        report("random", (time.perf_counter() - t0) * 1000, items, recipes, min_gap_days)
+
+        t0 = time.perf_counter()
+        items = planner.generate(recipes, start, end, CALORIES_TARGET, PROTEIN_TARGET_G,
+                                 meal_types=meal_types, min_gap_days=min_gap_days, seed=1)
+        report("planner", (time.perf_counter() - t0) * 1000, items, recipes, min_gap_days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Offline benchmark of every route in routers/recipes.py and routers/meal_plans.py.
+
+Local stand-ins (fake_servers.py) replace Supabase (PostgREST and auth),
+Spoonacular, Gemini and Cloudinary, all with the same injected latency, in a
+child process so they do not compete with the app for the GIL. The app runs
+under uvicorn in-process. Each scenario sends a fixed number of requests from
+N concurrent clients (one user each, requests dealt out round-robin so cache
+hits repeat from run to run) and records p50/p99 latency, throughput and
+upstream round trips per request, as counted by the fakes.
+
+Results are checked against benchmarks/baselines/routes.json, keyed by the
+run configuration. Only deterministic numbers gate: a scenario fails the run
+(exit 1) when it returns errors or makes more upstream round trips than its
+baseline, in total or to any one upstream. Latency and throughput depend on
+the machine, so drifting past the tolerance is reported as a warning only.
+p99 over a few dozen requests is close to the maximum, so it has its own,
+looser tolerance. --update records the current numbers as the new baseline.
+
+    python benchmarks/bench_routes.py [--latency-ms 20] [--users 8] [--requests 80]
+        [--only NAME ...] [--no-rpc] [--tolerance 0.3] [--p99-tolerance 1.5] [--update]
+"""
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import jwt
+from PIL import Image
+
+from bench_async_load import JWT_SECRET, start_app
+from fake_servers import FakeCloudinary, FakeGemini, FakePostgrest, FakeSpoonacular
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "routes.json")
+
+# Latency must also be this much worse in absolute terms, so sub-millisecond
+# jitter on fast routes never fails a run
+LATENCY_FLOOR_MS = 5.0
+# Round trips are near-deterministic; allow for background usage flushes
+ROUND_TRIP_SLACK = 0.1
+
+PLAN_START = date(2026, 2, 1)
+
+
+def serve_fakes(latency_s, rpcs, conn):
+    fakes = {
+        "supabase": FakePostgrest(latency_s=latency_s, rpcs=rpcs),
+        "spoonacular": FakeSpoonacular(latency_s),
+        "gemini": FakeGemini(latency_s),
+        "cloudinary": FakeCloudinary(latency_s),
+    }
+    for fake in fakes.values():
+        fake.start()
+    conn.send({name: fake.url for name, fake in fakes.items()})
+    while conn.recv() == "calls":
+        conn.send({name: fake.calls for name, fake in fakes.items()})
+    for fake in fakes.values():
+        fake.stop()
+
+
+def configure_env(urls: Dict[str, str]) -> None:
+    """Points every upstream the app knows about at the fakes (before main is imported)."""
+    os.environ.update({
+        "SUPABASE_URL": urls["supabase"],
+        "SUPABASE_KEY": "bench-anon-key",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "SPOONACULAR_BASE_URL": urls["spoonacular"],
+        "SPOONACULAR_API_KEY": "bench",
+        # The free-tier quota would switch Spoonacular off mid-run
+        "SPOONACULAR_DAILY_POINTS": "1000000000",
+        "GEMINI_API_KEY": "bench",
+        "GEMINI_API_ENDPOINT": urls["gemini"],
+        "GEMINI_CACHE_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-routes-"), "gemini.sqlite3"),
+        # The SDK reads every CLOUDINARY_* variable once CLOUD_NAME is set
+        "CLOUDINARY_CLOUD_NAME": "bench",
+        "CLOUDINARY_UPLOAD_PREFIX": urls["cloudinary"],
+        "CLOUDINARY_API_KEY": "bench",
+        "CLOUDINARY_API_SECRET": "bench",
+    })
+
+
+def make_token(user_id: str) -> str:
+    return jwt.encode({"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 3600},
+                      JWT_SECRET, algorithm="HS256")
+
+
+def make_image(i: int) -> bytes:
+    # Distinct bytes per index, so uploads are not deduplicated
+    image = Image.new("RGB", (1200, 900), (i % 256, (i // 256) % 256, 128))
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+
+def day(i: int, span: int = 28, offset: int = 0) -> str:
+    return (PLAN_START + timedelta(days=i % span + offset)).isoformat()
+
+
+def week(i: int) -> str:
+    start = PLAN_START + timedelta(days=i % 21)
+    return f"start_date={start.isoformat()}&end_date={(start + timedelta(days=6)).isoformat()}"
+
+
+def recipe_body(i: int) -> Dict[str, Any]:
+    return {
+        "name": f"bench recipe {i}", "category": "Dinner", "calories_per_serving": 500, "protein_g": 35,
+        "ingredients": [
+            {"name": f"ingredient {k}", "api_id": str(2000 + k), "calories_per_g": 1.5, "protein_per_g": 0.1,
+             "amount_g": 100 + i % 50}
+            for k in range(3)
+        ],
+    }
+
+
+def parse_text(i: int) -> str:
+    # Unique per request: every parse misses the Gemini cache
+    return f"Bench chili #{i} {uuid.uuid4()}: brown 250g beef, add 240g kidney beans, simmer 30 minutes."
+
+
+# name -> builds request i's httpx.request kwargs from the run context
+SCENARIOS: List[tuple] = [
+    ("recipes.list", lambda i, c: {"method": "GET", "url": f"/api/recipes/?limit={20 + i % 5}"}),
+    ("recipes.ingredients", lambda i, c: {"method": "GET", "url": "/api/recipes/ingredients"}),
+    ("recipes.search", lambda i, c: {"method": "GET", "url": f"/api/recipes/ingredients/search?q=food{i}"}),
+    ("recipes.search_stream", lambda i, c: {"method": "GET", "url": f"/api/recipes/ingredients/search/stream?q=dish{i}"}),
+    ("recipes.parse", lambda i, c: {"method": "POST", "url": "/api/recipes/parse", "json": {"text": parse_text(i)}}),
+    ("recipes.parse_batch", lambda i, c: {"method": "POST", "url": "/api/recipes/parse/batch",
+                                          "json": {"texts": [parse_text(i) for _ in range(5)]}}),
+    ("recipes.upload", lambda i, c: {"method": "POST", "url": "/api/recipes/upload",
+                                     "files": {"file": (f"{i}.jpg", c["images"][i % len(c["images"])], "image/jpeg")}}),
+    ("recipes.upload_duplicate", lambda i, c: {"method": "POST", "url": "/api/recipes/upload",
+                                               "files": {"file": ("same.jpg", c["images"][0], "image/jpeg")}}),
+    ("recipes.create", lambda i, c: {"method": "POST", "url": "/api/recipes/", "json": recipe_body(i)}),
+    ("recipes.update", lambda i, c: {"method": "PUT", "url": f"/api/recipes/{c['recipe_ids'][i % len(c['recipe_ids'])]}",
+                                     "json": recipe_body(i)}),
+    ("recipes.delete", lambda i, c: {"method": "DELETE", "url": f"/api/recipes/{c['recipe_ids'][i % len(c['recipe_ids'])]}"}),
+    ("meal_plans.list", lambda i, c: {"method": "GET", "url": f"/api/meal-plans/?{week(i)}"}),
+    ("meal_plans.summary", lambda i, c: {"method": "GET", "url": f"/api/meal-plans/summary?{week(i)}"}),
+    ("meal_plans.shopping_list", lambda i, c: {"method": "GET", "url": f"/api/meal-plans/shopping-list?{week(i)}"}),
+    ("meal_plans.shopping_list_csv", lambda i, c: {"method": "GET", "url": f"/api/meal-plans/shopping-list?{week(i)}&format=csv"}),
+    ("meal_plans.create", lambda i, c: {"method": "POST", "url": "/api/meal-plans/", "json": {
+        "date": day(i), "meal_type": "Lunch", "recipe_id": c["recipe_ids"][i % len(c["recipe_ids"])]}}),
+    ("meal_plans.bulk", lambda i, c: {"method": "POST", "url": "/api/meal-plans/bulk", "json": [
+        {"date": day(i + d), "meal_type": "Dinner", "recipe_id": c["recipe_ids"][(i + d) % len(c["recipe_ids"])]}
+        for d in range(7)]}),
+    ("meal_plans.copy_week", lambda i, c: {"method": "POST", "url": "/api/meal-plans/copy-week", "json": {
+        "from_date": day(i, 14), "to_date": day(i, 14, offset=14), "days": 7}}),
+    # After the fixture month, so every slot is empty and the plan is written
+    ("meal_plans.generate", lambda i, c: {"method": "POST", "url": "/api/meal-plans/generate", "json": {
+        "start_date": day(i, 21, offset=28), "end_date": day(i, 21, offset=34), "calories_target": 2200, "protein_target_g": 140,
+        "meal_types": ["Breakfast", "Lunch", "Dinner", "Snack"], "seed": i}}),
+    ("meal_plans.delete", lambda i, c: {"method": "DELETE", "url": f"/api/meal-plans/{c['meal_plan_ids'][i % len(c['meal_plan_ids'])]}"}),
+]
+
+
+async def run_scenario(base_url: str, tokens: List[str], build: Callable, ctx: Dict[str, Any], total: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: List[str] = []
+    users = len(tokens)
+
+    async def client(k: int, http: httpx.AsyncClient):
+        headers = {"Authorization": f"Bearer {tokens[k]}"}
+        for i in range(k, total, users):
+            start = time.perf_counter()
+            res = await http.request(**build(i, ctx), headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if res.status_code >= 400:
+                errors.append(f"{res.status_code} {res.text[:120]}")
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(k, http) for k in range(users)))
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1e3, 2),
+        "p99_ms": round(latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1e3, 2),
+        "rps": round(len(latencies) / wall, 1),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+async def fixture_ids(base_url: str, token: str) -> Dict[str, List[str]]:
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=60) as http:
+        recipes = (await http.get("/api/recipes/?limit=50")).json()
+        plans = (await http.get(f"/api/meal-plans/?start_date={day(0)}&end_date={day(27)}")).json()
+    return {"recipe_ids": [r["id"] for r in recipes], "meal_plan_ids": [p["id"] for p in plans]}
+
+
+def _round_trip_limit(baseline: float) -> float:
+    return baseline * (1 + ROUND_TRIP_SLACK) + 0.05
+
+
+def compare(result: Dict[str, Any], baseline: Optional[Dict[str, Any]], tolerance: float,
+            p99_tolerance: float) -> Tuple[List[str], List[str]]:
+    """Returns (failures, warnings): round trips and errors gate, timings are advisory."""
+    failures, warnings = [], []
+    if result["errors"]:
+        failures.append(f"{result['errors']} errors, first: {result['first_error']}")
+    if baseline is None:
+        return failures, warnings
+
+    limit = _round_trip_limit(baseline["round_trips"])
+    if result["round_trips"] > limit:
+        failures.append(f"round trips {result['round_trips']:.2f} > {limit:.2f} (baseline {baseline['round_trips']:.2f})")
+    recorded = baseline.get("upstream_round_trips", {})
+    for upstream, trips in sorted(result["upstream_round_trips"].items()):
+        limit = _round_trip_limit(recorded.get(upstream, 0.0))
+        if trips > limit:
+            failures.append(f"{upstream} round trips {trips:.2f} > {limit:.2f} (baseline {recorded.get(upstream, 0.0):.2f})")
+
+    for key, allowed in (("p50_ms", tolerance), ("p99_ms", p99_tolerance)):
+        limit = max(baseline[key] * (1 + allowed), baseline[key] + LATENCY_FLOOR_MS)
+        if result[key] > limit:
+            warnings.append(f"{key} {result[key]:.1f} > {limit:.1f} (baseline {baseline[key]:.1f})")
+    if result["rps"] < baseline["rps"] * (1 - tolerance):
+        warnings.append(f"rps {result['rps']:.1f} < {baseline['rps'] * (1 - tolerance):.1f} (baseline {baseline['rps']:.1f})")
+    return failures, warnings
+
+
+def load_baselines() -> Dict[str, Any]:
+    if not os.path.exists(BASELINES):
+        return {}
+    with open(BASELINES) as f:
+        return json.load(f)
+
+
+def save_baselines(baselines: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(BASELINES), exist_ok=True)
+    with open(BASELINES, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=80)
+    parser.add_argument("--only", nargs="*", help="scenario names or prefixes (e.g. meal_plans)")
+    parser.add_argument("--no-rpc", action="store_true", help="fakes report database functions as not deployed")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--p99-tolerance", type=float, default=1.5)
+    parser.add_argument("--update", action="store_true", help="record results as the baseline")
+    args = parser.parse_args()
+
+    scenarios = [(name, build) for name, build in SCENARIOS
+                 if not args.only or any(name == o or name.startswith(o + ".") for o in args.only)]
+    config = f"latency={args.latency_ms:g}ms users={args.users} requests={args.requests} rpc={'off' if args.no_rpc else 'on'}"
+
+    parent, child = multiprocessing.Pipe()
+    fakes = multiprocessing.Process(target=serve_fakes, args=(args.latency_ms / 1000.0, not args.no_rpc, child), daemon=True)
+    fakes.start()
+    configure_env(parent.recv())
+    server, base_url = start_app()
+
+    def upstream_calls() -> Dict[str, int]:
+        parent.send("calls")
+        return parent.recv()
+
+    tokens = [make_token(str(uuid.uuid4())) for _ in range(args.users)]
+    ctx = {"images": [make_image(i) for i in range(args.requests)]}
+    ctx.update(asyncio.run(fixture_ids(base_url, tokens[0])))
+
+    baselines = load_baselines()
+    recorded = baselines.get(config, {}).get("scenarios", {})
+    results: Dict[str, Dict[str, Any]] = {}
+    failed = False
+
+    print(f"{config}, one fake per upstream in a child process")
+    print(f"{'scenario':<30}{'p50':>9}{'p99':>9}{'req/s':>8}{'trips':>7}  upstreams")
+    for name, build in scenarios:
+        # One untimed request loads lazy SDKs (Gemini, Cloudinary, NumPy)
+        asyncio.run(run_scenario(base_url, tokens[:1], build, ctx, 1))
+        before = upstream_calls()
+        result = asyncio.run(run_scenario(base_url, tokens, build, ctx, args.requests))
+        after = upstream_calls()
+        per_upstream = {k: round((after[k] - before[k]) / result["requests"], 2) for k in after if after[k] != before[k]}
+        result["upstream_round_trips"] = per_upstream
+        result["round_trips"] = round(sum(per_upstream.values()), 2)
+        results[name] = result
+
+        failures, warnings = compare(result, recorded.get(name), args.tolerance, args.p99_tolerance)
+        failed = failed or bool(failures)
+        upstreams = ", ".join(f"{k} {v:g}" for k, v in sorted(per_upstream.items())) or "-"
+        print(f"{name:<30}{result['p50_ms']:>7.1f}ms{result['p99_ms']:>7.1f}ms{result['rps']:>8.1f}"
+              f"{result['round_trips']:>7.2f}  {upstreams}")
+        for failure in failures:
+            print(f"  FAIL {failure}")
+        for warning in warnings:
+            print(f"  warn {warning}")
+        if name not in recorded and not args.update:
+            print("  (no baseline)")
+
+    server.should_exit = True
+    parent.send("stop")
+    fakes.join(timeout=5)
+
+    if args.update:
+        entry = baselines.setdefault(config, {"scenarios": {}})
+        entry["python"] = platform.python_version()
+        entry["recorded"] = date.today().isoformat()
+        for name, result in results.items():
+            entry["scenarios"][name] = {k: result[k] for k in ("p50_ms", "p99_ms", "rps", "round_trips", "upstream_round_trips")}
+        save_baselines(baselines)
+        print(f"baseline for '{config}' written to {os.path.relpath(BASELINES)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Response serialization for a large recipe list: the old flatten loop plus
+FastAPI response_model validation vs the single-pass projection + orjson.
+
+    python benchmarks/bench_serialization.py [recipes] [ingredients_per_recipe]
+"""
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import List
+from pydantic import TypeAdapter
+from models import Recipe
+import serialization
+
+
+def make_rows(n_recipes, n_ingredients):
+    user_id = str(uuid.uuid4())
+    rows = []
+    for r in range(n_recipes):
+        rows.append({
+            "id": str(uuid.uuid4()), "user_id": user_id, "name": f"Recipe {r}",
+            "description": "A tasty thing " * 5, "instructions": None, "image_url": None,
+            "category": "Dinner", "calories_per_serving": 640, "protein_g": 42.5,
+            "carbs_g": None, "fat_g": None, "usage_count": r % 17,
+            "created_at": "2026-01-01T00:00:00+00:00",
+            "recipe_ingredients": [
+                {"amount_g": 50 + i, "ingredients": {
+                    "id": str(uuid.uuid4()), "api_id": str(1000 + i), "name": f"Ingredient {i}",
+                    "calories_per_g": 1.23, "protein_per_g": 0.12,
+                    "image_url": f"https://spoonacular.com/cdn/ingredients_100x100/{i}.jpg",
+                    "created_at": "2026-01-01T00:00:00+00:00",
+                }}
+                for i in range(n_ingredients)
+            ],
+        })
+    return rows
+
+
+def legacy(rows):
+    # The loop that used to live in get_recipes ...
+    recipes = []
+    for r in rows:
+        ingredients_flat = []
+        for ri in r.get('recipe_ingredients', []):
+            if ri.get('ingredients'):
+                ing = ri['ingredients']
+                ingredients_flat.append({
+                    "id": ing['id'], "api_id": ing['api_id'], "name": ing['name'],
+                    "amount_g": ri['amount_g'], "calories_per_g": ing['calories_per_g'],
+                    "protein_per_g": ing['protein_per_g'], "image_url": ing['image_url'],
+                })
+        r = dict(r)
+        r['ingredients'] = ingredients_flat
+        recipes.append(r)
+    # ... followed by what response_model=List[Recipe] costs in FastAPI
+    adapter = LEGACY_ADAPTER
+    content = adapter.dump_python(adapter.validate_python(recipes), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+LEGACY_ADAPTER = TypeAdapter(List[Recipe])
+
+
+def projected(rows):
+    return serialization.recipes_response(rows).body
+
+
+def timed(fn, rows, runs=7):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        body = fn(rows)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2], len(body)
+
+
+def main():
+    n_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_ingredients = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    rows = make_rows(n_recipes, n_ingredients)
+
+    print(f"{n_recipes} recipes x {n_ingredients} ingredients, median of 7 runs")
+    base, size = timed(legacy, rows)
+    print(f"{'legacy flatten + response_model':<36} {base * 1e3:>8.2f}ms {size / 1024:>8.1f}KB")
+
+    fast, size = timed(projected, rows)
+    print(f"{'projection + orjson':<36} {fast * 1e3:>8.2f}ms {size / 1024:>8.1f}KB  {base / fast:.1f}x")
+
+    serialization.VALIDATE_RESPONSES = True
+    checked, size = timed(projected, rows)
+    print(f"{'projection + TypeAdapter + orjson':<36} {checked * 1e3:>8.2f}ms {size / 1024:>8.1f}KB  {base / checked:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
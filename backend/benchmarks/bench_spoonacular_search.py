@@ -0,0 +1,66 @@
+"""
+Compares sequential vs concurrent Spoonacular detail fetching against a local
+fake server with injected latency.
+
+    python benchmarks/bench_spoonacular_search.py [latency_ms] [max_results]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_servers import FakeSpoonacular
+
+
+def sequential_search(svc, query, max_results):
+    # The pre-concurrency implementation: one detail call after another.
+    deadline = time.monotonic() + svc.DEADLINE_S
+    results = svc._search_ids(query, max(max_results, 5), deadline)
+    out = []
+    for item in results[:max_results]:
+        details = svc._fetch_details(item, deadline)
+        if details:
+            out.append(details)
+    return out
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    latency_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 80
+    runs = 5
+
+    with FakeSpoonacular(latency_s=latency_ms / 1000.0) as fake:
+        os.environ["SPOONACULAR_API_KEY"] = "bench"
+        os.environ["SPOONACULAR_BASE_URL"] = fake.url
+        os.environ["SPOONACULAR_DAILY_POINTS"] = "1000000"
+        from services import spoonacular_service as svc
+        # Measure the HTTP path only: no DB tier, and start every run cold.
+        svc._load_persisted = lambda api_ids: {}
+        svc._persist = lambda rows: None
+
+        def concurrent_search(n):
+            svc._query_cache.clear()
+            svc._nutrition_cache.clear()
+            return svc.search_food("chicken", max_results=n)
+
+        counts = [int(sys.argv[2])] if len(sys.argv) > 2 else [3, 5, 8]
+        print(f"Fake Spoonacular latency: {latency_ms:.0f} ms, median of {runs} runs")
+        print(f"{'results':>8} {'sequential':>12} {'concurrent':>12} {'speedup':>8}")
+        for n in counts:
+            seq = timed(lambda: sequential_search(svc, "chicken", n), runs)
+            con = timed(lambda: concurrent_search(n), runs)
+            print(f"{n:>8} {seq * 1000:>10.1f}ms {con * 1000:>10.1f}ms {seq / con:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
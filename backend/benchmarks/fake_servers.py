@@ -0,0 +1,346 @@
+"""
+Local stand-ins for the external services the backend talks to.
+
+Each fake runs a real HTTP server on 127.0.0.1 in a background thread so the
+code under test goes through its normal network path. `latency_s` is slept
+before every response to mimic upstream round-trip time.
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeServer:
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def handle(self, method: str, path: str, query: dict, body: bytes, headers=None):
+        """Returns (status, payload). Subclasses override."""
+        return 404, {"message": "not found"}
+
+    def start(self) -> "FakeServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                with fake._lock:
+                    fake.calls += 1
+                if fake.latency_s:
+                    time.sleep(fake.latency_s)
+                status, payload = fake.handle(method, parsed.path, parse_qs(parsed.query), body, self.headers)
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client gave up (deadline hit); nothing to do
+                    pass
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # socketserver's default backlog of 5 drops bursts of new
+            # connections, which then stall for a 1s SYN retransmit
+            request_queue_size = 128
+
+        self._httpd = Server(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeSpoonacular(FakeServer):
+    """Serves /food/ingredients/search and /food/ingredients/{id}/information."""
+
+    INFO_PATH = re.compile(r"^/food/ingredients/(\d+)/information$")
+
+    def handle(self, method, path, query, body, headers=None):
+        if path == "/food/ingredients/search":
+            term = query.get("query", ["food"])[0]
+            number = int(query.get("number", ["5"])[0])
+            results = [{"id": 1000 + i, "name": f"{term} {i}", "image": f"{term}-{i}.jpg"} for i in range(number)]
+            return 200, {"results": results, "offset": 0, "number": number, "totalResults": number}
+
+        match = self.INFO_PATH.match(path)
+        if match:
+            ing_id = int(match.group(1))
+            return 200, {
+                "id": ing_id,
+                "name": f"ingredient {ing_id}",
+                "image": f"{ing_id}.jpg",
+                "nutrition": {"nutrients": [
+                    {"name": "Calories", "amount": 100 + ing_id % 50, "unit": "kcal"},
+                    {"name": "Protein", "amount": ing_id % 30, "unit": "g"},
+                ]},
+            }
+        return 404, {"message": "not found"}
+
+
+class FakePostgrest(FakeServer):
+    """
+    Supabase stand-in: PostgREST under /rest/v1 and the bits of auth under /auth/v1.
+
+    Reads return the fixture table, honouring only `id=eq./in.`, `date=gte./lte.`
+    filters (so a week of meal plans is a week's payload) and `limit`; writes echo the
+    payload back with generated ids. Enough to exercise the routers' I/O pattern and
+    payload sizes, not to check query semantics.
+
+    The functions in database/schema.sql answer with plausibly shaped results;
+    with `rpcs=False` they answer PGRST202 (not deployed), which sends the
+    routers down their non-transactional fallbacks. increment_recipe_usage
+    predates that file and always answers. Writes bump the data version that
+    user_data_version reports, like the triggers do.
+    """
+
+    SCHEMA_FUNCTIONS = ("apply_recipe_ingredient_diff", "schedule_meal_plans", "copy_meal_plan_week",
+                        "increment_recipe_usage_batch", "meal_plan_shopping_list", "user_data_version")
+    WRITE_FUNCTIONS = ("apply_recipe_ingredient_diff", "schedule_meal_plans", "copy_meal_plan_week",
+                       "increment_recipe_usage_batch", "increment_recipe_usage")
+
+    def __init__(self, latency_s: float = 0.0, recipes: int = 50, ingredients_per_recipe: int = 10, user_id: str = None,
+                 rpcs: bool = True):
+        super().__init__(latency_s)
+        self.rpcs = rpcs
+        self.created = {}
+        self.data_version = 0
+        self.user_id = user_id or str(uuid.uuid4())
+        self.tables = {"recipes": [], "meal_plans": [], "ingredients": []}
+        # Encoded GET bodies, so the fake's own json.dumps is not the bottleneck
+        self._encoded = {}
+        ingredients = [
+            {"id": str(uuid.uuid4()), "api_id": str(2000 + i), "name": f"ingredient {i}",
+             "calories_per_g": 1.5, "protein_per_g": 0.1, "image_url": None}
+            for i in range(ingredients_per_recipe * 3)
+        ]
+        self.tables["ingredients"] = ingredients
+        for r in range(recipes):
+            self.tables["recipes"].append({
+                "id": str(uuid.uuid4()), "user_id": self.user_id, "name": f"recipe {r}",
+                "description": "fixture", "instructions": None, "image_url": None,
+                "category": ["Breakfast", "Lunch", "Dinner", "Snack"][r % 4],
+                "calories_per_serving": 400 + r, "protein_g": 30.0, "carbs_g": None, "fat_g": None,
+                "usage_count": r, "created_at": "2026-01-01T00:00:00+00:00",
+                "recipe_ingredients": [
+                    {"amount_g": 100, "ingredients": ingredients[(r + i) % len(ingredients)]}
+                    for i in range(ingredients_per_recipe)
+                ],
+            })
+        for day in range(28):
+            for m, meal_type in enumerate(["Breakfast", "Lunch", "Dinner", "Snack"]):
+                recipe = self.tables["recipes"][(day * 4 + m) % recipes] if recipes else None
+                self.tables["meal_plans"].append({
+                    "id": str(uuid.uuid4()), "user_id": self.user_id,
+                    "date": f"2026-02-{day + 1:02d}", "meal_type": meal_type,
+                    "recipe_id": recipe["id"] if recipe else None, "recipe": recipe,
+                    "created_at": "2026-01-01T00:00:00+00:00",
+                })
+
+    def handle(self, method, path, query, body, headers=None):
+        if path == "/auth/v1/user":
+            return 200, {"id": self.user_id, "aud": "authenticated", "role": "authenticated", "email": "bench@example.com"}
+        if path == "/auth/v1/.well-known/jwks.json":
+            return 200, {"keys": []}
+        if not path.startswith("/rest/v1/"):
+            return 404, {"message": "not found"}
+        name = path[len("/rest/v1/"):]
+        single = headers is not None and "vnd.pgrst.object" in (headers.get("Accept") or "")
+
+        if name.startswith("rpc/"):
+            return self._rpc(name[len("rpc/"):], query, json.loads(body or b"{}"))
+        if method == "GET":
+            if "id" in query:
+                return 200, json.dumps(self._read(name, query, single)).encode()
+            key = (name, single, tuple(query.get("date", [])), tuple(query.get("limit", [])))
+            if key not in self._encoded:
+                self._encoded[key] = json.dumps(self._read(name, query, single)).encode()
+            return 200, self._encoded[key]
+        if method in ("POST", "PATCH", "DELETE"):
+            self._bump()
+        if method in ("POST", "PATCH"):
+            payload = json.loads(body or b"[]")
+            payload = payload if isinstance(payload, list) else [payload]
+            rows = [{"id": str(uuid.uuid4()), "usage_count": 0, **p} for p in payload]
+            if method == "POST":
+                # Findable by id afterwards (the routers re-fetch what they insert)
+                with self._lock:
+                    self.created.setdefault(name, {}).update((r["id"], r) for r in rows)
+            return 201, rows
+        if method == "DELETE":
+            return 200, []
+        return 405, {"message": "method not allowed"}
+
+    def _rpc(self, fn, query, params):
+        if not self.rpcs and fn in self.SCHEMA_FUNCTIONS:
+            return 404, {"code": "PGRST202", "message": f"Could not find the function public.{fn}"}
+        if fn in self.WRITE_FUNCTIONS:
+            self._bump()
+        if fn == "user_data_version":
+            return 200, str(self.data_version).encode()
+        # Fixture rows stand in for the created ones, so re-fetches have a payload
+        plans = self.tables["meal_plans"]
+        if fn == "schedule_meal_plans":
+            return 200, [plan["id"] for plan in plans[:len(params.get("p_items") or [])]]
+        if fn == "copy_meal_plan_week":
+            return 200, [plan["id"] for plan in plans[:int(params.get("p_days") or 7) * 4]]
+        if fn == "meal_plan_shopping_list":
+            rows = self._shopping_list(params.get("p_start", ""), params.get("p_end", ""))
+            if "limit" in query:
+                rows = rows[:int(query["limit"][0])]
+            return 200, rows
+        # void functions (usage counters, ingredient link diffs)
+        return 200, b"null"
+
+    def _bump(self):
+        with self._lock:
+            self.data_version += 1
+
+    def _shopping_list(self, start, end):
+        totals = {}
+        for plan in self.tables["meal_plans"]:
+            if not start <= plan["date"] <= end or not plan["recipe"]:
+                continue
+            for link in plan["recipe"]["recipe_ingredients"]:
+                ingredient = link["ingredients"]
+                item = totals.setdefault(ingredient["id"], {
+                    "ingredient_id": ingredient["id"], "name": ingredient["name"], "amount_g": 0.0, "meals": 0,
+                    "api_id": ingredient["api_id"], "image_url": ingredient["image_url"],
+                })
+                item["amount_g"] += link["amount_g"]
+                item["meals"] += 1
+        return sorted(totals.values(), key=lambda i: (i["name"], i["ingredient_id"]))
+
+    def _read(self, name, query, single):
+        rows = self.tables.get(name, [])
+        if "id" in query:
+            rows = rows + list(self.created.get(name, {}).values())
+        for cond in query.get("id", []):
+            op, _, value = cond.partition(".")
+            if op == "eq":
+                rows = [r for r in rows if r["id"] == value]
+            elif op == "in":
+                ids = {v.strip('"') for v in value.strip("()").split(",")}
+                rows = [r for r in rows if r["id"] in ids]
+        for cond in query.get("date", []):
+            op, _, value = cond.partition(".")
+            if op == "gte":
+                rows = [r for r in rows if r.get("date", value) >= value]
+            elif op == "lte":
+                rows = [r for r in rows if r.get("date", value) <= value]
+        if "limit" in query:
+            rows = rows[:int(query["limit"][0])]
+        return (rows[0] if rows else {}) if single else rows
+
+
+class FakeGemini(FakeServer):
+    """
+    Generative Language REST API stand-in (`models/*:generateContent`).
+
+    Answers every prompt with the same well-formed recipe JSON, so parse
+    requests exercise the SDK round trip and our JSON handling.
+    """
+
+    RECIPE = {
+        "name": "Bench Chili", "description": "fixture", "category": "Dinner",
+        "calories_per_serving": 520, "protein_g": 38, "prep_time_minutes": 35,
+        "ingredients": [{"name": "kidney beans", "amount_g": 240}, {"name": "beef mince", "amount_g": 250}],
+        "instructions": "Brown, simmer, serve.",
+    }
+
+    def handle(self, method, path, query, body, headers=None):
+        if method == "POST" and path.endswith(":generateContent"):
+            return 200, {
+                "candidates": [{
+                    "content": {"role": "model", "parts": [{"text": json.dumps(self.RECIPE)}]},
+                    "finishReason": "STOP", "index": 0,
+                }],
+                "usageMetadata": {"promptTokenCount": 200, "candidatesTokenCount": 120, "totalTokenCount": 320},
+            }
+        return 404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}}
+
+
+class FakeCloudinary(FakeServer):
+    """
+    Cloudinary stand-in for image uploads and Admin API resource lookups.
+
+    Point the SDK at it with `upload_prefix` (CLOUDINARY_UPLOAD_PREFIX=<url>
+    next to CLOUDINARY_CLOUD_NAME). Uploaded public_ids
+    are remembered, so lookups find earlier uploads as on the real service.
+    """
+
+    UPLOAD_PATH = re.compile(r"^/v1_1/([^/]+)/image/upload$")
+    RESOURCE_PATH = re.compile(r"^/v1_1/([^/]+)/resources/image/upload/(.+)$")
+    FORM_FIELD = re.compile(rb'name="(public_id|folder)"\r\n\r\n([^\r]*)\r\n')
+
+    def __init__(self, latency_s: float = 0.0):
+        super().__init__(latency_s)
+        self.uploaded = set()
+        self.bytes_received = 0
+
+    def handle(self, method, path, query, body, headers=None):
+        match = self.UPLOAD_PATH.match(path)
+        if method == "POST" and match:
+            fields = {k.decode(): v.decode() for k, v in self.FORM_FIELD.findall(body)}
+            public_id = "/".join(filter(None, [fields.get("folder"), fields.get("public_id", str(uuid.uuid4()))]))
+            with self._lock:
+                self.uploaded.add(public_id)
+                self.bytes_received += len(body)
+            return 200, self._resource(match.group(1), public_id, len(body))
+
+        match = self.RESOURCE_PATH.match(path)
+        if method == "GET" and match:
+            if match.group(2) not in self.uploaded:
+                return 404, {"error": {"message": f"Resource not found - {match.group(2)}"}}
+            return 200, self._resource(match.group(1), match.group(2), 0)
+        return 404, {"error": {"message": "not found"}}
+
+    def _resource(self, cloud, public_id, size):
+        url = f"https://res.cloudinary.com/{cloud}/image/upload/v1/{public_id}.webp"
+        return {"public_id": public_id, "version": 1, "format": "webp", "resource_type": "image",
+                "bytes": size, "url": url.replace("https://", "http://"), "secure_url": url}
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire `ttl` seconds after being set.
+
+    Tracks hits, misses and evictions so callers can report hit rates.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Deletes every key matching `predicate`; returns how many were removed."""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class DiskCache:
+    """
+    Size-bounded key/value store in a SQLite file, shared by every process that
+    opens the same path.
+
+    Values are bytes. Once the total stored size exceeds `max_bytes`, the
+    least recently read entries are evicted. Tracks hits, misses and
+    evictions like TTLCache.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, name: str = "disk_cache"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute(
+            "create table if not exists entries ("
+            " key text primary key, value blob not null, size integer not null, accessed real not null)"
+        )
+        self._conn.execute("create index if not exists entries_accessed on entries (accessed)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("select value from entries where key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("update entries set accessed = ? where key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._conn.execute(
+                "insert or replace into entries (key, value, size, accessed) values (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("select coalesce(sum(size), 0) from entries").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._conn.execute("select key, size from entries order by accessed limit 1").fetchone()
+            if row is None:
+                return
+            self._conn.execute("delete from entries where key = ?", (row[0],))
+            total -= row[1]
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("delete from entries where key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("delete from entries")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("select count(*) from entries").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        with self._lock:
+            size, count = self._conn.execute("select coalesce(sum(size), 0), count(*) from entries").fetchone()
+        return {
+            "name": self.name,
+            "size": count,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -1,13 +1,116 @@
+import asyncio
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from typing import Any, List, Optional
 
-load_dotenv()
+import httpx
+import orjson
+from postgrest.exceptions import APIError
+from supabase import create_client, acreate_client, Client, AsyncClient, AsyncClientOptions, ClientOptions
+import metrics
+import providers
 
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
 
-if not url or not key:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+def _credentials():
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+    return url, key
 
-supabase: Client = create_client(url, key)
+
+# httpcore rescans every pooled connection for each one that sits idle whenever
+# a request joins or leaves the pool, which is quadratic in the pool size; at
+# 100 connections that bookkeeping alone saturated the event loop under load.
+POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+TIMEOUT_S = float(os.getenv("SUPABASE_TIMEOUT_S", "10"))
+
+
+# Both clients send through metrics' timed transports, so every PostgREST and
+# auth call shows up as a request span
+def _create_sync_client() -> Client:
+    http_client = httpx.Client(
+        transport=metrics.TimedTransport(httpx.HTTPTransport()),
+        timeout=httpx.Timeout(TIMEOUT_S, connect=3.05),
+        follow_redirects=True,
+    )
+    return create_client(*_credentials(), options=ClientOptions(httpx_client=http_client))
+
+
+# Sync client for scripts and background threads (ingredient index, caches),
+# created on first use: most requests only need the async client below
+providers.register("supabase", _create_sync_client)
+
+
+def get_supabase() -> Client:
+    return providers.get("supabase")
+
+
+def __getattr__(name: str) -> Any:
+    # Keeps `from db import supabase` working for scripts
+    if name == "supabase":
+        return get_supabase()
+    raise AttributeError(f"module 'db' has no attribute {name!r}")
+
+# Async client for request handlers. One per process, sharing a single httpx
+# connection pool, so concurrent requests wait on sockets instead of holding
+# threadpool workers.
+_async_supabase: Optional[AsyncClient] = None
+_async_lock = asyncio.Lock()
+
+
+async def get_async_supabase() -> AsyncClient:
+    """FastAPI dependency returning the shared async Supabase client."""
+    global _async_supabase
+    if _async_supabase is None:
+        async with _async_lock:
+            if _async_supabase is None:
+                # limits/http2 belong to the transport once one is passed in
+                transport = httpx.AsyncHTTPTransport(
+                    limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+                    http2=True,
+                )
+                http_client = httpx.AsyncClient(
+                    transport=metrics.TimedAsyncTransport(transport),
+                    timeout=httpx.Timeout(TIMEOUT_S, connect=3.05),
+                    follow_redirects=True,
+                )
+                _async_supabase = await acreate_client(*_credentials(), options=AsyncClientOptions(httpx_client=http_client))
+    return _async_supabase
+
+
+async def close_async_supabase() -> None:
+    global _async_supabase
+    if _async_supabase is not None:
+        http_client = _async_supabase.options.httpx_client
+        _async_supabase = None
+        if http_client is not None:
+            await http_client.aclose()
+
+
+def authed_rpc(db: AsyncClient, fn: str, params: dict, authorization: str):
+    """
+    db.rpc() carrying the caller's token, so the function runs under their RLS.
+
+    RPC builders have no `.headers` like table builders; the header goes on
+    the underlying request.
+    """
+    rpc_query = db.rpc(fn, params)
+    rpc_query.request.headers["authorization"] = authorization
+    return rpc_query
+
+
+async def fetch_rows(query) -> List[Any]:
+    """
+    Sends a built PostgREST read and decodes the rows with orjson.
+
+    `execute()` validates list bodies through pydantic's generic JSON schema,
+    which costs tens of milliseconds of event-loop time on the nested
+    recipe/meal-plan selects; hot list endpoints read through here instead.
+    """
+    res = await query.request.send(httpx.Headers())
+    if not res.is_success:
+        try:
+            raise APIError(orjson.loads(res.content))
+        except orjson.JSONDecodeError:
+            raise APIError({"message": res.text, "code": str(res.status_code)})
+    return orjson.loads(res.content) if res.content else []
@@ -0,0 +1,253 @@
+import bisect
+import heapq
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import pagination
+
+# In-memory search index over the shared `ingredients` table.
+#
+# `ilike('%q%')` cannot use a btree index, so every keystroke in the ingredient
+# picker used to scan the whole table. Instead we keep two structures per
+# process: a sorted list of name/word keys for prefix lookups, and trigram
+# posting lists for substring matches. Typos are handled by matching query
+# words against the (small) word vocabulary by trigram similarity and then
+# re-running the exact lookups with the corrected words. The index is built in
+# a background thread on first search (callers fall back to an ILIKE query
+# until it is ready), refreshed every INDEX_TTL_S to pick up rows written by
+# other instances, and patched in place when this instance inserts ingredients.
+
+INDEX_TTL_S = float(os.getenv("INGREDIENT_INDEX_TTL_S", "300"))
+LOAD_PAGE_SIZE = 1000
+INDEX_FIELDS = "id, api_id, name, calories_per_g, protein_per_g, image_url"
+LOAD_ORDER = [("id", False)]
+# Wait before retrying a load that failed, so a broken table is not re-read on every search
+LOAD_RETRY_S = 30.0
+
+# Ranking buckets, lower is better
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(5)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PREFIX_SCAN_CAP = 500
+_SUBSTRING_SCAN_CAP = 2000
+_FUZZY_MIN_SIMILARITY = 0.3
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientIndex:
+    def __init__(self, rows: Iterable[Dict[str, Any]] = ()):
+        self._rows: List[Dict[str, Any]] = []
+        self._names: List[str] = []
+        self._doc_by_key: Dict[str, int] = {}
+        self._keys: List[tuple] = []
+        self._postings: Dict[str, set] = {}
+        self._vocab: set = set()
+        self._vocab_postings: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.loaded_at = time.monotonic()
+
+        for row in rows:
+            if row.get('name') and self._row_key(row) not in self._doc_by_key:
+                self._insert(row, keep_sorted=False)
+        self._keys.sort()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @staticmethod
+    def _row_key(row: Dict[str, Any]) -> str:
+        return str(row.get('api_id') or row['id'])
+
+    def _index_keys(self, doc: int, name: str) -> List[tuple]:
+        words = set(_WORD.findall(name))
+        for word in words - self._vocab:
+            self._vocab.add(word)
+            for gram in _trigrams(word):
+                self._vocab_postings.setdefault(gram, set()).add(word)
+        keys = [(name, doc)]
+        keys.extend((w, doc) for w in words if w != name)
+        return keys
+
+    def _insert(self, row: Dict[str, Any], keep_sorted: bool) -> None:
+        name = _normalize(row['name'])
+        doc = len(self._rows)
+        self._rows.append(row)
+        self._names.append(name)
+        self._doc_by_key[self._row_key(row)] = doc
+        for key in self._index_keys(doc, name):
+            if keep_sorted:
+                bisect.insort(self._keys, key)
+            else:
+                self._keys.append(key)
+        for gram in _trigrams(name):
+            self._postings.setdefault(gram, set()).add(doc)
+
+    def add(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Adds freshly inserted ingredient rows without a reload."""
+        with self._lock:
+            for row in rows:
+                if row and row.get('name') and self._row_key(row) not in self._doc_by_key:
+                    self._insert(row, keep_sorted=True)
+
+    def _prefix_docs(self, q: str) -> List[int]:
+        lo = bisect.bisect_left(self._keys, (q,))
+        hi = bisect.bisect_left(self._keys, (q + "\uffff",), lo)
+        return [doc for _, doc in self._keys[lo:min(hi, lo + _PREFIX_SCAN_CAP)]]
+
+    def _substring_docs(self, q: str) -> List[int]:
+        # Every inner trigram of q must occur in a name that contains q
+        postings = [self._postings.get(q[i:i + 3]) for i in range(len(q) - 2)]
+        if not postings or any(p is None for p in postings):
+            return []
+        postings.sort(key=len)
+        docs = set(postings[0])
+        for p in postings[1:]:
+            docs &= p
+            if not docs:
+                return []
+        names = self._names
+        matches = []
+        for doc in docs:
+            if q in names[doc]:
+                matches.append(doc)
+                if len(matches) >= _SUBSTRING_SCAN_CAP:
+                    break
+        return matches
+
+    def _correct_word(self, word: str) -> Optional[str]:
+        if word in self._vocab or len(word) < 3:
+            return None
+        grams = _trigrams(word)
+        overlap: Counter = Counter()
+        for g in grams:
+            overlap.update(self._vocab_postings.get(g, ()))
+        best, best_sim = None, _FUZZY_MIN_SIMILARITY
+        for candidate, shared in overlap.items():
+            # Jaccard similarity over trigram sets, like pg_trgm's similarity()
+            sim = shared / (len(grams) + len(_trigrams(candidate)) - shared)
+            if sim > best_sim or (sim == best_sim and best is not None and candidate < best):
+                best, best_sim = candidate, sim
+        return best
+
+    def _exact_matches(self, q: str, limit: int, best: Dict[int, tuple], fuzzy: bool = False) -> None:
+        names = self._names
+
+        def consider(doc: int, bucket: int):
+            if fuzzy:
+                bucket = FUZZY
+            rank = (bucket, len(names[doc]), names[doc])
+            if doc not in best or rank < best[doc]:
+                best[doc] = rank
+
+        for doc in self._prefix_docs(q):
+            name = names[doc]
+            if name == q:
+                consider(doc, EXACT)
+            elif name.startswith(q):
+                consider(doc, PREFIX)
+            else:
+                consider(doc, WORD_PREFIX)
+
+        # Lower buckets can only fill remaining slots
+        if len(q) >= 3 and len(best) < limit:
+            for doc in self._substring_docs(q):
+                consider(doc, SUBSTRING)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Returns up to `limit` rows ranked exact > name prefix > word prefix >
+        substring > typo-corrected, shorter names first within a bucket.
+        """
+        q = _normalize(query)
+        if not q:
+            return []
+
+        # add() mutates the posting sets and key list in place
+        with self._lock:
+            best: Dict[int, tuple] = {}
+            self._exact_matches(q, limit, best)
+
+            if len(best) < limit:
+                words = q.split(" ")
+                corrected = [self._correct_word(w) or w for w in words]
+                if corrected != words:
+                    self._exact_matches(" ".join(corrected), limit, best, fuzzy=True)
+
+            ranked = heapq.nsmallest(limit, best, key=best.__getitem__)
+            return [self._rows[doc] for doc in ranked]
+
+
+_index: Optional[IngredientIndex] = None
+_index_lock = threading.Lock()
+_reloading = False
+_failed_at: Optional[float] = None
+
+
+def _load_rows() -> List[Dict[str, Any]]:
+    # Keyset pages on id: each page is an index range scan, unlike OFFSET
+    from db import get_supabase
+    supabase = get_supabase()
+    rows = []
+    cursor = None
+    while True:
+        query = pagination.order(supabase.table("ingredients").select(INDEX_FIELDS), LOAD_ORDER)
+        query = pagination.after(query, LOAD_ORDER, cursor).limit(LOAD_PAGE_SIZE + 1)
+        page, cursor = pagination.split_page(query.execute().data or [], LOAD_PAGE_SIZE, LOAD_ORDER)
+        rows.extend(page)
+        if not cursor:
+            return rows
+
+
+def _reload() -> None:
+    global _index, _reloading, _failed_at
+    try:
+        _index = IngredientIndex(_load_rows())
+        _failed_at = None
+    except Exception as e:
+        print(f"Ingredient index load error: {e}")
+        _failed_at = time.monotonic()
+        # Keep serving the stale index rather than none at all
+        if _index is not None:
+            _index.loaded_at = time.monotonic()
+    finally:
+        _reloading = False
+
+
+def get_index() -> Optional[IngredientIndex]:
+    """
+    Returns the process-wide index without blocking. The first call starts
+    loading it from the ingredients table in the background; once stale it
+    is rebuilt the same way while the old one keeps serving. Returns None
+    until a load has finished so callers can fall back to querying the table
+    directly.
+    """
+    global _reloading
+    index = _index
+    if index is not None and time.monotonic() - index.loaded_at < INDEX_TTL_S:
+        return index
+
+    with _index_lock:
+        stale = _index is None or time.monotonic() - _index.loaded_at >= INDEX_TTL_S
+        backing_off = _index is None and _failed_at is not None and time.monotonic() - _failed_at < LOAD_RETRY_S
+        if stale and not _reloading and not backing_off:
+            _reloading = True
+            threading.Thread(target=_reload, name="ingredient-index-reload", daemon=True).start()
+        return _index
+
+
+def add_ingredients(rows: Iterable[Dict[str, Any]]) -> None:
+    """Patches newly inserted ingredients into the index if it is loaded."""
+    if _index is not None:
+        _index.add(rows)
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from fastapi import Response
+from postgrest.exceptions import APIError
+
+from cache import TTLCache
+from db import authed_rpc, fetch_rows
+
+# Per-user cache of rendered listing responses (recipes, meal plans, summaries).
+#
+# Every instance may write, so entries are validated against a per-user data
+# version kept in Postgres: triggers bump user_data_versions on any change to
+# the user's recipes, ingredient links or meal plans (database/schema.sql). A
+# read first fetches that version with `versions()` (one small RPC), and a
+# cached entry is only served if it was rendered at the same version. Until
+# the function is deployed nothing is cached, since no instance could tell
+# when another one wrote.
+#
+# Write endpoints still call `invalidate()` once their writes are done, which
+# frees the user's entries here and bumps a local version counter. `put()`
+# drops a result if that counter moved while the read was in flight.
+#
+# The ETag is derived from the shared version and the cache key, so it names
+# the data rather than the bytes: any instance can answer a matching
+# If-None-Match with 304 after the version RPC alone, whether or not it has
+# the listing cached. Without a shared version the ETag falls back to a hash
+# of the rendered body, which still spares clients the download.
+
+LISTING_CACHE_SIZE = int(os.getenv("LISTING_CACHE_SIZE", "2048"))
+LISTING_CACHE_TTL_S = float(os.getenv("LISTING_CACHE_TTL_S", "60"))
+# How long to skip the version RPC after it answered "not deployed"
+SHARED_VERSION_RETRY_S = 300.0
+# Part of every version ETag, so a deploy that changes what listings look
+# like does not answer 304 for bodies rendered by the previous one
+_DEPLOYMENT = os.getenv("VERCEL_GIT_COMMIT_SHA", "")
+
+RECIPES = "recipes"
+MEAL_PLANS = "meal_plans"
+MEAL_PLAN_SUMMARY = "meal_plan_summary"
+ALL_KINDS = (RECIPES, MEAL_PLANS, MEAL_PLAN_SUMMARY)
+
+_cache = TTLCache(maxsize=LISTING_CACHE_SIZE, ttl=LISTING_CACHE_TTL_S, name="listings")
+_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+_kind_hits: Dict[str, int] = {kind: 0 for kind in ALL_KINDS}
+_kind_misses: Dict[str, int] = {kind: 0 for kind in ALL_KINDS}
+_invalidations = 0
+_shared_missing_at: Optional[float] = None
+
+
+def key(user_id: Any, kind: str, *params: Hashable) -> Tuple:
+    return (str(user_id), kind) + tuple(str(p) if p is not None else None for p in params)
+
+
+def version(user_id: Any) -> int:
+    return _versions.get(str(user_id), 0)
+
+
+async def shared_version(db, authorization: str) -> Optional[int]:
+    """The caller's data version from Postgres, or None while user_data_version is not deployed."""
+    global _shared_missing_at
+    if _shared_missing_at is not None and time.monotonic() - _shared_missing_at < SHARED_VERSION_RETRY_S:
+        return None
+    try:
+        shared = await fetch_rows(authed_rpc(db, "user_data_version", {}, authorization))
+    except APIError as e:
+        # PGRST202: function not deployed yet. Anything else is a real failure.
+        if "PGRST202" not in str(e):
+            raise
+        print("user_data_version missing, listings are not cached")
+        _shared_missing_at = time.monotonic()
+        return None
+    _shared_missing_at = None
+    return int(shared or 0)
+
+
+async def versions(db, user_id: Any, authorization: str) -> Tuple[int, Optional[int]]:
+    """(local, shared) versions to note before a listing read, for `get()` and `put()`."""
+    local = version(user_id)
+    return local, await shared_version(db, authorization)
+
+
+# Response headers stored and replayed with a cached body (pagination links)
+_KEPT_HEADERS = ("x-next-cursor", "link")
+
+
+def _etag(cache_key: Tuple, shared: Optional[int], body: bytes, headers: Dict[str, str]) -> str:
+    if shared is not None:
+        digest = hashlib.blake2b(repr((cache_key, shared, _DEPLOYMENT)).encode(), digest_size=16)
+    else:
+        digest = hashlib.blake2b(body, digest_size=16)
+        for name in _KEPT_HEADERS:
+            digest.update(headers.get(name, "").encode())
+    return '"' + digest.hexdigest() + '"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _respond(body: bytes, etag: str, kept: Dict[str, str], if_none_match: Optional[str]) -> Response:
+    headers = {**kept, "ETag": etag, "Cache-Control": "private, no-cache"}
+    if _matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def get(cache_key: Tuple, seen: Tuple[int, Optional[int]], if_none_match: Optional[str] = None) -> Optional[Response]:
+    """
+    Returns 304 if `if_none_match` names the listing at the shared version in
+    `seen`, else the cached response rendered at that version, else None.
+    """
+    shared = seen[1]
+    kind = cache_key[1]
+    if shared is None:
+        _kind_misses[kind] = _kind_misses.get(kind, 0) + 1
+        return None
+    entry = _cache.get(cache_key)
+    if entry is None or entry[0] != shared:
+        etag = _etag(cache_key, shared, b"", {})
+        if not _matches(if_none_match, etag):
+            _kind_misses[kind] = _kind_misses.get(kind, 0) + 1
+            return None
+        # The client already has this version, possibly from another instance
+        entry = (shared, b"", etag, {})
+    _kind_hits[kind] = _kind_hits.get(kind, 0) + 1
+    return _respond(*entry[1:], if_none_match)
+
+
+def put(cache_key: Tuple, response: Response, seen: Tuple[int, Optional[int]], if_none_match: Optional[str] = None) -> Response:
+    """
+    Tags a freshly rendered response with its ETag and caches it under the
+    shared version in `seen`, unless there is none or the user's listings
+    were invalidated here since.
+    """
+    if response.status_code != 200:
+        return response
+    local, shared = seen
+    kept = {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers}
+    entry = (shared, response.body, _etag(cache_key, shared, response.body, kept), kept)
+    if shared is not None and version(cache_key[0]) == local:
+        _cache.set(cache_key, entry)
+    return _respond(*entry[1:], if_none_match)
+
+
+def invalidate(user_id: Any, *kinds: str) -> int:
+    """Drops the user's cached listings of `kinds` (all kinds if none given)."""
+    global _invalidations
+    user = str(user_id)
+    kinds = kinds or ALL_KINDS
+    with _versions_lock:
+        _versions[user] = _versions.get(user, 0) + 1
+        _invalidations += 1
+    return _cache.delete_where(lambda k: k[0] == user and k[1] in kinds)
+
+
+def clear() -> None:
+    _cache.clear()
+
+
+def stats() -> Dict[str, Any]:
+    stats = _cache.stats()
+    stats["invalidations"] = _invalidations
+    stats["kinds"] = {}
+    for kind in ALL_KINDS:
+        hits, misses = _kind_hits[kind], _kind_misses[kind]
+        stats["kinds"][kind] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+    return stats
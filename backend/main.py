@@ -4,14 +4,35 @@ import os
 # Add the current directory to sys.path to ensure modules are found
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# The only load_dotenv(): everything below reads os.environ after this
 from dotenv import load_dotenv
 load_dotenv()
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routers import recipes, meal_plans
+from db import close_async_supabase
+from auth import token_cache_stats
+from services.spoonacular_service import cache_stats as spoonacular_cache_stats
+from services.ai_service import parse_cache_stats
+from services.cloudinary_service import upload_stats
+import listing_cache
+import metrics
+import providers
+import resilience
+import usage_counter
 
-app = FastAPI(title="Meal Planner API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    usage_counter.start()
+    yield
+    # Write pending usage counts while the client is still open
+    await usage_counter.stop()
+    await close_async_supabase()
+
+app = FastAPI(title="Meal Planner API", lifespan=lifespan)
 
 import os
 
@@ -24,10 +45,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let api.js read ETags and pagination cursors
+    expose_headers=["ETag", "X-Next-Cursor", "Link", "Server-Timing"],
 )
 
+# Writes usage counts per request where no lifespan flusher runs (serverless)
+app.add_middleware(usage_counter.FlushMiddleware)
+
+# Outermost, so its timings include CORS and every router
+app.add_middleware(metrics.TimingMiddleware)
+
 app.include_router(recipes.router, prefix="/api")
 app.include_router(meal_plans.router, prefix="/api")
+metrics.prefix_routes(recipes.router, "/api")
+metrics.prefix_routes(meal_plans.router, "/api")
 
 @app.get("/")
 def read_root():
@@ -36,3 +67,34 @@ def read_root():
 @app.get("/api")
 def read_api_root():
     return {"message": "Welcome to Meal Planner API"}
+
+@app.get("/api/cache/stats")
+def read_cache_stats():
+    """Hit rates of the in-process caches (counters only, no cached data)."""
+    return {
+        "listings": listing_cache.stats(),
+        "auth_tokens": token_cache_stats(),
+        "spoonacular": spoonacular_cache_stats(),
+        "recipe_parse": parse_cache_stats(),
+        "usage_counts": usage_counter.stats(),
+        "image_uploads": upload_stats(),
+        "providers": providers.stats(),
+    }
+
+@app.get("/api/dependencies")
+def read_dependencies():
+    """Circuit breaker and bulkhead state per external service (see resilience.py)."""
+    return resilience.stats()
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Prometheus scrape: route/upstream latency histograms and cache hit ratios."""
+    listings = listing_cache.stats()
+    caches = {
+        "listings": listings,
+        **{f"listings_{kind}": stats for kind, stats in listings["kinds"].items()},
+        "auth_tokens": token_cache_stats(),
+        "recipe_parse": parse_cache_stats(),
+        **{stats["name"]: stats for stats in spoonacular_cache_stats()},
+    }
+    return PlainTextResponse(metrics.render(caches), media_type="text/plain; version=0.0.4")
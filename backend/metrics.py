@@ -0,0 +1,250 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from starlette.datastructures import MutableHeaders
+
+# Request latency and upstream spans.
+#
+# TimingMiddleware times every request and gives it a RequestTimings that
+# `span()` blocks (Gemini, Cloudinary, Spoonacular) and the Supabase httpx
+# transports (PostgREST, auth) add to while it runs. Each response gets a
+# Server-Timing header with the per-upstream totals so far, and everything
+# feeds the Prometheus histograms that GET /api/metrics renders. Work handed
+# to our own thread pools keeps its request only when submitted through
+# `bind()`; spans outside any request still count in the histograms.
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram with a fixed label set."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # bucket counts, then +Inf count and sum
+                series = self._series[label_values] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            sep = "," if labels else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound:g}"}} {count:g}')
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series[-2]:g}')
+            lines.append(f"{self.name}_count{{{labels}}} {series[-2]:g}")
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]:.6f}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route template.",
+    ("method", "route", "status"), LATENCY_BUCKETS_S)
+UPSTREAM_SECONDS = Histogram(
+    "upstream_request_duration_seconds", "Latency of calls to external services.",
+    ("upstream",), LATENCY_BUCKETS_S)
+UPSTREAM_CALLS = Histogram(
+    "upstream_calls_per_request", "Upstream calls made while serving one request.",
+    ("route",), CALL_COUNT_BUCKETS)
+
+# Endpoint -> prefix it is included under (see prefix_routes)
+_route_prefixes: Dict[Callable, str] = {}
+
+_upstream_errors: Dict[str, int] = {}
+_errors_lock = threading.Lock()
+
+
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.calls = 0
+        self._spans: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, upstream: str, seconds: float) -> None:
+        with self._lock:
+            span = self._spans.setdefault(upstream, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+            self.calls += 1
+
+    def server_timing(self) -> str:
+        entries = [f"app;dur={(time.perf_counter() - self.start) * 1000:.1f}"]
+        with self._lock:
+            for upstream, (seconds, count) in sorted(self._spans.items()):
+                entries.append(f'{upstream};desc="{count} call{"s" if count != 1 else ""}";dur={seconds * 1000:.1f}')
+        return ", ".join(entries)
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def record(upstream: str, seconds: float, failed: bool = False) -> None:
+    UPSTREAM_SECONDS.observe(seconds, upstream)
+    if failed:
+        with _errors_lock:
+            _upstream_errors[upstream] = _upstream_errors.get(upstream, 0) + 1
+    timings = _current.get()
+    if timings is not None:
+        timings.add(upstream, seconds)
+
+
+@contextmanager
+def span(upstream: str):
+    """Times the block as one call to `upstream`; works around sync and awaited code."""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        record(upstream, time.perf_counter() - start, failed)
+
+
+def bind(fn: Callable, *args: Any, **kwargs: Any) -> Callable[[], Any]:
+    """`fn(*args, **kwargs)` as a no-arg callable that runs in the caller's context (for executors)."""
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(fn, *args, **kwargs)
+
+
+def prefix_routes(router, prefix: str) -> None:
+    """Labels `router`'s routes with the prefix app.include_router adds, which scope["route"] lacks."""
+    for route in router.routes:
+        endpoint = getattr(route, "endpoint", None)
+        if endpoint is not None:
+            _route_prefixes[endpoint] = prefix
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if not path:
+        return "unmatched"
+    return _route_prefixes.get(getattr(route, "endpoint", None), "") + path
+
+
+def _supabase_upstream(path: str) -> str:
+    if path.startswith("/rest/"):
+        return "postgrest"
+    if path.startswith("/auth/"):
+        return "supabase_auth"
+    if path.startswith("/storage/"):
+        return "supabase_storage"
+    return "supabase"
+
+
+class TimedAsyncTransport(httpx.AsyncBaseTransport):
+    """Records a span per Supabase request, up to the response headers."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with span(_supabase_upstream(request.url.path)):
+            return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class TimedTransport(httpx.BaseTransport):
+    """Sync counterpart of TimedAsyncTransport."""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with span(_supabase_upstream(request.url.path)):
+            return self._transport.handle_request(request)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class TimingMiddleware:
+    """ASGI middleware: request histograms, upstream call counts and Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    MutableHeaders(scope=message).append("Server-Timing", timings.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # Route templates, not raw paths, keep label cardinality bounded
+            route = _route_label(scope)
+            REQUEST_SECONDS.observe(time.perf_counter() - timings.start, scope["method"], route, str(status))
+            UPSTREAM_CALLS.observe(timings.calls, route)
+            _current.reset(token)
+
+
+def render(caches: Dict[str, Dict[str, Any]]) -> str:
+    """Prometheus text exposition; `caches` maps cache name to a stats() dict with hits/misses."""
+    lines: List[str] = []
+    for histogram in (REQUEST_SECONDS, UPSTREAM_SECONDS, UPSTREAM_CALLS):
+        lines.extend(histogram.render())
+
+    lines += ["# HELP upstream_errors_total Upstream calls that raised.", "# TYPE upstream_errors_total counter"]
+    with _errors_lock:
+        errors = sorted(_upstream_errors.items())
+    lines += [f'upstream_errors_total{{upstream="{_escape(name)}"}} {count}' for name, count in errors]
+
+    for metric, kind, help in (
+        ("cache_hits_total", "counter", "Cache lookups that hit."),
+        ("cache_misses_total", "counter", "Cache lookups that missed."),
+        ("cache_hit_ratio", "gauge", "Hits over lookups since start."),
+    ):
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+        for name, stats in sorted(caches.items()):
+            hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+            value = {"cache_hits_total": hits, "cache_misses_total": misses,
+                     "cache_hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0}[metric]
+            lines.append(f'{metric}{{cache="{_escape(name)}"}} {value:g}')
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from uuid import UUID
 from enum import Enum
@@ -74,6 +74,22 @@ class MealPlanBase(BaseModel):
 class MealPlanCreate(MealPlanBase):
     pass
 
+class MealPlanCopyWeek(BaseModel):
+    from_date: date
+    to_date: date
+    days: int = Field(7, ge=1, le=31)
+    replace: bool = False
+
+class MealPlanGenerate(BaseModel):
+    start_date: date
+    end_date: date
+    calories_target: int = Field(..., gt=0)
+    protein_target_g: float = Field(0.0, ge=0)
+    meal_types: List[MealType] = [MealType.Breakfast, MealType.Lunch, MealType.Dinner]
+    # A recipe is not repeated within this many days when the library allows it
+    min_gap_days: int = Field(3, ge=1, le=14)
+    seed: Optional[int] = None
+
 class MealPlan(MealPlanBase):
     id: UUID
     user_id: UUID
@@ -0,0 +1,143 @@
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from models import MealType
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Nutrition totals for a range of meal plans.
+#
+# The summary select only pulls the numbers it needs:
+#   date, meal_type, recipe:recipes(calories_per_serving, protein_g,
+#       recipe_ingredients(amount_g, ingredients(calories_per_g, protein_per_g)))
+# Rows are flattened once into parallel arrays (one entry per ingredient link,
+# tagged with its meal plan) and every total after that is a NumPy bincount.
+# A recipe with ingredients counts as the sum of amount_g * per-gram values; a
+# recipe without any falls back to its stored calories_per_serving/protein_g,
+# which is what the planner used to add up in the browser.
+
+SUMMARY_SELECT = (
+    "date, meal_type, recipe:recipes(calories_per_serving, protein_g, "
+    "recipe_ingredients(amount_g, ingredients(calories_per_g, protein_per_g)))"
+)
+MEAL_TYPES = [m.value for m in MealType]
+_MEAL_TYPE_INDEX = {m: i for i, m in enumerate(MEAL_TYPES)}
+
+
+def _num(value: Any) -> float:
+    return float(value) if value is not None else 0.0
+
+
+def _round(values: "np.ndarray") -> List[float]:
+    return values.round(1).tolist()
+
+
+def summarize(rows: List[Dict[str, Any]], start_date: date, end_date: date) -> Dict[str, Any]:
+    """
+    Returns per-day and per-meal-type calorie/protein totals for
+    [start_date, end_date] plus range averages. `days` holds parallel arrays
+    over the days that have at least one planned meal; empty days are left
+    out there but still count towards the `per_day` average.
+    """
+    # Imported here so cold starts that never summarize skip NumPy's ~70ms
+    import numpy as np
+
+    n_days = (end_date - start_date).days + 1
+    n_types = len(MEAL_TYPES)
+
+    # 1. One slot per meal plan: (day offset, meal type) and fallback values
+    slot_day, slot_type, fallback_cal, fallback_pro, has_ingredients = [], [], [], [], []
+    # 2. One entry per ingredient link, pointing back at its slot
+    link_slot, amount, cal_per_g, pro_per_g = [], [], [], []
+
+    for row in rows:
+        recipe = row.get('recipe')
+        meal_type = _MEAL_TYPE_INDEX.get(row.get('meal_type'))
+        if not recipe or meal_type is None:
+            continue
+        day = (date.fromisoformat(str(row['date'])[:10]) - start_date).days
+        if not 0 <= day < n_days:
+            continue
+
+        slot = len(slot_day)
+        slot_day.append(day)
+        slot_type.append(meal_type)
+        fallback_cal.append(_num(recipe.get('calories_per_serving')))
+        fallback_pro.append(_num(recipe.get('protein_g')))
+
+        linked = False
+        for ri in recipe.get('recipe_ingredients') or ():
+            ingredient = ri.get('ingredients')
+            if ingredient:
+                linked = True
+                link_slot.append(slot)
+                amount.append(_num(ri.get('amount_g')))
+                cal_per_g.append(_num(ingredient.get('calories_per_g')))
+                pro_per_g.append(_num(ingredient.get('protein_per_g')))
+        has_ingredients.append(linked)
+
+    n_slots = len(slot_day)
+    day_idx = np.asarray(slot_day, dtype=np.intp)
+    cell_idx = day_idx * n_types + np.asarray(slot_type, dtype=np.intp)
+
+    # 3. Per-meal totals: ingredient sums where the recipe has ingredients,
+    #    stored per-serving values otherwise
+    links = np.asarray(link_slot, dtype=np.intp)
+    grams = np.asarray(amount, dtype=np.float64)
+    linked = np.asarray(has_ingredients, dtype=bool)
+    meal_cal = np.where(linked,
+                        np.bincount(links, weights=grams * np.asarray(cal_per_g, dtype=np.float64), minlength=n_slots),
+                        np.asarray(fallback_cal, dtype=np.float64))
+    meal_pro = np.where(linked,
+                        np.bincount(links, weights=grams * np.asarray(pro_per_g, dtype=np.float64), minlength=n_slots),
+                        np.asarray(fallback_pro, dtype=np.float64))
+
+    # 4. Roll meals up into a (day, meal type) grid
+    cells = n_days * n_types
+    grid_cal = np.bincount(cell_idx, weights=meal_cal, minlength=cells).astype(np.float64).reshape(n_days, n_types)
+    grid_pro = np.bincount(cell_idx, weights=meal_pro, minlength=cells).astype(np.float64).reshape(n_days, n_types)
+    grid_count = np.bincount(cell_idx, minlength=cells).reshape(n_days, n_types)
+
+    day_cal, day_pro, day_count = grid_cal.sum(axis=1), grid_pro.sum(axis=1), grid_count.sum(axis=1)
+    planned = np.flatnonzero(day_count)
+
+    # Columnar per-day arrays keep a 90-day summary to a few KB
+    days = {
+        "date": [(start_date + timedelta(days=d)).isoformat() for d in planned.tolist()],
+        "calories": _round(day_cal[planned]),
+        "protein_g": _round(day_pro[planned]),
+        "meals": {
+            MEAL_TYPES[t]: {
+                "calories": _round(grid_cal[planned, t]),
+                "protein_g": _round(grid_pro[planned, t]),
+                "count": grid_count[planned, t].tolist(),
+            }
+            for t in range(n_types)
+        },
+    }
+
+    type_cal, type_pro, type_count = _round(grid_cal.sum(axis=0)), _round(grid_pro.sum(axis=0)), grid_count.sum(axis=0).tolist()
+    total_cal, total_pro = float(day_cal.sum()), float(day_pro.sum())
+    n_planned = len(planned)
+
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "days": days,
+        "meal_types": {
+            MEAL_TYPES[t]: {"calories": type_cal[t], "protein_g": type_pro[t], "count": type_count[t]}
+            for t in range(n_types)
+        },
+        "totals": {"calories": round(total_cal, 1), "protein_g": round(total_pro, 1), "meals": n_slots},
+        "averages": {
+            "days": n_days,
+            "planned_days": n_planned,
+            # Over every day in the range, and over days with at least one meal
+            "per_day": {"calories": round(total_cal / n_days, 1), "protein_g": round(total_pro / n_days, 1)},
+            "per_planned_day": {
+                "calories": round(total_cal / n_planned, 1) if n_planned else 0.0,
+                "protein_g": round(total_pro / n_planned, 1) if n_planned else 0.0,
+            },
+        },
+    }
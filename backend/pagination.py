@@ -0,0 +1,80 @@
+import base64
+import os
+from typing import Any, List, Optional, Sequence, Tuple
+
+import orjson
+from fastapi import HTTPException, Request, Response
+
+# Keyset (cursor) pagination for PostgREST list reads.
+#
+# A page is `ORDER BY <keys> LIMIT n+1` plus a filter that starts strictly
+# after the previous page's last row, so every page costs the same index range
+# scan however deep the client has paged; OFFSET would rescan everything
+# before it. The cursor is the last row's sort-key values, base64url-encoded
+# JSON, and travels in the `X-Next-Cursor` response header (plus a Link
+# rel="next") so list bodies stay plain JSON arrays.
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# (column, descending)
+SortKey = Tuple[str, bool]
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(list(values))).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[SortKey]) -> List[Any]:
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(keys) or any(v is None for v in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _quote(value: Any) -> str:
+    # PostgREST filter literal; quoted so commas/parens/dots in names are safe
+    text = str(value)
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def order(query, keys: Sequence[SortKey]):
+    for column, desc in keys:
+        query = query.order(column, desc=desc)
+    return query
+
+
+def after(query, keys: Sequence[SortKey], cursor: Optional[str]):
+    """
+    Restricts `query` to rows sorting strictly after `cursor`:
+    (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..., with < for descending keys.
+    """
+    if not cursor:
+        return query
+    values = decode_cursor(cursor, keys)
+    branches = []
+    for i, (column, desc) in enumerate(keys):
+        terms = [f"{c}.eq.{_quote(v)}" for (c, _), v in zip(keys[:i], values[:i])]
+        terms.append(f"{column}.{'lt' if desc else 'gt'}.{_quote(values[i])}")
+        branches.append(terms[0] if len(terms) == 1 else f"and({','.join(terms)})")
+    return query.or_(",".join(branches))
+
+
+def split_page(rows: List[dict], limit: int, keys: Sequence[SortKey]) -> Tuple[List[dict], Optional[str]]:
+    """Trims the extra look-ahead row and returns (page, next cursor or None)."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor([page[-1].get(column) for column, _ in keys])
+
+
+def link_next(response: Response, request: Request, next_cursor: Optional[str]) -> Response:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return response
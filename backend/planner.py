@@ -0,0 +1,180 @@
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from models import MealType
+
+# Automatic meal planning towards daily calorie and protein targets.
+#
+# Every empty (day, meal type) slot in the range gets one of the user's
+# recipes. A day costs its squared relative miss on both targets, plus a
+# penalty for each recipe served outside its category's usual slot (see
+# CATEGORY_FIT; pairs not listed there are never chosen). A recipe is not
+# repeated within `min_gap_days` days when the library allows it.
+#
+# 1. Greedy: days in order, each empty slot takes the recipe closest to its
+#    share of what is left of the day's targets (SLOT_SHARE), with a little
+#    seeded jitter so equal-looking recipes rotate.
+# 2. Local search: for every slot, score replacing it with each recipe in one
+#    vectorized pass over the library and keep the best strict improvement of
+#    the day's cost; repeat until a pass changes nothing (or MAX_PASSES).
+#
+# Existing meals stay as they are but count towards their day's totals and
+# the variety window. Recipes are described by calories_per_serving and
+# protein_g, the same numbers the recipe list shows.
+
+MEAL_TYPES = [m.value for m in MealType]
+DEFAULT_MEAL_TYPES = ["Breakfast", "Lunch", "Dinner"]
+
+# Share of the daily targets each meal type aims for, renormalized over the
+# slots still empty on a day
+SLOT_SHARE = {"Breakfast": 0.25, "Lunch": 0.35, "Dinner": 0.4, "Snack": 0.1}
+
+# Cost of serving a recipe of a category in a meal type's slot, in units of
+# the day's squared relative miss (0.1 ~ being 30% off target)
+CATEGORY_FIT = {
+    "Breakfast": {"Breakfast": 0.0, "Snack": 0.3},
+    "Lunch": {"Lunch": 0.0, "Dinner": 0.05},
+    "Dinner": {"Dinner": 0.0, "Lunch": 0.05},
+    "Snack": {"Snack": 0.0, "Breakfast": 0.3},
+    "Other": {"Breakfast": 0.2, "Lunch": 0.1, "Dinner": 0.1, "Snack": 0.1},
+}
+
+JITTER = 0.02
+MAX_PASSES = 6
+
+
+def _num(value: Any) -> float:
+    return float(value) if value is not None else 0.0
+
+
+def generate(
+    recipes: List[Dict[str, Any]],
+    start_date: date,
+    end_date: date,
+    calories_target: float,
+    protein_target_g: float = 0.0,
+    meal_types: Optional[Iterable[str]] = None,
+    existing: Iterable[Dict[str, Any]] = (),
+    min_gap_days: int = 3,
+    seed: Optional[int] = None,
+) -> List[Dict[str, str]]:
+    """
+    Picks a recipe for every empty slot of `meal_types` in [start_date,
+    end_date]. `recipes` rows need id, category, calories_per_serving and
+    protein_g; `existing` rows (date, meal_type, recipe_id) are the slots
+    already planned. Returns the new {date, meal_type, recipe_id} items;
+    slots no recipe fits are left empty.
+    """
+    # Imported here so cold starts that never plan skip NumPy's ~70ms
+    import numpy as np
+
+    types = [t for t in MEAL_TYPES if t in set(meal_types or DEFAULT_MEAL_TYPES)]
+    n_days, n_types = (end_date - start_date).days + 1, len(types)
+    recipes = [r for r in recipes if r.get('id') and r.get('category') in CATEGORY_FIT]
+    n = len(recipes)
+    if n == 0 or n_types == 0 or n_days <= 0:
+        return []
+
+    ids = [str(r['id']) for r in recipes]
+    index = {recipe_id: i for i, recipe_id in enumerate(ids)}
+    cal = np.array([_num(r.get('calories_per_serving')) for r in recipes])
+    pro = np.array([_num(r.get('protein_g')) for r in recipes])
+    fit_by_category = {
+        category: np.array([fit.get(t, np.inf) for t in types]) for category, fit in CATEGORY_FIT.items()
+    }
+    fit = np.stack([fit_by_category[r['category']] for r in recipes])  # (n, n_types)
+    share = np.array([SLOT_SHARE[t] for t in types])
+
+    cal_target = max(float(calories_target), 1.0)
+    pro_target = max(float(protein_target_g), 1.0)
+    pro_weight = 1.0 if protein_target_g and protein_target_g > 0 else 0.0
+
+    # 1. Existing meals: fixed slots, fixed day totals and variety
+    grid = np.full((n_days, n_types), -1, dtype=np.intp)
+    fixed = np.zeros((n_days, n_types), dtype=bool)
+    used = np.zeros((n_days, n), dtype=bool)
+    day_cal, day_pro = np.zeros(n_days), np.zeros(n_days)
+    type_index = {t: i for i, t in enumerate(types)}
+    for row in existing:
+        day = (date.fromisoformat(str(row['date'])[:10]) - start_date).days
+        i = index.get(str(row.get('recipe_id')))
+        if not 0 <= day < n_days:
+            continue
+        t = type_index.get(row.get('meal_type'))
+        if t is not None:
+            fixed[day, t] = True
+        if i is not None:
+            used[day, i] = True
+            day_cal[day] += cal[i]
+            day_pro[day] += pro[i]
+
+    gap = max(int(min_gap_days), 1)
+
+    def blocked(day: int, free: Optional[int] = None):
+        # Recipes served within the variety window around `day`, optionally
+        # ignoring one use of `free` on `day` itself (the slot being replaced)
+        counts = used[max(0, day - gap + 1):day + gap].sum(axis=0)
+        if free is not None:
+            counts[free] -= 1
+        return counts > 0
+
+    def day_cost(c, p):
+        return ((c - cal_target) / cal_target) ** 2 + pro_weight * ((p - pro_target) / pro_target) ** 2
+
+    rng = np.random.default_rng(seed)
+
+    # 2. Greedy fill, largest share first
+    order = np.argsort(-share)
+    for day in range(n_days):
+        empty = [t for t in order if not fixed[day, t]]
+        for k, t in enumerate(empty):
+            left_share = share[empty[k:]].sum()
+            slot_cal = max(cal_target - day_cal[day], 0.0) * share[t] / left_share
+            slot_pro = max(pro_target - day_pro[day], 0.0) * share[t] / left_share
+            cost = ((cal - slot_cal) / cal_target) ** 2 + pro_weight * ((pro - slot_pro) / pro_target) ** 2
+            cost += fit[:, t] + rng.random(n) * JITTER
+            masked = np.where(blocked(day), np.inf, cost)
+            choice = int(np.argmin(masked))
+            if not np.isfinite(masked[choice]):
+                # Library too small for the variety window: allow repeats
+                # across days, never within one
+                masked = np.where(used[day], np.inf, cost)
+                choice = int(np.argmin(masked))
+                if not np.isfinite(masked[choice]):
+                    continue
+            grid[day, t] = choice
+            used[day, choice] = True
+            day_cal[day] += cal[choice]
+            day_pro[day] += pro[choice]
+
+    # 3. Local search on each day's cost
+    for _ in range(MAX_PASSES):
+        changed = False
+        for day in range(n_days):
+            for t in range(n_types):
+                current = grid[day, t]
+                if fixed[day, t] or current < 0:
+                    continue
+                base_c, base_p = day_cal[day] - cal[current], day_pro[day] - pro[current]
+                cost = day_cost(base_c + cal, base_p + pro) + fit[:, t]
+                cost[blocked(day, free=current)] = np.inf
+                # Keep the slot as it is unless something is strictly better
+                current_cost = day_cost(day_cal[day], day_pro[day]) + fit[current, t]
+                best = int(np.argmin(cost))
+                if cost[best] < current_cost - 1e-9:
+                    used[day, current], used[day, best] = False, True
+                    grid[day, t] = best
+                    day_cal[day] = base_c + cal[best]
+                    day_pro[day] = base_p + pro[best]
+                    changed = True
+        if not changed:
+            break
+
+    items = []
+    for day, t in zip(*np.nonzero((grid >= 0) & ~fixed)):
+        items.append({
+            "date": (start_date + timedelta(days=int(day))).isoformat(),
+            "meal_type": types[t],
+            "recipe_id": ids[grid[day, t]],
+        })
+    return items
@@ -0,0 +1,58 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Lazily constructed third-party clients (Gemini, Cloudinary, sync Supabase).
+#
+# The backend runs as a serverless function, so everything done at import time
+# is paid by every cold start, including requests that never touch the
+# service. Modules register a factory under a name at import (cheap) and call
+# `get(name)` where they need the client; the factory, and the heavy SDK
+# import inside it, runs once on first use. Tests and benchmarks swap in fakes
+# with `override()`.
+
+_factories: Dict[str, Callable[[], Any]] = {}
+_instances: Dict[str, Any] = {}
+_locks: Dict[str, threading.Lock] = {}
+_init_ms: Dict[str, float] = {}
+
+
+def register(name: str, factory: Callable[[], Any]) -> None:
+    _factories[name] = factory
+    _locks.setdefault(name, threading.Lock())
+
+
+def get(name: str) -> Any:
+    """Returns the `name` client, creating it on first call."""
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    if name not in _factories:
+        raise KeyError(f"No provider registered as {name!r}")
+    with _locks[name]:
+        if name not in _instances:
+            start = time.perf_counter()
+            _instances[name] = _factories[name]()
+            _init_ms[name] = (time.perf_counter() - start) * 1000
+    return _instances[name]
+
+
+def override(name: str, instance: Any) -> None:
+    """Uses `instance` for `name` instead of calling its factory."""
+    _locks.setdefault(name, threading.Lock())
+    _instances[name] = instance
+
+
+def reset(name: Optional[str] = None) -> None:
+    """Forgets created clients (one, or all) so the next get() rebuilds them."""
+    for key in [name] if name else list(_instances):
+        _instances.pop(key, None)
+        _init_ms.pop(key, None)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        name: {"initialized": name in _instances, "init_ms": round(_init_ms[name], 1) if name in _init_ms else None}
+        for name in _factories
+    }
@@ -0,0 +1,214 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple, Type
+
+# Bulkheads and circuit breakers for the external services (Spoonacular,
+# Gemini, Cloudinary).
+#
+# Their SDKs block a thread per call, and those threads come out of shared
+# pools: FastAPI's sync threadpool for parse and upload, the search pools for
+# Spoonacular. When an upstream gets slow, every caller piles onto it and the
+# pool has nothing left for unrelated requests. Each dependency therefore gets
+#
+# - a bulkhead: at most `max_concurrent` calls in flight. A caller waits up to
+#   `queue_timeout_s` for a slot and is then rejected, so threads stuck on a
+#   slow upstream stay bounded and a queue never builds up behind it;
+# - a circuit breaker: after `failure_threshold` consecutive failures the
+#   circuit opens and calls are rejected without touching the network for
+#   `reset_s`. Then it goes half-open and lets one probe call through: success
+#   closes it, failure opens it for another `reset_s`.
+#
+# Rejections raise Unavailable (CircuitOpen or BulkheadFull), which callers
+# turn into degraded answers or a 503. State is per process and shows up in
+# GET /api/dependencies.
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class Unavailable(Exception):
+    """A call was rejected without reaching the dependency."""
+
+    def __init__(self, message: str, retry_after_s: float = 1.0):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class CircuitOpen(Unavailable):
+    pass
+
+
+class BulkheadFull(Unavailable):
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe."""
+
+    def __init__(self, failure_threshold: int = 5, reset_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open only the one probe may."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_s:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def retry_after_s(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 1.0
+            return max(self.reset_s - (time.monotonic() - self.opened_at), 1.0)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self) -> None:
+        """Neither success nor failure (e.g. the call never went out)."""
+        with self._lock:
+            self._probing = False
+
+
+class Bulkhead:
+    """Caps concurrent calls; callers queue for at most `queue_timeout_s`."""
+
+    def __init__(self, max_concurrent: int = 8, queue_timeout_s: float = 0.5):
+        self.max_concurrent = max_concurrent
+        self.queue_timeout_s = queue_timeout_s
+        self.in_flight = 0
+        self.peak = 0
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        wait = self.queue_timeout_s if timeout is None else max(min(timeout, self.queue_timeout_s), 0.0)
+        if not self._slots.acquire(timeout=wait):
+            return False
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+
+class Dependency:
+    def __init__(self, name: str, max_concurrent: int, queue_timeout_s: float, failure_threshold: int, reset_s: float,
+                 ignore: Tuple[Type[BaseException], ...] = ()):
+        self.name = name
+        self.ignore = ignore
+        self._settings = (max_concurrent, queue_timeout_s, failure_threshold, reset_s)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Back to the registered settings, circuit closed and counters cleared; for tests."""
+        max_concurrent, queue_timeout_s, failure_threshold, reset_s = self._settings
+        self.bulkhead = Bulkhead(max_concurrent, queue_timeout_s)
+        self.breaker = CircuitBreaker(failure_threshold, reset_s)
+        self._counters = {"calls": 0, "failures": 0, "rejected_open": 0, "rejected_full": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    @contextmanager
+    def guard(self, timeout: Optional[float] = None, ignore: Tuple[Type[BaseException], ...] = ()):
+        """
+        Runs the block as one call to the dependency. Raises CircuitOpen or
+        BulkheadFull instead of entering it; exceptions from the block count
+        as failures unless they are in `ignore` (answers, not outages).
+        `timeout` caps the queue wait, e.g. to what is left of a deadline.
+        """
+        breaker, bulkhead = self.breaker, self.bulkhead
+        if not breaker.allow():
+            self._count("rejected_open")
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open)", breaker.retry_after_s())
+        if not bulkhead.acquire(timeout):
+            breaker.release()
+            self._count("rejected_full")
+            raise BulkheadFull(f"{self.name} is busy ({bulkhead.max_concurrent} calls in flight)")
+        self._count("calls")
+        try:
+            yield
+        except self.ignore + ignore:
+            breaker.release()
+            raise
+        except BaseException:
+            self._count("failures")
+            breaker.record_failure()
+            raise
+        else:
+            breaker.record_success()
+        finally:
+            bulkhead.release()
+
+    def stats(self) -> Dict[str, Any]:
+        breaker, bulkhead = self.breaker, self.bulkhead
+        open_for = time.monotonic() - breaker.opened_at if breaker.state == OPEN else None
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "state": breaker.state,
+            "consecutive_failures": breaker.failures,
+            "failure_threshold": breaker.failure_threshold,
+            "reset_s": breaker.reset_s,
+            "retry_in_s": round(max(breaker.reset_s - open_for, 0.0), 1) if open_for is not None else None,
+            "times_opened": breaker.times_opened,
+            "in_flight": bulkhead.in_flight,
+            "peak_in_flight": bulkhead.peak,
+            "max_concurrent": bulkhead.max_concurrent,
+            "queue_timeout_s": bulkhead.queue_timeout_s,
+            **counters,
+        }
+
+
+_dependencies: Dict[str, Dependency] = {}
+
+
+def register(name: str, max_concurrent: int = 8, queue_timeout_s: float = 0.5, failure_threshold: int = 5,
+             reset_s: float = 30.0, ignore: Tuple[Type[BaseException], ...] = ()) -> Dependency:
+    dependency = _dependencies[name] = Dependency(name, max_concurrent, queue_timeout_s, failure_threshold, reset_s, ignore)
+    return dependency
+
+
+def get(name: str) -> Dependency:
+    return _dependencies[name]
+
+
+def reset(name: Optional[str] = None) -> None:
+    for key in [name] if name else list(_dependencies):
+        _dependencies[key].reset()
+
+
+def stats() -> Dict[str, Any]:
+    return {name: dependency.stats() for name, dependency in sorted(_dependencies.items())}
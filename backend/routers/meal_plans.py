@@ -1,121 +1,300 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, Query, Header
-from typing import List, Optional
-from datetime import date
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+from datetime import date, timedelta
 from uuid import UUID
-from models import MealPlan, MealPlanCreate
+from models import MealPlan, MealPlanCreate, MealPlanCopyWeek, MealPlanGenerate
+from serialization import meal_plans_response, meal_plan_response, ORJSONResponse
+from nutrition import summarize, SUMMARY_SELECT
+import planner
+import shopping_list
+import listing_cache
+import usage_counter
 from auth import get_current_user
-from db import supabase
+from db import get_async_supabase, fetch_rows, authed_rpc
+from supabase import AsyncClient
 
 router = APIRouter(prefix="/meal-plans", tags=["meal-plans"])
 
+MAX_SUMMARY_DAYS = 366
+MAX_BULK_ITEMS = 200
+MAX_GENERATE_DAYS = 92
+MEAL_PLAN_SELECT = "*, recipe:recipes(*, recipe_ingredients(amount_g, ingredients(*)))"
+
 @router.get("/", response_model=List[MealPlan])
-def get_meal_plans(
+async def get_meal_plans(
     start_date: date, 
     end_date: date,
     current_user: dict = Depends(get_current_user),
-    authorization: str = Header(None)
+    authorization: str = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncClient = Depends(get_async_supabase)
 ):
-    query = supabase.table("meal_plans")
+    cache_key = listing_cache.key(current_user.id, listing_cache.MEAL_PLANS, start_date, end_date)
+    seen = await listing_cache.versions(db, current_user.id, authorization)
+    cached = listing_cache.get(cache_key, seen, if_none_match)
+    if cached is not None:
+        return cached
+
+    query = db.table("meal_plans")
     query.headers = {**query.headers, "authorization": authorization}
 
     # Fetch meal plans for the user within the date range
     # Need to fetch deeply nested ingredients for the recipe
-    response = query\
-        .select("*, recipe:recipes(*, recipe_ingredients(amount_g, ingredients(*)))")\
+    rows = await fetch_rows(query\
+        .select(MEAL_PLAN_SELECT)\
         .eq("user_id", current_user.id)\
         .gte("date", start_date)\
         .lte("date", end_date)\
-        .order("date")\
-        .execute()
-    
-    data = response.data
+        .order("date"))
     
-    # Post-process to flatten ingredients structure for Pydantic model
-    for plan in data:
-        if plan.get('recipe'):
-            r = plan['recipe']
-            flattened_ingredients = []
-            if r.get('recipe_ingredients'):
-                for ri in r['recipe_ingredients']:
-                    i = ri.get('ingredients')
-                    if i:
-                        flattened_ingredients.append({
-                            "id": i['id'],
-                            "api_id": i.get('api_id'),
-                            "name": i['name'],
-                            "amount_g": ri['amount_g'],
-                            "calories_per_g": i['calories_per_g'],
-                            "protein_per_g": i['protein_per_g'],
-                            "image_url": i.get('image_url')
-                        })
-            r['ingredients'] = flattened_ingredients
-
-    return data
+    # Flatten nested ingredients and serialize in one pass
+    return listing_cache.put(cache_key, meal_plans_response(rows), seen, if_none_match)
+
+@router.get("/summary")
+async def get_meal_plan_summary(
+    start_date: date,
+    end_date: date,
+    current_user: dict = Depends(get_current_user),
+    authorization: str = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncClient = Depends(get_async_supabase)
+):
+    """Per-day and per-meal-type calorie/protein totals for a date range."""
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (end_date - start_date).days >= MAX_SUMMARY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Summary range is limited to {MAX_SUMMARY_DAYS} days")
+
+    cache_key = listing_cache.key(current_user.id, listing_cache.MEAL_PLAN_SUMMARY, start_date, end_date)
+    seen = await listing_cache.versions(db, current_user.id, authorization)
+    cached = listing_cache.get(cache_key, seen, if_none_match)
+    if cached is not None:
+        return cached
+
+    query = db.table("meal_plans")
+    query.headers = {**query.headers, "authorization": authorization}
+
+    # Only the numbers the totals need, not full recipes
+    rows = await fetch_rows(query\
+        .select(SUMMARY_SELECT)\
+        .eq("user_id", current_user.id)\
+        .gte("date", start_date)\
+        .lte("date", end_date))
+
+    return listing_cache.put(cache_key, ORJSONResponse(summarize(rows, start_date, end_date)), seen, if_none_match)
+
+@router.get("/shopping-list")
+async def get_shopping_list(
+    start_date: date,
+    end_date: date,
+    format: str = Query("json", pattern="^(json|csv|ndjson)$"),
+    current_user: dict = Depends(get_current_user),
+    authorization: str = Header(None),
+    db: AsyncClient = Depends(get_async_supabase)
+):
+    """
+    Total grams of each ingredient across the meal plans in a date range.
+    `format=csv` or `format=ndjson` streams the list as a download.
+    """
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (end_date - start_date).days >= MAX_SUMMARY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Shopping lists are limited to {MAX_SUMMARY_DAYS} days")
+
+    items = shopping_list.iter_items(db, current_user.id, start_date, end_date, authorization)
+    if format == "json":
+        return ORJSONResponse({
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "items": [item async for item in items],
+        })
+
+    # Read the first page before answering, so a failing query is still a
+    # proper error status rather than a truncated download
+    try:
+        first = await items.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def lines():
+        if format == "csv":
+            yield shopping_list.csv_header()
+        encode = shopping_list.csv_line if format == "csv" else shopping_list.ndjson_line
+        if first is not None:
+            yield encode(first)
+            async for item in items:
+                yield encode(item)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"shopping-list-{start_date.isoformat()}-{end_date.isoformat()}.{format}"
+    return StreamingResponse(lines(), media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @router.post("/", response_model=MealPlan)
-def create_meal_plan(meal_plan: MealPlanCreate, current_user: dict = Depends(get_current_user), authorization: str = Header(None)):
+async def create_meal_plan(meal_plan: MealPlanCreate, current_user: dict = Depends(get_current_user), authorization: str = Header(None), db: AsyncClient = Depends(get_async_supabase)):
     data = meal_plan.dict()
     data['date'] = data['date'].isoformat()
     data['user_id'] = current_user.id
     data['recipe_id'] = str(data['recipe_id']) # Ensure string for UUID
     
-    query = supabase.table("meal_plans")
+    query = db.table("meal_plans")
     query.headers = {**query.headers, "authorization": authorization}
     
     # Insert meal plan (without select chaining, as it is not supported)
-    response = query.insert(data).execute()
+    response = await query.insert(data).execute()
     
     if not response.data:
         raise HTTPException(status_code=400, detail="Could not create meal plan")
 
     new_meal_plan_id = response.data[0]['id']
 
-    # Increment usage count for the recipe
-    try:
-        rpc_query = supabase.rpc("increment_recipe_usage", {"row_id": str(data['recipe_id'])})
-        rpc_query.headers = {**rpc_query.headers, "authorization": authorization}
-        rpc_query.execute()
-    except:
-        pass
+    # Counted in memory and written in batches by usage_counter
+    usage_counter.record(current_user.id, data['recipe_id'], authorization)
+    listing_cache.invalidate(current_user.id, listing_cache.MEAL_PLANS, listing_cache.MEAL_PLAN_SUMMARY)
 
     # Fetch the full meal plan with recipe relation
-    # Fetch the full meal plan with recipe relation
-    fetch_query = supabase.table("meal_plans")
+    fetch_query = db.table("meal_plans")
     fetch_query.headers = {**fetch_query.headers, "authorization": authorization}
-    final_response = fetch_query.select("*, recipe:recipes(*, recipe_ingredients(amount_g, ingredients(*)))").eq("id", new_meal_plan_id).single().execute()
-
-    plan = final_response.data
-    # Post-process single item
-    if plan and plan.get('recipe'):
-        r = plan['recipe']
-        flattened_ingredients = []
-        if r.get('recipe_ingredients'):
-             for ri in r['recipe_ingredients']:
-                i = ri.get('ingredients')
-                if i:
-                    flattened_ingredients.append({
-                        "id": i['id'],
-                        "api_id": i.get('api_id'),
-                        "name": i['name'],
-                        "amount_g": ri['amount_g'],
-                        "calories_per_g": i['calories_per_g'],
-                        "protein_per_g": i['protein_per_g'],
-                        "image_url": i.get('image_url')
-                    })
-        r['ingredients'] = flattened_ingredients
-
-    return plan
+    final_response = await fetch_query.select(MEAL_PLAN_SELECT).eq("id", new_meal_plan_id).single().execute()
+
+    return meal_plan_response(final_response.data)
+
+async def _rpc_ids(db: AsyncClient, fn: str, params: Dict[str, Any], authorization: str) -> Optional[List[str]]:
+    # One transactional round trip (see database/schema.sql); None if the function is not deployed
+    try:
+        res = await authed_rpc(db, fn, params, authorization).execute()
+        return [str(i) for i in res.data or []]
+    except Exception as e:
+        # PGRST202: function not deployed yet. Anything else is a real failure.
+        if "PGRST202" not in str(e):
+            raise
+        print(f"{fn} missing, scheduling meal plans without a transaction")
+        return None
+
+async def _insert_meal_plans(db: AsyncClient, items: List[Dict[str, Any]], user_id: str, authorization: str) -> List[str]:
+    # Fallback for _rpc_ids: one batch insert; usage counts go through usage_counter
+    if not items:
+        return []
+    query = db.table("meal_plans")
+    query.headers = {**query.headers, "authorization": authorization}
+    res = await query.insert([{**item, "user_id": user_id} for item in items]).execute()
+    for item in items:
+        usage_counter.record(user_id, item['recipe_id'], authorization)
+    return [row['id'] for row in res.data or []]
+
+async def _scheduled_response(db: AsyncClient, ids: List[str], user_id: str, authorization: str):
+    # The user's listings changed; then one re-fetch of everything created
+    listing_cache.invalidate(user_id)
+    if not ids:
+        return meal_plans_response([])
+    query = db.table("meal_plans")
+    query.headers = {**query.headers, "authorization": authorization}
+    rows = await fetch_rows(query.select(MEAL_PLAN_SELECT).in_("id", ids).order("date"))
+    return meal_plans_response(rows)
+
+@router.post("/bulk", response_model=List[MealPlan])
+async def create_meal_plans_bulk(meal_plans: List[MealPlanCreate], current_user: dict = Depends(get_current_user), authorization: str = Header(None), db: AsyncClient = Depends(get_async_supabase)):
+    """Schedules many slots at once: one insert, one usage update, one re-fetch."""
+    if len(meal_plans) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ITEMS} meal plans per request")
+    items = [
+        {"date": m.date.isoformat(), "meal_type": m.meal_type.value, "recipe_id": str(m.recipe_id)}
+        for m in meal_plans
+    ]
+    if not items:
+        return meal_plans_response([])
+
+    ids = await _rpc_ids(db, "schedule_meal_plans", {"p_items": items}, authorization)
+    if ids is None:
+        ids = await _insert_meal_plans(db, items, current_user.id, authorization)
+    return await _scheduled_response(db, ids, current_user.id, authorization)
+
+@router.post("/copy-week", response_model=List[MealPlan])
+async def copy_meal_plan_week(copy: MealPlanCopyWeek, current_user: dict = Depends(get_current_user), authorization: str = Header(None), db: AsyncClient = Depends(get_async_supabase)):
+    """Copies `days` days of plans starting at from_date to the range starting at to_date."""
+    if copy.from_date == copy.to_date:
+        raise HTTPException(status_code=400, detail="from_date and to_date must differ")
+
+    ids = await _rpc_ids(db, "copy_meal_plan_week", {
+        "p_from": copy.from_date.isoformat(),
+        "p_to": copy.to_date.isoformat(),
+        "p_days": copy.days,
+        "p_replace": copy.replace,
+    }, authorization)
+
+    if ids is None:
+        last_day = timedelta(days=copy.days - 1)
+        shift = copy.to_date - copy.from_date
+        query = db.table("meal_plans")
+        query.headers = {**query.headers, "authorization": authorization}
+        source = await fetch_rows(query.select("date, meal_type, recipe_id")\
+            .eq("user_id", current_user.id)\
+            .gte("date", copy.from_date)\
+            .lte("date", copy.from_date + last_day))
+        if copy.replace:
+            del_query = db.table("meal_plans")
+            del_query.headers = {**del_query.headers, "authorization": authorization}
+            await del_query.delete().eq("user_id", current_user.id).gte("date", copy.to_date).lte("date", copy.to_date + last_day).execute()
+        items = [
+            {"date": (date.fromisoformat(row['date']) + shift).isoformat(), "meal_type": row['meal_type'], "recipe_id": row['recipe_id']}
+            for row in source
+        ]
+        ids = await _insert_meal_plans(db, items, current_user.id, authorization)
+
+    return await _scheduled_response(db, ids, current_user.id, authorization)
+
+@router.post("/generate", response_model=List[MealPlan])
+async def generate_meal_plans(request: MealPlanGenerate, current_user: dict = Depends(get_current_user), authorization: str = Header(None), db: AsyncClient = Depends(get_async_supabase)):
+    """Fills the empty slots of [start_date, end_date] towards the daily targets (see planner.py)."""
+    if request.end_date < request.start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (request.end_date - request.start_date).days >= MAX_GENERATE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Generation is limited to {MAX_GENERATE_DAYS} days")
+
+    # 1. The user's recipes and what is already planned, concurrently
+    recipes_query = db.table("recipes")
+    recipes_query.headers = {**recipes_query.headers, "authorization": authorization}
+    plans_query = db.table("meal_plans")
+    plans_query.headers = {**plans_query.headers, "authorization": authorization}
+    recipes, existing = await asyncio.gather(
+        fetch_rows(recipes_query.select("id, category, calories_per_serving, protein_g").eq("user_id", current_user.id)),
+        fetch_rows(plans_query.select("date, meal_type, recipe_id")
+                   .eq("user_id", current_user.id)
+                   .gte("date", request.start_date)
+                   .lte("date", request.end_date)),
+    )
+    if not recipes:
+        raise HTTPException(status_code=400, detail="Add some recipes before generating a plan")
+
+    # 2. CPU-bound NumPy search off the event loop
+    items = await run_in_threadpool(
+        planner.generate, recipes, request.start_date, request.end_date,
+        request.calories_target, request.protein_target_g,
+        meal_types=[m.value for m in request.meal_types],
+        existing=existing, min_gap_days=request.min_gap_days, seed=request.seed,
+    )
+    if not items:
+        return meal_plans_response([])
+
+    # 3. One insert for the whole plan
+    ids = await _rpc_ids(db, "schedule_meal_plans", {"p_items": items}, authorization)
+    if ids is None:
+        ids = await _insert_meal_plans(db, items, current_user.id, authorization)
+    return await _scheduled_response(db, ids, current_user.id, authorization)
 
 @router.delete("/{meal_plan_id}")
-def delete_meal_plan(meal_plan_id: UUID, current_user: dict = Depends(get_current_user), authorization: str = Header(None)):
-    query = supabase.table("meal_plans")
+async def delete_meal_plan(meal_plan_id: UUID, current_user: dict = Depends(get_current_user), authorization: str = Header(None), db: AsyncClient = Depends(get_async_supabase)):
+    query = db.table("meal_plans")
     query.headers = {**query.headers, "authorization": authorization}
     
-    response = query.select("*").eq("id", str(meal_plan_id)).eq("user_id", current_user.id).execute()
+    response = await query.select("*").eq("id", str(meal_plan_id)).eq("user_id", current_user.id).execute()
     if not response.data:
          raise HTTPException(status_code=404, detail="Meal plan not found")
          
-    del_query = supabase.table("meal_plans")
+    del_query = db.table("meal_plans")
     del_query.headers = {**del_query.headers, "authorization": authorization}
-    del_query.delete().eq("id", str(meal_plan_id)).execute()
+    await del_query.delete().eq("id", str(meal_plan_id)).execute()
+    listing_cache.invalidate(current_user.id, listing_cache.MEAL_PLANS, listing_cache.MEAL_PLAN_SUMMARY)
     return {"message": "Meal plan deleted"}
@@ -1,138 +1,450 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, UploadFile, File
+import asyncio
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, Depends, HTTPException, Header, UploadFile, File, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 from models import Recipe, RecipeCreate
+from serialization import recipes_response, recipe_response, ORJSONResponse, RECIPE_FIELDS
 from auth import get_current_user
-from db import supabase
-from services.cloudinary_service import upload_image
+from db import get_async_supabase, fetch_rows, authed_rpc
+import listing_cache
+import metrics
+import pagination
+import resilience
+from supabase import AsyncClient
+from services.cloudinary_service import upload_image, MAX_UPLOAD_BYTES
 from services.ai_service import parse_recipe_from_text
-from services.spoonacular_service import search_food
+from services.spoonacular_service import search_food, iter_search_food
+import ingredient_index
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/recipes", tags=["recipes"])
 
+# Latency budget for ingredient search: the API side gets whatever is left of
+# it after local matching, and is cut off at the deadline.
+SEARCH_BUDGET_S = float(os.getenv("INGREDIENT_SEARCH_BUDGET_S", "2.5"))
+_search_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("INGREDIENT_SEARCH_WORKERS", "16")),
+    thread_name_prefix="ingredient-search",
+)
+
+# Batch parsing: at most PARSE_CONCURRENCY Gemini calls at once (the pool has
+# exactly that many threads, so even items that timed out but are still
+# waiting on Gemini count), each item cut off after PARSE_ITEM_TIMEOUT_S.
+PARSE_CONCURRENCY = int(os.getenv("PARSE_CONCURRENCY", "4"))
+PARSE_ITEM_TIMEOUT_S = float(os.getenv("PARSE_ITEM_TIMEOUT_S", "30"))
+MAX_PARSE_BATCH = 50
+_parse_pool = ThreadPoolExecutor(max_workers=PARSE_CONCURRENCY, thread_name_prefix="recipe-parse")
+
+# Keyset orderings; the trailing id makes every sort key unique
+RECIPE_ORDER = [("usage_count", True), ("id", False)]
+INGREDIENT_ORDER = [("name", False), ("id", False)]
+RECIPE_LIST_FIELDS = set(RECIPE_FIELDS) | {"ingredients"}
+RECIPE_INGREDIENTS_SELECT = "recipe_ingredients(amount_g, ingredients(*))"
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    # `fields=name,image_url,calories_per_serving` -> response keys, id always included
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(requested) - RECIPE_LIST_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in dict.fromkeys(requested) if f != "id"]
+
 @router.get("/", response_model=List[Recipe])
-def get_recipes(current_user: dict = Depends(get_current_user), category: Optional[str] = None, authorization: str = Header(None)):
-    query = supabase.table("recipes")
+async def get_recipes(
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    category: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    authorization: str = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncClient = Depends(get_async_supabase)
+):
+    projection = _parse_fields(fields)
+    cache_key = listing_cache.key(current_user.id, listing_cache.RECIPES, category, limit, cursor, ",".join(projection or ()))
+    seen = await listing_cache.versions(db, current_user.id, authorization)
+    cached = listing_cache.get(cache_key, seen, if_none_match)
+    if cached is not None:
+        return cached
+
+    query = db.table("recipes")
     # Manually set auth header for this request builder instance
     # Use lowercase "authorization" to overwrite the existing key provided by supabase-py
     query.headers = {**query.headers, "authorization": authorization}
     
-    query = query.select("*, recipe_ingredients(amount_g, ingredients(*))").eq("user_id", current_user.id)
+    if projection is None:
+        select = f"*, {RECIPE_INGREDIENTS_SELECT}"
+    else:
+        # Sort keys are always selected so the next cursor can be built;
+        # the ingredient join only runs if it was asked for
+        columns = dict.fromkeys([f for f in projection if f != "ingredients"] + [c for c, _ in RECIPE_ORDER])
+        select = ", ".join(columns) + (f", {RECIPE_INGREDIENTS_SELECT}" if "ingredients" in projection else "")
+    query = query.select(select).eq("user_id", current_user.id)
     
     if category:
         query = query.eq("category", category)
         
-    response = query.order("usage_count", desc=True).execute()
+    query = pagination.after(query, RECIPE_ORDER, cursor)
+    rows = await fetch_rows(pagination.order(query, RECIPE_ORDER).limit(limit + 1))
+    rows, next_cursor = pagination.split_page(rows, limit, RECIPE_ORDER)
     
-    # Transform nested structure to flat ingredients list
-    recipes = []
-    for r in response.data:
-        ingredients_flat = []
-        for ri in r.get('recipe_ingredients', []):
-            if ri.get('ingredients'):
-                ing = ri['ingredients']
-                ingredients_flat.append({
-                    "id": ing['id'],
-                    "api_id": ing['api_id'],
-                    "name": ing['name'],
-                    "amount_g": ri['amount_g'],
-                    "calories_per_g": ing['calories_per_g'],
-                    "protein_per_g": ing['protein_per_g'],
-                    "image_url": ing['image_url']
-                })
-        r['ingredients'] = ingredients_flat
-        recipes.append(r)
-        
-    return recipes
+    # Flatten nested ingredients and serialize in one pass
+    response = pagination.link_next(recipes_response(rows, projection), request, next_cursor)
+    return listing_cache.put(cache_key, response, seen, if_none_match)
 
 @router.get("/ingredients")
-def get_all_ingredients():
+async def get_all_ingredients(
+    request: Request,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=100),
+    db: AsyncClient = Depends(get_async_supabase)
+):
+    query = db.table("ingredients").select("*")
+    if q and q.strip():
+        # Case-insensitive substring match; pages stay keyset-ordered by name
+        query = query.ilike("name", f"%{q.strip()}%")
+    query = pagination.after(query, INGREDIENT_ORDER, cursor)
     try:
-        res = supabase.table("ingredients").select("*").order("name").execute()
-        return res.data
+        rows = await fetch_rows(pagination.order(query, INGREDIENT_ORDER).limit(limit + 1))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    rows, next_cursor = pagination.split_page(rows, limit, INGREDIENT_ORDER)
+    return pagination.link_next(ORJSONResponse(rows), request, next_cursor)
 
-@router.get("/ingredients/search")
-def search_ingredients(q: str):
-    # 1. Search Local DB
-    local_results = []
+async def _search_local(db: AsyncClient, q: str) -> List[Dict[str, Any]]:
+    # In-memory index, ILIKE scan while it is still loading or failed to load
     try:
+        index = ingredient_index.get_index()
+        if index is not None:
+            return index.search(q, limit=10)
         # Using Supabase 'ilike' for partial case-insensitive match
-        res = supabase.table("ingredients").select("*").ilike("name", f"%{q}%").limit(10).execute()
-        if res.data:
-            local_results = res.data
+        res = await db.table("ingredients").select("*").ilike("name", f"%{q}%").limit(10).execute()
+        return res.data or []
     except Exception as e:
         print(f"Local search error: {e}")
-        
-    # 2. Search External API (Spoonacular)
-    api_results = search_food(q)
-    
-    # 3. Merge and Dedup
-    # Priority: Local DB results (they might have custom user edits or be cached)
-    # Strategy: 
-    # - Start with local.
-    # - Add api result if not already in local (check by api_id or name).
-    
-    final_list = []
-    seen_ids = set() # track api_id
-    seen_names = set() # track lower-case names
-    
-    # Process Local
-    for item in local_results:
+        return []
+
+
+class _SearchMerger:
+    """
+    Merge and Dedup
+    Priority: Local DB results (they might have custom user edits or be cached)
+    Strategy:
+    - Start with local.
+    - Add api result if not already in local (check by api_id or name).
+    """
+
+    def __init__(self):
+        self.seen_ids = set() # track api_id
+        self.seen_names = set() # track lower-case names
+
+    def add_local(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         # Local items have uuid 'id', and optional 'api_id'
         # Convert to display format expected by frontend
         # Frontend expects: api_id (can be uuid if local-only), name, calories_per_g, etc.
-        
+
         # Use api_id if present, else use DB id as the unique key
         uid = item.get('api_id') or str(item['id'])
-        
-        if uid in seen_ids:
-            continue
-        if item['name'].lower() in seen_names:
-            continue
-            
-        final_list.append({
+
+        if uid in self.seen_ids:
+            return None
+        if item['name'].lower() in self.seen_names:
+            return None
+
+        if item.get('api_id'):
+            self.seen_ids.add(str(item['api_id']))
+        self.seen_names.add(item['name'].lower())
+
+        return {
             "api_id": uid, # Frontend uses this as key
             "name": item['name'],
             "calories_per_g": item['calories_per_g'],
             "protein_per_g": item['protein_per_g'],
             "image_url": item.get('image_url')
-        })
-        
-        if item.get('api_id'):
-            seen_ids.add(str(item['api_id']))
-        seen_names.add(item['name'].lower())
-        
-    # Process API
-    for item in api_results:
+        }
+
+    def add_api(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         # API items have 'api_id', 'name'
         uid = str(item['api_id'])
         name = item['name'].lower()
-        
-        if uid in seen_ids:
+
+        if uid in self.seen_ids:
+            return None
+        if name in self.seen_names:
+            return None
+
+        self.seen_ids.add(uid)
+        self.seen_names.add(name)
+        return item
+
+
+def _budget(budget_ms: Optional[int]) -> float:
+    return budget_ms / 1000.0 if budget_ms else SEARCH_BUDGET_S
+
+
+@router.get("/ingredients/search")
+async def search_ingredients(q: str, budget_ms: Optional[int] = None, db: AsyncClient = Depends(get_async_supabase)):
+    budget = _budget(budget_ms)
+    deadline = time.monotonic() + budget
+
+    # 1. Start the External API (Spoonacular) search, then search local while it runs
+    loop = asyncio.get_running_loop()
+    api_future = loop.run_in_executor(_search_pool, metrics.bind(search_food, q, deadline_s=budget))
+    local_results = await _search_local(db, q)
+
+    # 2. Whatever the API has not delivered by the deadline is left out
+    try:
+        api_results = await asyncio.wait_for(api_future, timeout=max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        print(f"Ingredient search budget ({budget:.2f}s) exceeded, returning local results")
+        api_results = []
+
+    # 3. Merge and Dedup
+    merger = _SearchMerger()
+    final_list = []
+    for item in local_results:
+        merged = merger.add_local(item)
+        if merged:
+            final_list.append(merged)
+    for item in api_results:
+        merged = merger.add_api(item)
+        if merged:
+            final_list.append(merged)
+
+    return final_list
+
+
+@router.get("/ingredients/search/stream")
+async def stream_search_ingredients(q: str, budget_ms: Optional[int] = None, db: AsyncClient = Depends(get_async_supabase)):
+    """
+    NDJSON variant of /ingredients/search. Emits one line per batch:
+    local matches first, then each API match as soon as its macros arrive,
+    then a final {"source": "done"} line. Dedup rules match the plain endpoint.
+    """
+    budget = _budget(budget_ms)
+    deadline = time.monotonic() + budget
+    loop = asyncio.get_running_loop()
+    api_queue: "asyncio.Queue" = asyncio.Queue()
+
+    def pump_api():
+        try:
+            for item in iter_search_food(q, deadline_s=budget):
+                loop.call_soon_threadsafe(api_queue.put_nowait, item)
+        except Exception as e:
+            print(f"Streaming search error: {e}")
+        finally:
+            loop.call_soon_threadsafe(api_queue.put_nowait, None)
+
+    loop.run_in_executor(_search_pool, metrics.bind(pump_api))
+
+    async def lines():
+        merger = _SearchMerger()
+        local_items = [m for m in (merger.add_local(i) for i in await _search_local(db, q)) if m]
+        yield json.dumps({"source": "local", "items": local_items}) + "\n"
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(api_queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                break
+            merged = merger.add_api(item)
+            if merged:
+                yield json.dumps({"source": "api", "items": [merged]}) + "\n"
+
+        yield json.dumps({"source": "done"}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def _authed(db: AsyncClient, table: str, authorization: str):
+    query = db.table(table)
+    # Use lowercase "authorization" to overwrite the existing key provided by supabase-py
+    query.headers = {**query.headers, "authorization": authorization}
+    return query
+
+
+def _pg_list(values: List[str]) -> str:
+    # PostgREST list literal; quote every value so commas/parens in names are safe
+    quoted = ['"' + v.replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values]
+    return "(" + ",".join(quoted) + ")"
+
+
+async def _resolve_ingredient_ids(db: AsyncClient, ingredients: List[Dict[str, Any]], authorization: str) -> List[Optional[str]]:
+    """
+    Maps every ingredient input to an `ingredients.id`, creating the missing
+    ones. Costs one lookup query plus at most one upsert, however many
+    ingredients the recipe has.
+    """
+    if not ingredients:
+        return []
+
+    # 1. Find existing rows by api_id or name in one query.
+    # The ingredients table is a shared cache, so match on api_id first and
+    # fall back to an exact name match.
+    api_ids = sorted({str(ing['api_id']) for ing in ingredients if ing.get('api_id')})
+    names = sorted({ing['name'] for ing in ingredients})
+    filters = [f"name.in.{_pg_list(names)}"]
+    if api_ids:
+        filters.append(f"api_id.in.{_pg_list(api_ids)}")
+    existing = await _authed(db, "ingredients", authorization).select("id, api_id, name").or_(",".join(filters)).execute()
+
+    by_api_id: Dict[str, str] = {}
+    by_name: Dict[str, str] = {}
+    for row in existing.data or []:
+        if row.get('api_id'):
+            by_api_id.setdefault(str(row['api_id']), row['id'])
+        by_name.setdefault(row['name'], row['id'])
+
+    def lookup(ing):
+        if ing.get('api_id') and str(ing['api_id']) in by_api_id:
+            return by_api_id[str(ing['api_id'])]
+        return by_name.get(ing['name'])
+
+    # 2. Create everything still missing in one call
+    missing = {}
+    for ing in ingredients:
+        if lookup(ing) is None:
+            key = str(ing.get('api_id') or "") or ing['name']
+            missing.setdefault(key, {
+                "name": ing['name'],
+                "api_id": ing.get('api_id'),
+                "calories_per_g": ing['calories_per_g'],
+                "protein_per_g": ing['protein_per_g'],
+                "image_url": ing.get('image_url')
+            })
+
+    if missing:
+        try:
+            # ignore_duplicates: a concurrent request may have inserted the same
+            # api_id since our lookup; we re-select those below.
+            created = await _authed(db, "ingredients", authorization).upsert(
+                list(missing.values()), on_conflict="api_id", ignore_duplicates=True
+            ).execute()
+            rows = created.data or []
+            ingredient_index.add_ingredients(rows)
+            for row in rows:
+                if row.get('api_id'):
+                    by_api_id.setdefault(str(row['api_id']), row['id'])
+                by_name.setdefault(row['name'], row['id'])
+        except Exception as e:
+            print(f"Error inserting ingredients: {e}")
+
+        raced = [str(row['api_id']) for row in missing.values() if row['api_id'] and str(row['api_id']) not in by_api_id]
+        if raced:
+            res = await _authed(db, "ingredients", authorization).select("id, api_id").in_("api_id", raced).execute()
+            for row in res.data or []:
+                by_api_id.setdefault(str(row['api_id']), row['id'])
+
+    return [lookup(ing) for ing in ingredients]
+
+
+def _link_rows(recipe_id: str, ingredients: List[Dict[str, Any]], ingredient_ids: List[Optional[str]]) -> List[Dict[str, Any]]:
+    return [
+        {"recipe_id": recipe_id, "ingredient_id": ing_id, "amount_g": ing['amount_g']}
+        for ing, ing_id in zip(ingredients, ingredient_ids)
+        if ing_id
+    ]
+
+
+def _match_current_links(ingredients: List[Dict[str, Any]], current: List[Dict[str, Any]]) -> List[Optional[str]]:
+    # Same api_id-then-name rule as _resolve_ingredient_ids, but against the
+    # recipe's own links, so unchanged ingredients need no lookup at all
+    by_api_id: Dict[str, str] = {}
+    by_name: Dict[str, str] = {}
+    for link in current:
+        ing = link.get('ingredients') or {}
+        if ing.get('api_id'):
+            by_api_id.setdefault(str(ing['api_id']), link['ingredient_id'])
+        if ing.get('name'):
+            by_name.setdefault(ing['name'], link['ingredient_id'])
+
+    matched = []
+    for ing in ingredients:
+        if ing.get('api_id') and str(ing['api_id']) in by_api_id:
+            matched.append(by_api_id[str(ing['api_id'])])
+        else:
+            matched.append(by_name.get(ing['name']))
+    return matched
+
+
+def _diff_links(current: List[Dict[str, Any]], desired: List[Dict[str, Any]]):
+    """
+    Compares stored recipe_ingredients rows with the desired ones, per
+    ingredient_id. Returns (deletes, updates, inserts):
+    - deletes: ingredient_ids whose links must all be removed
+    - updates: single links whose amount changed
+    - inserts: new links (including re-inserts after a delete)
+    """
+    old: Dict[str, List[float]] = {}
+    for link in current:
+        old.setdefault(link['ingredient_id'], []).append(float(link['amount_g']))
+    new: Dict[str, List[float]] = {}
+    for link in desired:
+        new.setdefault(link['ingredient_id'], []).append(float(link['amount_g']))
+
+    deletes, updates, inserts = [], [], []
+    for ing_id in old.keys() | new.keys():
+        before = sorted(old.get(ing_id, []))
+        after = sorted(new.get(ing_id, []))
+        if before == after:
             continue
-        if name in seen_names:
+        if len(before) == 1 and len(after) == 1:
+            updates.append({"ingredient_id": ing_id, "amount_g": after[0]})
             continue
-            
-        final_list.append(item)
-        seen_ids.add(uid)
-        seen_names.add(name)
-        
-    return final_list
+        if before:
+            deletes.append(ing_id)
+        inserts.extend({"ingredient_id": ing_id, "amount_g": amount} for amount in after)
+    return deletes, updates, inserts
+
+
+async def _apply_link_diff(db: AsyncClient, recipe_id: str, deletes: List[str], updates: List[Dict[str, Any]], inserts: List[Dict[str, Any]], authorization: str) -> None:
+    # One atomic round trip (see apply_recipe_ingredient_diff in database/schema.sql)
+    try:
+        await authed_rpc(db, "apply_recipe_ingredient_diff", {
+            "p_recipe_id": recipe_id,
+            "p_deletes": deletes,
+            "p_updates": updates,
+            "p_inserts": inserts,
+        }, authorization).execute()
+        return
+    except Exception as e:
+        # PGRST202: function not deployed yet. Anything else is a real failure.
+        if "PGRST202" not in str(e):
+            raise
+        print("apply_recipe_ingredient_diff missing, applying ingredient diff without a transaction")
+
+    ri_table = _authed(db, "recipe_ingredients", authorization)
+    if deletes:
+        await ri_table.delete().eq("recipe_id", recipe_id).in_("ingredient_id", deletes).execute()
+    for upd in updates:
+        await ri_table.update({"amount_g": upd['amount_g']}).eq("recipe_id", recipe_id).eq("ingredient_id", upd['ingredient_id']).execute()
+    if inserts:
+        await ri_table.insert([{"recipe_id": recipe_id, **row} for row in inserts]).execute()
+
 
 @router.post("/", response_model=Recipe)
-def create_recipe(recipe: RecipeCreate, current_user: dict = Depends(get_current_user), authorization: str = Header(None)):
+async def create_recipe(recipe: RecipeCreate, current_user: dict = Depends(get_current_user), authorization: str = Header(None), db: AsyncClient = Depends(get_async_supabase)):
     data = recipe.dict()
     ingredients_input = data.pop('ingredients', [])
     data['user_id'] = current_user.id
     
     # 1. Insert Recipe
-    query = supabase.table("recipes")
-    query.headers = {**query.headers, "authorization": authorization}
-    
-    response = query.insert(data).execute()
+    response = await _authed(db, "recipes", authorization).insert(data).execute()
     
     if not response.data:
         raise HTTPException(status_code=400, detail="Could not create recipe")
@@ -140,189 +452,163 @@ def create_recipe(recipe: RecipeCreate, current_user: dict = Depends(get_current
     new_recipe = response.data[0]
     recipe_id = new_recipe['id']
     
-    # 2. Process Ingredients
-    if ingredients_input:
-        ing_table = supabase.table("ingredients")
-        ing_table.headers = {**ing_table.headers, "authorization": authorization} # Using same auth? Or service role? RLS might block if user doesn't have permission to write ingredients.
-        # Assuming user can read/write ingredients public table or Authenticated role has access.
-        
-        ri_table = supabase.table("recipe_ingredients")
-        ri_table.headers = {**ri_table.headers, "authorization": authorization}
-
-        for ing in ingredients_input:
-            # Check/Insert Ingredient
-            ing_id = None
-            if ing.get('api_id'):
-                # Try to find by API ID first
-                existing = ing_table.select("id").eq("api_id", ing['api_id']).execute()
-                if existing.data:
-                    ing_id = existing.data[0]['id']
-            
-            if not ing_id:
-                # Create new ingredient
-                ing_data = {
-                    "name": ing['name'],
-                    "api_id": ing.get('api_id'),
-                    "calories_per_g": ing['calories_per_g'],
-                    "protein_per_g": ing['protein_per_g'],
-                    "image_url": ing.get('image_url')
-                }
-                # Check duplicates by name if api_id missing? For now just insert. 
-                # If api_id is unique constraint, we handled it above.
-                
-                try:
-                    new_ing = ing_table.insert(ing_data).execute()
-                    if new_ing.data:
-                        ing_id = new_ing.data[0]['id']
-                except Exception as e:
-                    print(f"Error inserting ingredient: {e}")
-                    # Fallback: maybe it exists by name/api_id and race condition?
-                    if ing.get('api_id'):
-                         existing = ing_table.select("id").eq("api_id", ing['api_id']).execute()
-                         if existing.data:
-                            ing_id = existing.data[0]['id']
-
-            if ing_id:
-                # Link Recipe Ingredient
-                ri_data = {
-                    "recipe_id": recipe_id,
-                    "ingredient_id": ing_id,
-                    "amount_g": ing['amount_g']
-                }
-                ri_table.insert(ri_data).execute()
-
-    return new_recipe
+    # 2. Process Ingredients: resolve/create them in bulk, then link in one insert
+    try:
+        if ingredients_input:
+            ingredient_ids = await _resolve_ingredient_ids(db, ingredients_input, authorization)
+            links = _link_rows(recipe_id, ingredients_input, ingredient_ids)
+            if links:
+                await _authed(db, "recipe_ingredients", authorization).insert(links).execute()
+    finally:
+        # The recipe row exists even if linking failed
+        listing_cache.invalidate(current_user.id)
+
+    return recipe_response(new_recipe)
 
 @router.put("/{recipe_id}", response_model=Recipe)
-def update_recipe(recipe_id: UUID, recipe: RecipeCreate, current_user: dict = Depends(get_current_user), authorization: str = Header(None)):
+async def update_recipe(recipe_id: UUID, recipe: RecipeCreate, current_user: dict = Depends(get_current_user), authorization: str = Header(None), db: AsyncClient = Depends(get_async_supabase)):
     data = recipe.dict()
     ingredients = data.pop('ingredients', [])
     
-    query = supabase.table("recipes")
-    query.headers = {**query.headers, "authorization": authorization}
+    query = _authed(db, "recipes", authorization)
     
     # RLS should handle ownership check, but we can also be explicit
-    response = query.update(data).eq("id", str(recipe_id)).eq("user_id", current_user.id).execute()
+    response = await query.update(data).eq("id", str(recipe_id)).eq("user_id", current_user.id).execute()
     
     if not response.data:
          raise HTTPException(status_code=404, detail="Recipe not found or not owned by user")
          
-    # Handle Ingredients Update
+    # Handle Ingredients Update: only write what actually changed
     if ingredients is not None:
-        # Delete existing
         try:
-            ri_table = supabase.table("recipe_ingredients")
-            ri_table.headers = {**ri_table.headers, "authorization": authorization}
-            ri_table.delete().eq("recipe_id", str(recipe_id)).execute()
-            
-            # Insert new
-            ing_table = supabase.table("ingredients")
-            ing_table.headers = {**ing_table.headers, "authorization": authorization}
-            
-            for ing in ingredients:
-                ing_data = {
-                    "name": ing['name'],
-                    "calories_per_g": ing['calories_per_g'],
-                    "protein_per_g": ing['protein_per_g'],
-                    "image_url": ing.get('image_url')
-                }
-                
-                # Check exist
-                # If we have api_id, better to assume uniqueness on it? Or just name?
-                # Using name for simplicity here if api_id is purely informational or missing
-                # Actually, duplicate ingredients in DB is fine if we want per-recipe customization? 
-                # But we setup 'ingredients' table as a shared cache.
-                # Let's try to find by api_id or name.
-                
-                # For `update`, logic matches `create`.
-                existing = None
-                if ing.get('api_id'):
-                    res = ing_table.select("id").eq("api_id", ing['api_id']).execute()
-                    if res.data:
-                        existing = res.data[0]
-                
-                if not existing:
-                     # fallback search by name?
-                    res_name = ing_table.select("id").eq("name", ing['name']).execute()
-                    if res_name.data:
-                        existing = res_name.data[0]
-
-                if existing:
-                    ing_id = existing['id']
-                else:
-                    ing_insert = {**ing_data, "api_id": ing.get('api_id')}
-                    res_new = ing_table.insert(ing_insert).execute()
-                    ing_id = res_new.data[0]['id']
-                
-                ri_data = {
-                    "recipe_id": str(recipe_id),
-                    "ingredient_id": ing_id,
-                    "amount_g": ing['amount_g']
-                }
-                ri_table.insert(ri_data).execute()
-                
+            current_res = await _authed(db, "recipe_ingredients", authorization)\
+                .select("ingredient_id, amount_g, ingredients(api_id, name)")\
+                .eq("recipe_id", str(recipe_id))\
+                .execute()
+            current = current_res.data or []
+            ingredient_ids = _match_current_links(ingredients, current)
+
+            # Only ingredients the recipe does not already link need a lookup/insert
+            unknown = [i for i, ing_id in enumerate(ingredient_ids) if ing_id is None]
+            if unknown:
+                resolved = await _resolve_ingredient_ids(db, [ingredients[i] for i in unknown], authorization)
+                for i, ing_id in zip(unknown, resolved):
+                    ingredient_ids[i] = ing_id
+
+            deletes, updates, inserts = _diff_links(current, _link_rows(str(recipe_id), ingredients, ingredient_ids))
+            if deletes or updates or inserts:
+                await _apply_link_diff(db, str(recipe_id), deletes, updates, inserts, authorization)
+
         except Exception as e:
             print(f"Error updating ingredients: {e}")
-            # Non-critical? Or should we rollback? Supabase doesn't support easy transactions via REST.
-            # Logging error.
+
+    # Meal plans embed recipes, so every listing of this user is stale
+    listing_cache.invalidate(current_user.id)
 
     # Re-fetch full recipe with ingredients to return correct model
     # Or just construct it.
     # Let's fetch to be safe.
-    final_res = query.select("*, recipe_ingredients(amount_g, ingredients(*))").eq("id", str(recipe_id)).execute()
+    final_res = await query.select("*, recipe_ingredients(amount_g, ingredients(*))").eq("id", str(recipe_id)).execute()
     if final_res.data:
-        # Flatten for Pydantic
-        r = final_res.data[0]
-        flattened_ingredients = []
-        if r.get('recipe_ingredients'):
-            for ri in r['recipe_ingredients']:
-                i = ri['ingredients']
-                if i:
-                    flattened_ingredients.append({
-                        "id": i['id'],
-                        "api_id": i.get('api_id'),
-                        "name": i['name'],
-                        "amount_g": ri['amount_g'],
-                        "calories_per_g": i['calories_per_g'],
-                        "protein_per_g": i['protein_per_g'],
-                        "image_url": i.get('image_url')
-                    })
-        r['ingredients'] = flattened_ingredients
-        return r
+        return recipe_response(final_res.data[0])
          
-    return response.data[0]
+    return recipe_response(response.data[0])
 
 @router.delete("/{recipe_id}")
-def delete_recipe(recipe_id: UUID, current_user: dict = Depends(get_current_user), authorization: str = Header(None)):
-    query = supabase.table("recipes")
+async def delete_recipe(recipe_id: UUID, current_user: dict = Depends(get_current_user), authorization: str = Header(None), db: AsyncClient = Depends(get_async_supabase)):
+    query = db.table("recipes")
     query.headers = {**query.headers, "authorization": authorization}
     
     # Verify ownership
-    response = query.select("*").eq("id", str(recipe_id)).eq("user_id", current_user.id).execute()
+    response = await query.select("*").eq("id", str(recipe_id)).eq("user_id", current_user.id).execute()
     if not response.data:
          raise HTTPException(status_code=404, detail="Recipe not found")
          
-    del_query = supabase.table("recipes")
+    del_query = db.table("recipes")
     del_query.headers = {**del_query.headers, "authorization": authorization}
-    del_query.delete().eq("id", str(recipe_id)).execute()
+    await del_query.delete().eq("id", str(recipe_id)).execute()
+    listing_cache.invalidate(current_user.id)
     return {"message": "Recipe deleted"}
 
 class RecipeParseRequest(BaseModel):
     text: str
 
+def _unavailable(e: resilience.Unavailable) -> HTTPException:
+    # Circuit open or bulkhead full: fail fast and tell the client when to retry
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after_s))})
+
 @router.post("/parse")
-def parse_recipe(request: RecipeParseRequest):
+async def parse_recipe(request: RecipeParseRequest):
     try:
-        recipe_data = parse_recipe_from_text(request.text)
+        recipe_data = await run_in_threadpool(parse_recipe_from_text, request.text)
         return recipe_data
+    except resilience.Unavailable as e:
+        raise _unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class RecipeParseBatchRequest(BaseModel):
+    texts: List[str]
+
+@router.post("/parse/batch")
+async def parse_recipes_batch(request: RecipeParseBatchRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Parses many recipe texts concurrently and streams NDJSON as items finish:
+    {"index": i, "recipe": {...}} or {"index": i, "error": "..."} per text, in
+    completion order, then {"done": true, "parsed": n, "failed": m}.
+    """
+    if len(request.texts) > MAX_PARSE_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PARSE_BATCH} texts per batch")
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(PARSE_CONCURRENCY)
+
+    async def parse_one(index: int, text: str) -> Dict[str, Any]:
+        if not text.strip():
+            return {"index": index, "error": "Empty text"}
+        async with semaphore:
+            try:
+                recipe = await asyncio.wait_for(
+                    loop.run_in_executor(_parse_pool, metrics.bind(parse_recipe_from_text, text)),
+                    timeout=PARSE_ITEM_TIMEOUT_S,
+                )
+                return {"index": index, "recipe": recipe}
+            except asyncio.TimeoutError:
+                return {"index": index, "error": f"Timed out after {PARSE_ITEM_TIMEOUT_S:g}s"}
+            except Exception as e:
+                return {"index": index, "error": str(e)}
+
+    async def lines():
+        tasks = [asyncio.ensure_future(parse_one(i, text)) for i, text in enumerate(request.texts)]
+        parsed = failed = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                item = await finished
+                if "error" in item:
+                    failed += 1
+                else:
+                    parsed += 1
+                yield json.dumps(item) + "\n"
+            yield json.dumps({"done": True, "parsed": parsed, "failed": failed}) + "\n"
+        finally:
+            # Client went away: stop queued items from reaching Gemini
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.post("/upload")
 async def upload_recipe_image(file: UploadFile = File(...)):
+    # The multipart parser has already spooled the body (to disk past 1 MB);
+    # hashing, resizing and the upload all read that file in a worker thread
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
     try:
-        content = await file.read()
-        url = upload_image(content, file.filename)
+        url = await run_in_threadpool(upload_image, file.file, file.filename)
         return {"url": url}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except resilience.Unavailable as e:
+        raise _unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,94 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from models import Recipe, MealPlan
+
+# One projection layer from PostgREST rows to API response shapes.
+#
+# The routers select `recipe_ingredients(amount_g, ingredients(*))` and used to
+# flatten that tree in four hand-copied loops, after which FastAPI validated
+# and re-encoded every row again through `response_model`. Here each row is
+# projected to exactly the response fields in a single pass and written with
+# orjson. PostgREST output is already typed by the database schema, so we trust
+# it by default; set VALIDATE_RESPONSES=1 (e.g. in development) to run the
+# projected payload through precompiled pydantic TypeAdapters as well.
+
+VALIDATE_RESPONSES = os.getenv("VALIDATE_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+RECIPE_FIELDS = ("id", "user_id", "name", "description", "image_url", "category",
+                 "calories_per_serving", "protein_g", "usage_count")
+MEAL_PLAN_FIELDS = ("id", "user_id", "date", "meal_type", "recipe_id")
+
+RecipeListAdapter = TypeAdapter(List[Recipe])
+RecipeAdapter = TypeAdapter(Recipe)
+MealPlanListAdapter = TypeAdapter(List[MealPlan])
+MealPlanAdapter = TypeAdapter(MealPlan)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (UUIDs, dates and numpy scalars included)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def project_ingredients(recipe_ingredients: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    # Flatten recipe_ingredients(amount_g, ingredients(*)) into IngredientDisplay
+    flat = []
+    for ri in recipe_ingredients or ():
+        i = ri.get('ingredients')
+        if i:
+            flat.append({
+                "id": i['id'],
+                "api_id": i.get('api_id'),
+                "name": i['name'],
+                "amount_g": ri['amount_g'],
+                "calories_per_g": i['calories_per_g'],
+                "protein_per_g": i['protein_per_g'],
+                "image_url": i.get('image_url')
+            })
+    return flat
+
+
+def project_recipe(row: Dict[str, Any], fields: Sequence[str] = RECIPE_FIELDS, ingredients: bool = True) -> Dict[str, Any]:
+    recipe = {f: row.get(f) for f in fields}
+    if ingredients:
+        recipe['ingredients'] = project_ingredients(row.get('recipe_ingredients'))
+    return recipe
+
+
+def project_meal_plan(row: Dict[str, Any]) -> Dict[str, Any]:
+    plan = {f: row.get(f) for f in MEAL_PLAN_FIELDS}
+    plan['recipe'] = project_recipe(row['recipe']) if row.get('recipe') else None
+    return plan
+
+
+def _respond(content: Any, adapter: Optional[TypeAdapter], status_code: int = 200) -> ORJSONResponse:
+    if VALIDATE_RESPONSES and adapter is not None:
+        content = adapter.dump_python(adapter.validate_python(content), mode="json")
+    return ORJSONResponse(content, status_code=status_code)
+
+
+def recipes_response(rows: List[Dict[str, Any]], fields: Optional[Sequence[str]] = None) -> ORJSONResponse:
+    if fields is None:
+        return _respond([project_recipe(r) for r in rows], RecipeListAdapter)
+    # Partial projections (`?fields=`) are not full Recipe models, so skip validation
+    columns = [f for f in fields if f != 'ingredients']
+    with_ingredients = 'ingredients' in fields
+    return _respond([project_recipe(r, columns, with_ingredients) for r in rows], None)
+
+
+def recipe_response(row: Dict[str, Any]) -> ORJSONResponse:
+    return _respond(project_recipe(row), RecipeAdapter)
+
+
+def meal_plans_response(rows: List[Dict[str, Any]]) -> ORJSONResponse:
+    return _respond([project_meal_plan(r) for r in rows], MealPlanListAdapter)
+
+
+def meal_plan_response(row: Dict[str, Any]) -> ORJSONResponse:
+    return _respond(project_meal_plan(row), MealPlanAdapter)
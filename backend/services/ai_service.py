@@ -1,15 +1,46 @@
 import os
+import copy
+import hashlib
 import json
-import google.generativeai as genai
-from typing import Dict, Any
-from dotenv import load_dotenv
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, Optional
+from cache import DiskCache
+import metrics
+import providers
+import resilience
 
-load_dotenv()
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+# Alternative API host (a proxy, or the local stand-in the benchmarks use)
+API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "30"))
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Bulkhead and circuit breaker (see resilience.py): at most
+# GEMINI_MAX_CONCURRENT calls hold a thread on Gemini, and while the circuit
+# is open uncached parses fail at once (the routes answer 503).
+_dependency = resilience.register(
+    "gemini",
+    max_concurrent=int(os.getenv("GEMINI_MAX_CONCURRENT", "4")),
+    queue_timeout_s=float(os.getenv("GEMINI_QUEUE_TIMEOUT_S", "2")),
+    failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+    reset_s=float(os.getenv("GEMINI_BREAKER_RESET_S", "30")),
+)
 
-model = genai.GenerativeModel('gemini-flash-latest')
+
+def _create_model():
+    # google.generativeai takes ~0.7s to import; only parse requests pay it
+    import google.generativeai as genai
+    if API_ENDPOINT:
+        # Custom hosts go over REST: gRPC would insist on TLS
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"), transport="rest", client_options={"api_endpoint": API_ENDPOINT})
+    else:
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(MODEL_NAME)
+
+
+providers.register("gemini", _create_model)
 
 RECIPE_SCHEMA = {
     "name": "string",
@@ -22,25 +53,159 @@ RECIPE_SCHEMA = {
     "servings": "integer"
 }
 
-def parse_recipe_from_text(text: str) -> Dict[str, Any]:
-    """
-    Parses natural language text into a structured recipe JSON using Gemini.
-    """
+# Parsed recipes are cached on disk, keyed by a hash of the whitespace-
+# normalized text, the model name and the schema/prompt version, so repeated
+# pastes never reach Gemini and a schema or model change starts a fresh
+# namespace. Identical requests already in flight share one upstream call.
+# The default path is under the temp dir, the only writable place on
+# serverless hosts.
+PARSE_CACHE_PATH = os.getenv("GEMINI_CACHE_PATH") or os.path.join(tempfile.gettempdir(), "meal-planner", "gemini_parse.sqlite3")
+PARSE_CACHE_MAX_BYTES = int(float(os.getenv("GEMINI_CACHE_MAX_MB", "50")) * 1024 * 1024)
+# Bump when the prompt changes in a way that should invalidate cached parses
+PROMPT_VERSION = 1
+SCHEMA_VERSION = hashlib.sha256(json.dumps(RECIPE_SCHEMA, sort_keys=True).encode()).hexdigest()[:12]
+
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+_counters = {"requests": 0, "coalesced": 0, "upstream_calls": 0, "upstream_errors": 0,
+             "upstream_ms_total": 0.0, "upstream_ms_max": 0.0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str, value: float = 1) -> None:
+    with _counters_lock:
+        _counters[name] += value
+
+
+def _get_cache() -> Optional[DiskCache]:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = DiskCache(PARSE_CACHE_PATH, max_bytes=PARSE_CACHE_MAX_BYTES, name="gemini_parse")
+                except Exception as e:
+                    print(f"Gemini parse cache unavailable: {e}")
+                    return None
+    return _cache
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def cache_key(text: str) -> str:
+    material = "\x1f".join([MODEL_NAME, SCHEMA_VERSION, str(PROMPT_VERSION), normalize_text(text)])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def _cached(key: str) -> Optional[Dict[str, Any]]:
+    cache = _get_cache()
+    if cache is None:
+        return None
+    try:
+        value = cache.get(key)
+        return json.loads(value) if value is not None else None
+    except Exception as e:
+        print(f"Gemini parse cache read error: {e}")
+        return None
+
+
+def _store(key: str, result: Dict[str, Any]) -> None:
+    cache = _get_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(key, json.dumps(result).encode())
+    except Exception as e:
+        print(f"Gemini parse cache write error: {e}")
+
+
+def _generate(text: str) -> Dict[str, Any]:
     prompt = f"""
-    You are a culinary AI assistant. 
+    You are a culinary AI assistant.
     Extract recipe details from the following text and return ONLY a valid JSON object matching this schema:
     {json.dumps(RECIPE_SCHEMA, indent=2)}
-    
+
     If data is missing, make a reasonable estimate or use 0/empty string.
-    
+
     Input Text:
     {text}
     """
-    
+
+    # Unparseable output is a bad answer, not an outage
+    with _dependency.guard(ignore=(json.JSONDecodeError,)):
+        start = time.perf_counter()
+        try:
+            with metrics.span("gemini"):
+                response = providers.get("gemini").generate_content(
+                    prompt,
+                    generation_config={"response_mime_type": "application/json"},
+                    request_options={"timeout": TIMEOUT_S},
+                )
+            return json.loads(response.text)
+        except Exception as e:
+            _count("upstream_errors")
+            print(f"Gemini Parse Error: {e}")
+            # fallback empty structure or re-raise
+            raise e
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with _counters_lock:
+                _counters["upstream_calls"] += 1
+                _counters["upstream_ms_total"] += elapsed_ms
+                _counters["upstream_ms_max"] = max(_counters["upstream_ms_max"], elapsed_ms)
+
+
+def parse_recipe_from_text(text: str) -> Dict[str, Any]:
+    """
+    Parses natural language text into a structured recipe JSON using Gemini.
+
+    Served from the parse cache when the same text (ignoring whitespace) was
+    parsed before; concurrent identical calls wait for a single Gemini call.
+    """
+    _count("requests")
+    key = cache_key(text)
+    result = _cached(key)
+    if result is not None:
+        return result
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        _count("coalesced")
+        # Re-raises the leader's error, if any; copies so callers never share a dict
+        return copy.deepcopy(future.result())
+
     try:
-        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        return json.loads(response.text)
+        result = _generate(text)
+        _store(key, result)
+        future.set_result(result)
+        return copy.deepcopy(result)
     except Exception as e:
-        print(f"Gemini Parse Error: {e}")
-        # fallback empty structure or re-raise
-        raise e
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def parse_cache_stats() -> Dict[str, Any]:
+    cache = _get_cache()
+    stats = cache.stats() if cache is not None else {"name": "gemini_parse", "available": False}
+    calls = _counters["upstream_calls"]
+    stats.update({
+        "requests": _counters["requests"],
+        "coalesced": _counters["coalesced"],
+        "upstream_calls": calls,
+        "upstream_errors": _counters["upstream_errors"],
+        "upstream_ms_avg": round(_counters["upstream_ms_total"] / calls, 1) if calls else 0.0,
+        "upstream_ms_max": round(_counters["upstream_ms_max"], 1),
+    })
+    return stats
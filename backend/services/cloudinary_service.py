@@ -1,31 +1,162 @@
-import cloudinary
-import cloudinary.uploader
+import hashlib
+import io
+import math
 import os
-from dotenv import load_dotenv
+import threading
+from types import SimpleNamespace
+from typing import Any, BinaryIO, Dict, Optional, Union
+from cache import TTLCache
+import metrics
+import providers
+import resilience
 
-load_dotenv()
 
-# Configure Cloudinary
-# It will automatically pick up CLOUDINARY_URL or specific env vars if set, 
-# but explicitness is good if we are using individual keys.
-cloudinary.config( 
-  cloud_name = os.getenv('CLOUDINARY_CLOUD_NAME'), 
-  api_key = os.getenv('CLOUDINARY_API_KEY'), 
-  api_secret = os.getenv('CLOUDINARY_API_SECRET') 
+def _configure_cloudinary() -> SimpleNamespace:
+    import cloudinary
+    import cloudinary.api
+    import cloudinary.uploader
+
+    # Configure Cloudinary
+    # It will automatically pick up CLOUDINARY_URL or specific env vars if set,
+    # but explicitness is good if we are using individual keys.
+    cloudinary.config(
+      cloud_name = os.getenv('CLOUDINARY_CLOUD_NAME'),
+      api_key = os.getenv('CLOUDINARY_API_KEY'),
+      api_secret = os.getenv('CLOUDINARY_API_SECRET')
+    )
+    return SimpleNamespace(uploader=cloudinary.uploader, admin_api=cloudinary.api)
+
+
+providers.register("cloudinary", _configure_cloudinary)
+
+# Uploads are read from the request's spooled temp file, downscaled to fit
+# IMAGE_MAX_DIM and re-encoded as WebP before they leave the server, so a
+# 5-10 MB phone photo goes out as a few hundred KB. The image is stored under
+# a public_id derived from the hash of the original bytes and the resize
+# settings: re-saving the same photo finds the existing asset (in memory, or
+# via the Admin API) and is never re-encoded or re-sent.
+IMAGE_MAX_DIM = int(os.getenv("IMAGE_MAX_DIM", "1600"))
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "20")) * 1024 * 1024)
+FOLDER = "meal_planner_recipes"
+_CHUNK = 1024 * 1024
+TIMEOUT_S = float(os.getenv("CLOUDINARY_TIMEOUT_S", "60"))
+
+# Bulkhead and circuit breaker for uploads and lookups (see resilience.py);
+# while the circuit is open uploads fail at once, before any resizing.
+_dependency = resilience.register(
+    "cloudinary",
+    max_concurrent=int(os.getenv("CLOUDINARY_MAX_CONCURRENT", "4")),
+    queue_timeout_s=float(os.getenv("CLOUDINARY_QUEUE_TIMEOUT_S", "2")),
+    failure_threshold=int(os.getenv("CLOUDINARY_BREAKER_FAILURES", "5")),
+    reset_s=float(os.getenv("CLOUDINARY_BREAKER_RESET_S", "30")),
 )
 
-def upload_image(file_content, filename: str) -> str:
+_known = TTLCache(maxsize=4096, ttl=24 * 3600, name="image_uploads")
+_counters = {"uploads": 0, "deduplicated": 0, "bytes_received": 0, "bytes_sent": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str, value: int = 1) -> None:
+    with _counters_lock:
+        _counters[name] += value
+
+
+def content_id(stream: BinaryIO) -> str:
+    """public_id for an upload: hash of the original bytes plus the resize settings."""
+    digest = hashlib.sha256(f"{IMAGE_MAX_DIM}:{IMAGE_WEBP_QUALITY}:webp\x1f".encode())
+    stream.seek(0)
+    while chunk := stream.read(_CHUNK):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()[:32]
+
+
+def prepare_image(stream: BinaryIO) -> bytes:
+    """
+    Decodes an image from `stream`, fits it within IMAGE_MAX_DIM and returns
+    it re-encoded as WebP. Raises ValueError if it is not a readable image.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    try:
+        with Image.open(stream) as img:
+            # JPEG can decode straight at 1/2, 1/4 or 1/8 scale, so a 12 MP
+            # photo is never fully materialized. draft() only scales down while
+            # both sides stay >= the request, so ask for the fitted size.
+            scale = min(1.0, IMAGE_MAX_DIM / max(img.size))
+            img.draft("RGB", (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+            ImageOps.exif_transpose(img, in_place=True)
+            img.thumbnail((IMAGE_MAX_DIM, IMAGE_MAX_DIM), Image.Resampling.LANCZOS)
+            has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+            mode = "RGBA" if has_alpha else "RGB"
+            if img.mode != mode:
+                img = img.convert(mode)
+            out = io.BytesIO()
+            img.save(out, format="WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+            return out.getvalue()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError(f"Not a valid image: {e}")
+
+
+def _existing_url(public_id: str) -> Optional[str]:
+    from cloudinary.exceptions import NotFound
+    try:
+        # NotFound is the usual answer for a new image, not an outage
+        with _dependency.guard(ignore=(NotFound,)), metrics.span("cloudinary"):
+            return providers.get("cloudinary").admin_api.resource(f"{FOLDER}/{public_id}", timeout=TIMEOUT_S)["secure_url"]
+    except NotFound:
+        return None
+    except resilience.Unavailable:
+        # Skip the resize: the upload would be rejected too
+        raise
+    except Exception as e:
+        # Admin API is rate limited; uploading again is always safe
+        print(f"Cloudinary lookup error: {e}")
+        return None
+
+
+def upload_image(file: Union[BinaryIO, bytes], filename: str) -> str:
     """
     Uploads an image file to Cloudinary and returns the secure URL.
+
+    `file` may be a seekable stream (e.g. UploadFile.file) or raw bytes.
     """
+    stream = io.BytesIO(file) if isinstance(file, (bytes, bytearray)) else file
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    if size > MAX_UPLOAD_BYTES:
+        raise ValueError(f"Image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    _count("bytes_received", size)
+
+    public_id = content_id(stream)
+    url = _known.get(public_id) or _existing_url(public_id)
+    if url:
+        _known.set(public_id, url)
+        _count("deduplicated")
+        return url
+
+    data = prepare_image(stream)
     try:
-        # Upload the file
-        upload_result = cloudinary.uploader.upload(
-            file_content, 
-            public_id = filename.split('.')[0], # Optional: use filename as public_id
-            folder = "meal_planner_recipes"
-        )
-        return upload_result["secure_url"]
+        with _dependency.guard(), metrics.span("cloudinary"):
+            upload_result = providers.get("cloudinary").uploader.upload(
+                io.BytesIO(data),
+                public_id = public_id,
+                folder = FOLDER,
+                overwrite = False,
+                resource_type = "image",
+                context = {"filename": filename or ""},
+                timeout = TIMEOUT_S,
+            )
     except Exception as e:
         print(f"Cloudinary Upload Error: {e}")
         raise e
+    _count("uploads")
+    _count("bytes_sent", len(data))
+    _known.set(public_id, upload_result["secure_url"])
+    return upload_result["secure_url"]
+
+
+def upload_stats() -> Dict[str, Any]:
+    stats = dict(_counters)
+    stats["known_images"] = len(_known)
+    return stats
@@ -0,0 +1,163 @@
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+# Shared outbound HTTP client for third-party APIs.
+#
+# One pooled `requests.Session` per process keeps TLS connections alive between
+# calls; every request gets a (connect, read) timeout so a slow upstream cannot
+# pin a worker thread forever.
+
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+DEFAULT_TIMEOUT: Tuple[float, float] = (
+    float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "3.05")),
+    float(os.getenv("HTTP_READ_TIMEOUT_S", "10")),
+)
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+BACKOFF_BASE_S = float(os.getenv("HTTP_BACKOFF_BASE_S", "0.25"))
+BACKOFF_MAX_S = float(os.getenv("HTTP_BACKOFF_MAX_S", "4"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_host_timeouts: Dict[str, Tuple[float, float]] = {}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+class QuotaExhausted(Exception):
+    """Raised instead of sending a request when the caller's budget is spent."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    `capacity` tokens are available up front and refill continuously at
+    `refill_per_s`. Upstreams that report their remaining budget can call
+    `sync()` so local accounting never drifts above the real number.
+    """
+
+    def __init__(self, capacity: float, refill_per_s: float):
+        self.capacity = capacity
+        self.refill_per_s = refill_per_s
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_s)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def sync(self, remaining: float) -> None:
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, max(0.0, remaining))
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+def configure_host(host: str, connect_s: float, read_s: float) -> None:
+    _host_timeouts[host] = (connect_s, read_s)
+
+
+def timeout_for(url: str) -> Tuple[float, float]:
+    return _host_timeouts.get(urlparse(url).hostname or "", DEFAULT_TIMEOUT)
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _backoff(attempt: int, retry_after: Optional[str]) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_S)
+        except ValueError:
+            pass
+    # Full jitter: spread retries from concurrent callers instead of bunching them.
+    return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))
+
+
+def request(
+    method: str,
+    url: str,
+    *,
+    deadline: Optional[float] = None,
+    limiter: Optional[TokenBucket] = None,
+    cost: float = 1.0,
+    retries: int = MAX_RETRIES,
+    **kwargs,
+) -> requests.Response:
+    """
+    Sends a request through the shared session.
+
+    - Timeouts come from the per-host table unless passed explicitly, and are
+      clipped to `deadline` (a `time.monotonic()` timestamp) when given.
+    - 429/5xx responses and connection errors are retried with jittered
+      exponential backoff, honouring Retry-After, while time remains.
+    - With a `limiter`, every attempt spends `cost` tokens; QuotaExhausted is
+      raised instead of sending when the bucket is empty.
+    """
+    session = get_session()
+    connect_s, read_s = kwargs.pop("timeout", None) or timeout_for(url)
+    attempt = 0
+
+    while True:
+        if limiter is not None and not limiter.try_acquire(cost):
+            raise QuotaExhausted(f"Request budget exhausted for {urlparse(url).hostname}")
+
+        timeout = (connect_s, read_s)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout(f"Deadline exceeded before calling {url}")
+            timeout = (min(connect_s, remaining), min(read_s, remaining))
+
+        try:
+            res = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= retries:
+                raise
+            res = None
+
+        if res is not None and (res.status_code not in RETRY_STATUSES or attempt >= retries):
+            return res
+
+        delay = _backoff(attempt, res.headers.get("Retry-After") if res is not None else None)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            if res is not None:
+                return res
+            raise requests.Timeout(f"Deadline exceeded retrying {url}")
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
@@ -1,81 +1,272 @@
 import os
-import requests
-from typing import List, Dict, Any
-from dotenv import load_dotenv
-
-load_dotenv()
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from cache import TTLCache
+import metrics
+import resilience
+from services import http_client
+from services.http_client import QuotaExhausted, TokenBucket
 
 API_KEY = os.getenv("SPOONACULAR_API_KEY")
-BASE_URL = "https://api.spoonacular.com"
+BASE_URL = os.getenv("SPOONACULAR_BASE_URL", "https://api.spoonacular.com")
+
+# How many search hits we resolve to full macros. Detail calls run concurrently,
+# so raising this costs quota but not wall time.
+MAX_RESULTS = int(os.getenv("SPOONACULAR_MAX_RESULTS", "3"))
+# Upper bound on in-flight detail calls across all requests on this instance.
+MAX_WORKERS = int(os.getenv("SPOONACULAR_MAX_WORKERS", "8"))
+# Total wall-time budget (seconds) for one search, search call included.
+DEADLINE_S = float(os.getenv("SPOONACULAR_DEADLINE_S", "4.0"))
+
+# Spoonacular bills in "points" against a daily allowance (150 on the free plan).
+# The bucket refills over a rolling day and is re-synced from the
+# X-API-Quota-Left header; once empty we stop calling out and search degrades
+# to local ingredients only.
+DAILY_POINTS = float(os.getenv("SPOONACULAR_DAILY_POINTS", "150"))
+_quota = TokenBucket(capacity=DAILY_POINTS, refill_per_s=DAILY_POINTS / 86400.0)
+
+http_client.configure_host(
+    "api.spoonacular.com",
+    float(os.getenv("SPOONACULAR_CONNECT_TIMEOUT_S", "3.05")),
+    float(os.getenv("SPOONACULAR_READ_TIMEOUT_S", "5")),
+)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="spoonacular")
+# Write-through persists get their own threads so they never queue ahead of
+# detail fetches on the request path
+_persist_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SPOONACULAR_PERSIST_WORKERS", "2")),
+    thread_name_prefix="spoonacular-persist",
+)
+
+# Bulkhead and circuit breaker around every call (see resilience.py). While
+# the circuit is open, search serves local ingredients only. QuotaExhausted is
+# raised before anything is sent, so it says nothing about Spoonacular's health.
+_dependency = resilience.register(
+    "spoonacular",
+    max_concurrent=int(os.getenv("SPOONACULAR_MAX_CONCURRENT", str(MAX_WORKERS))),
+    queue_timeout_s=float(os.getenv("SPOONACULAR_QUEUE_TIMEOUT_S", "0.5")),
+    failure_threshold=int(os.getenv("SPOONACULAR_BREAKER_FAILURES", "5")),
+    reset_s=float(os.getenv("SPOONACULAR_BREAKER_RESET_S", "30")),
+    ignore=(QuotaExhausted,),
+)
+
+# Two independent tiers: search hits (query -> ids) go stale as Spoonacular's
+# catalogue changes, per-100g macros practically never do.
+_query_cache = TTLCache(
+    maxsize=int(os.getenv("SPOONACULAR_QUERY_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("SPOONACULAR_QUERY_CACHE_TTL_S", str(24 * 3600))),
+    name="spoonacular_query",
+)
+_nutrition_cache = TTLCache(
+    maxsize=int(os.getenv("SPOONACULAR_NUTRITION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("SPOONACULAR_NUTRITION_CACHE_TTL_S", str(7 * 24 * 3600))),
+    name="spoonacular_nutrition",
+)
+
+INGREDIENT_FIELDS = "api_id, name, calories_per_g, protein_per_g, image_url"
+
+
+def _sync_quota(res) -> None:
+    left = res.headers.get("X-API-Quota-Left")
+    if left is not None:
+        try:
+            _quota.sync(float(left))
+        except ValueError:
+            pass
+
+
+def _search_ids(query: str, number: int, deadline: float) -> List[Dict[str, Any]]:
+    search_url = f"{BASE_URL}/food/ingredients/search"
+    params = {
+        "apiKey": API_KEY,
+        "query": query,
+        "number": number
+    }
+    # Search costs 1 point plus 0.01 per returned result
+    with _dependency.guard(timeout=deadline - time.monotonic()):
+        with metrics.span("spoonacular"):
+            res = http_client.get(search_url, params=params, deadline=deadline, limiter=_quota, cost=1 + 0.01 * number)
+        _sync_quota(res)
+        res.raise_for_status()
+    return res.json().get('results', [])
+
+
+def _fetch_details(item: Dict[str, Any], deadline: float) -> Optional[Dict[str, Any]]:
+    info_url = f"{BASE_URL}/food/ingredients/{item['id']}/information"
+    info_params = {
+        "apiKey": API_KEY,
+        "amount": 100,
+        "unit": "grams"
+    }
+    with _dependency.guard(timeout=deadline - time.monotonic()):
+        with metrics.span("spoonacular"):
+            info_res = http_client.get(info_url, params=info_params, deadline=deadline, limiter=_quota, cost=1)
+        _sync_quota(info_res)
+        if info_res.status_code in http_client.RETRY_STATUSES:
+            # Still failing after retries: an outage, not a missing ingredient
+            info_res.raise_for_status()
+    if info_res.status_code != 200:
+        return None
+
+    details = info_res.json()
+
+    # Extract macro nutrients
+    nutrients = details.get('nutrition', {}).get('nutrients', [])
+    def get_amount(name):
+        for n in nutrients:
+            if n['name'] == name:
+                return n['amount']
+        return 0
+
+    # Data is for 100g as requested
+    kcal_100g = get_amount("Calories")
+    pro_100g = get_amount("Protein")
+
+    return {
+        "api_id": str(details['id']),
+        "name": details['name'],
+        "calories_per_g": round(kcal_100g / 100.0, 4),
+        "protein_per_g": round(pro_100g / 100.0, 4),
+        "image_url": f"https://spoonacular.com/cdn/ingredients_100x100/{details['image']}" if details.get('image') else None
+    }
+
+
+def _load_persisted(api_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Looks up already-resolved ingredients in the shared `ingredients` table, so
+    a cold instance does not have to go back to Spoonacular for them.
+    """
+    try:
+        from db import get_supabase
+        res = get_supabase().table("ingredients").select(INGREDIENT_FIELDS).in_("api_id", api_ids).execute()
+        return {str(row['api_id']): row for row in res.data or []}
+    except Exception as e:
+        print(f"Ingredient cache lookup error: {e}")
+        return {}
+
 
-def search_food(query: str) -> List[Dict[str, Any]]:
+def _persist(rows: List[Dict[str, Any]]) -> None:
+    # Write-through to the shared ingredients table (unique on api_id).
+    try:
+        from db import get_supabase
+        get_supabase().table("ingredients").upsert(rows, on_conflict="api_id", ignore_duplicates=True).execute()
+    except Exception as e:
+        print(f"Ingredient cache write-through error: {e}")
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    return [_query_cache.stats(), _nutrition_cache.stats()]
+
+
+def quota_remaining() -> float:
+    return _quota.available
+
+
+def _iter_ranked(query: str, max_results: int, deadline_s: float) -> Iterator[Tuple[int, Dict[str, Any]]]:
     if not API_KEY:
         print("Spoonacular API key missing")
-        return []
+        return
 
-    try:
-        # 1. Search for ingredients (get simple list with IDs)
-        search_url = f"{BASE_URL}/food/ingredients/search"
-        params = {
-            "apiKey": API_KEY,
-            "query": query,
-            "number": 5
-        }
-        res = requests.get(search_url, params=params)
-        res.raise_for_status()
-        search_data = res.json()
-        results = search_data.get('results', [])
-        
-        if not results:
-            return []
-            
-        # 2. Get detailed info (macros) sequentially
-        # Note: Spoonacular doesn't have a free bulk ingredient info endpoint.
-        # We must limit calls to avoid rate limits or huge latency. 
-        # For a "Search" result, we might only need basic info or do lazy loading.
-        # BUT our UI expects calories immediately.
-        # Limit to top 3 to be safe on latency/quota.
-        
-        final_results = []
-        for item in results[:3]: # Limit to top 3
+    deadline = time.monotonic() + deadline_s
+
+    # 1. Search for ingredients (get simple list with IDs)
+    number = max(max_results, 5)
+    query_key = (" ".join(query.lower().split()), number)
+    results = _query_cache.get(query_key)
+    if results is None:
+        try:
+            results = _search_ids(query, number, deadline)
+        except QuotaExhausted:
+            print("Spoonacular daily quota spent, serving local results only")
+            return
+        except resilience.Unavailable as e:
+            print(f"{e}, serving local results only")
+            return
+        except Exception as e:
+            print(f"Spoonacular Error: {e}")
+            return
+        _query_cache.set(query_key, [{"id": r['id'], "name": r['name']} for r in results])
+
+    # 2. Serve macros we already know: memory first, then the ingredients table
+    missing = []
+    for rank, item in enumerate(results[:max_results]):
+        details = _nutrition_cache.get(str(item['id']))
+        if details:
+            yield rank, details
+        else:
+            missing.append((rank, item))
+
+    if missing:
+        persisted = _load_persisted([str(item['id']) for _, item in missing])
+        still_missing = []
+        for rank, item in missing:
+            details = persisted.get(str(item['id']))
+            if details:
+                _nutrition_cache.set(str(item['id']), details)
+                yield rank, details
+            else:
+                still_missing.append((rank, item))
+        missing = still_missing
+
+    # 3. Get detailed info (macros) concurrently for the rest.
+    # Spoonacular doesn't have a free bulk ingredient info endpoint, so we pay one
+    # call per hit, but they overlap instead of queueing behind each other.
+    pending = {}
+    fetched = []
+    for rank, item in missing:
+        if time.monotonic() >= deadline:
+            break
+        pending[_executor.submit(metrics.bind(_fetch_details, item, deadline))] = (rank, item)
+
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"Spoonacular deadline hit, dropping {len(pending)} detail lookups")
+            break
+        done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            rank, item = pending.pop(future)
             try:
-                info_url = f"{BASE_URL}/food/ingredients/{item['id']}/information"
-                info_params = {
-                    "apiKey": API_KEY,
-                    "amount": 100, 
-                    "unit": "grams"
-                }
-                info_res = requests.get(info_url, params=info_params)
-                if info_res.status_code != 200:
-                    continue
-                    
-                details = info_res.json()
-                
-                # Extract macro nutrients
-                nutrients = details.get('nutrition', {}).get('nutrients', [])
-                def get_amount(name):
-                    for n in nutrients:
-                        if n['name'] == name:
-                            return n['amount']
-                    return 0
-                
-                # Data is for 100g as requested
-                kcal_100g = get_amount("Calories")
-                pro_100g = get_amount("Protein")
-                
-                final_results.append({
-                    "api_id": str(details['id']),
-                    "name": details['name'],
-                    "calories_per_g": round(kcal_100g / 100.0, 4),
-                    "protein_per_g": round(pro_100g / 100.0, 4),
-                    "image_url": f"https://spoonacular.com/cdn/ingredients_100x100/{details['image']}" if details.get('image') else None
-                })
+                details = future.result()
+            except (QuotaExhausted, resilience.Unavailable):
+                continue
             except Exception as e:
                 print(f"Error fetching details for {item['name']}: {e}")
                 continue
-            
-        return final_results
+            if details:
+                _nutrition_cache.set(details['api_id'], details)
+                fetched.append(details)
+                yield rank, details
+
+    for future in pending:
+        future.cancel()
 
+    if fetched:
+        # Off the request path; a failed write only costs a future API call.
+        _persist_executor.submit(_persist, fetched)
+
+
+def iter_search_food(query: str, max_results: int = MAX_RESULTS, deadline_s: float = DEADLINE_S) -> Iterator[Dict[str, Any]]:
+    """
+    Yields ingredient results (with per-gram macros) in completion order.
+
+    The search call is made first, then detail lookups for the top `max_results`
+    hits are fanned out over the shared worker pool. Anything that has not
+    finished when `deadline_s` elapses is dropped.
+    """
+    for _, details in _iter_ranked(query, max_results, deadline_s):
+        yield details
+
+
+def search_food(query: str, max_results: int = MAX_RESULTS, deadline_s: float = DEADLINE_S) -> List[Dict[str, Any]]:
+    """
+    Blocking wrapper around the concurrent lookup that keeps Spoonacular's ranking.
+    """
+    try:
+        ranked = sorted(_iter_ranked(query, max_results, deadline_s), key=lambda pair: pair[0])
+        return [details for _, details in ranked]
     except Exception as e:
         print(f"Spoonacular Error: {e}")
         return []
@@ -0,0 +1,122 @@
+import csv
+import io
+from collections import Counter
+from datetime import date
+from typing import Any, AsyncIterator, Dict, List
+
+import orjson
+from postgrest.exceptions import APIError
+
+import pagination
+from db import authed_rpc, fetch_rows
+
+# Grams of each ingredient needed for a user's meal plans in a date range.
+#
+# The grouping runs in Postgres (meal_plan_shopping_list in
+# database/schema.sql): one row per ingredient, ordered by (name,
+# ingredient_id). It is called once; paging it with a cursor would re-run
+# the whole aggregation for every page, and the result is only as long as
+# the number of distinct ingredients anyway. Until that
+# function is deployed, the same totals come from one hash-aggregate pass:
+# count how often each recipe is planned, then fold those recipes' ingredient
+# links. Either way memory grows with the number of distinct ingredients, not
+# with the length of the range.
+
+CSV_FIELDS = ["name", "amount_g", "meals", "api_id", "ingredient_id"]
+ITEM_ORDER = [("name", False), ("ingredient_id", False)]
+PLAN_ORDER = [("date", False), ("id", False)]
+PAGE_SIZE = 1000
+# Recipe ids per recipe_ingredients read (keeps the in.(...) URL short)
+RECIPE_CHUNK = 100
+
+
+def _item(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ingredient_id": row.get("ingredient_id"),
+        "name": row.get("name"),
+        "amount_g": round(float(row.get("amount_g") or 0.0), 1),
+        "meals": int(row.get("meals") or 0),
+        "api_id": row.get("api_id"),
+        "image_url": row.get("image_url"),
+    }
+
+
+async def iter_items(db, user_id: str, start_date: date, end_date: date, authorization: str) -> AsyncIterator[Dict[str, Any]]:
+    """Yields one shopping-list item per ingredient, ordered by name."""
+    params = {"p_start": start_date.isoformat(), "p_end": end_date.isoformat()}
+    query = pagination.order(authed_rpc(db, "meal_plan_shopping_list", params, authorization), ITEM_ORDER)
+    try:
+        rows = await fetch_rows(query)
+    except APIError as e:
+        # PGRST202: function not deployed yet. Anything else is a real failure.
+        if "PGRST202" not in str(e):
+            raise
+        print("meal_plan_shopping_list missing, aggregating meal plans in the API")
+        for item in await _aggregate(db, user_id, start_date, end_date, authorization):
+            yield item
+        return
+    for row in rows:
+        yield _item(row)
+
+
+async def _aggregate(db, user_id: str, start_date: date, end_date: date, authorization: str) -> List[Dict[str, Any]]:
+    # 1. How often each recipe is planned in the range
+    planned: Counter = Counter()
+    cursor = None
+    while True:
+        query = db.table("meal_plans")
+        query.headers = {**query.headers, "authorization": authorization}
+        query = query.select("id, date, recipe_id").eq("user_id", user_id).gte("date", start_date).lte("date", end_date)
+        query = pagination.after(pagination.order(query, PLAN_ORDER), PLAN_ORDER, cursor).limit(PAGE_SIZE + 1)
+        page, cursor = pagination.split_page(await fetch_rows(query), PAGE_SIZE, PLAN_ORDER)
+        planned.update(row["recipe_id"] for row in page)
+        if not cursor:
+            break
+
+    # 2. One pass over those recipes' ingredient links
+    totals: Dict[str, Dict[str, Any]] = {}
+    recipe_ids = list(planned)
+    for i in range(0, len(recipe_ids), RECIPE_CHUNK):
+        query = db.table("recipe_ingredients")
+        query.headers = {**query.headers, "authorization": authorization}
+        links = await fetch_rows(query
+            .select("recipe_id, amount_g, ingredients(id, name, api_id, image_url)")
+            .in_("recipe_id", recipe_ids[i:i + RECIPE_CHUNK]))
+        counted = set()
+        for link in links:
+            ingredient = link.get("ingredients")
+            if not ingredient:
+                continue
+            n = planned[link["recipe_id"]]
+            item = totals.get(ingredient["id"])
+            if item is None:
+                item = totals[ingredient["id"]] = {
+                    "ingredient_id": ingredient["id"], "name": ingredient.get("name"),
+                    "amount_g": 0.0, "meals": 0,
+                    "api_id": ingredient.get("api_id"), "image_url": ingredient.get("image_url"),
+                }
+            item["amount_g"] += float(link.get("amount_g") or 0.0) * n
+            # A meal counts once per ingredient, even if its recipe lists it twice
+            if (link["recipe_id"], ingredient["id"]) not in counted:
+                counted.add((link["recipe_id"], ingredient["id"]))
+                item["meals"] += n
+
+    return [_item(item) for item in sorted(totals.values(), key=lambda i: (i["name"] or "", i["ingredient_id"]))]
+
+
+def ndjson_line(item: Dict[str, Any]) -> bytes:
+    return orjson.dumps(item) + b"\n"
+
+
+def csv_header() -> str:
+    return _csv_row(CSV_FIELDS)
+
+
+def csv_line(item: Dict[str, Any]) -> str:
+    return _csv_row([item.get(field) for field in CSV_FIELDS])
+
+
+def _csv_row(values: List[Any]) -> str:
+    out = io.StringIO()
+    csv.writer(out).writerow(["" if v is None else v for v in values])
+    return out.getvalue()
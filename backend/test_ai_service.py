@@ -0,0 +1,190 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import providers
+import resilience
+import services.ai_service as ai_service
+from cache import DiskCache
+
+
+class StubModel:
+    """Stands in for genai.GenerativeModel: counts calls, answers after `delay_s`."""
+
+    def __init__(self, delay_s=0.0, fail=False):
+        self.delay_s = delay_s
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None, request_options=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay_s)
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        return type("Response", (), {"text": json.dumps({"name": "Pancakes", "calories_per_serving": 350})})()
+
+
+_tmpdir = tempfile.TemporaryDirectory()
+
+
+def use_model(model):
+    providers.override("gemini", model)
+    return model
+
+
+def setup_function():
+    ai_service._cache = DiskCache(os.path.join(_tmpdir.name, f"parse-{time.monotonic_ns()}.sqlite3"), name="gemini_parse")
+    ai_service._inflight.clear()
+    resilience.reset("gemini")
+    use_model(StubModel())
+
+
+def test_identical_text_is_parsed_once():
+    first = ai_service.parse_recipe_from_text("2 eggs, 1 cup flour, milk")
+    second = ai_service.parse_recipe_from_text("2 eggs, 1 cup flour, milk")
+    assert first == second == {"name": "Pancakes", "calories_per_serving": 350}
+    assert providers.get("gemini").calls == 1
+
+
+def test_whitespace_only_differences_share_an_entry():
+    ai_service.parse_recipe_from_text("2 eggs,\n1 cup flour,  milk")
+    ai_service.parse_recipe_from_text("  2 eggs, 1 cup\tflour, milk \n")
+    assert providers.get("gemini").calls == 1
+
+
+def test_model_and_schema_are_part_of_the_key():
+    text = "2 eggs, 1 cup flour, milk"
+    key = ai_service.cache_key(text)
+    original_model, original_version = ai_service.MODEL_NAME, ai_service.PROMPT_VERSION
+    try:
+        ai_service.MODEL_NAME = "gemini-other"
+        assert ai_service.cache_key(text) != key
+        ai_service.MODEL_NAME = original_model
+        ai_service.PROMPT_VERSION = original_version + 1
+        assert ai_service.cache_key(text) != key
+    finally:
+        ai_service.MODEL_NAME, ai_service.PROMPT_VERSION = original_model, original_version
+
+
+def test_concurrent_identical_requests_share_one_call():
+    model = use_model(StubModel(delay_s=0.2))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(ai_service.parse_recipe_from_text, ["pancakes"] * 8))
+    assert model.calls == 1
+    assert all(r == results[0] for r in results)
+    # Each caller gets its own copy
+    results[0]["name"] = "changed"
+    assert results[1]["name"] == "Pancakes"
+
+
+def test_failures_are_shared_but_not_cached():
+    model = use_model(StubModel(delay_s=0.1, fail=True))
+    errors = []
+
+    def call():
+        try:
+            ai_service.parse_recipe_from_text("pancakes")
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(errors) == 4
+    assert model.calls == 1
+
+    model = use_model(StubModel())
+    assert ai_service.parse_recipe_from_text("pancakes")["name"] == "Pancakes"
+    assert model.calls == 1
+
+
+def test_stats_report_hits_and_upstream_latency():
+    model = use_model(StubModel(delay_s=0.01))
+    ai_service.parse_recipe_from_text("pancakes")
+    ai_service.parse_recipe_from_text("pancakes")
+    stats = ai_service.parse_cache_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["upstream_ms_max"] >= 10
+
+
+def test_open_circuit_fails_fast_but_serves_cached_parses():
+    ai_service.parse_recipe_from_text("pancakes")
+    model = use_model(StubModel(fail=True))
+    for i in range(ai_service._dependency.breaker.failure_threshold):
+        try:
+            ai_service.parse_recipe_from_text(f"waffles {i}")
+        except RuntimeError:
+            pass
+    assert resilience.get("gemini").breaker.state == resilience.OPEN
+
+    calls = model.calls
+    try:
+        ai_service.parse_recipe_from_text("waffles again")
+        assert False, "expected CircuitOpen"
+    except resilience.CircuitOpen as e:
+        assert e.retry_after_s >= 1
+    assert model.calls == calls
+    assert ai_service.parse_recipe_from_text("pancakes")["name"] == "Pancakes"
+
+
+def test_half_open_probe_closes_the_circuit():
+    breaker = ai_service._dependency.breaker
+    breaker.reset_s = 0.05
+    use_model(StubModel(fail=True))
+    for i in range(breaker.failure_threshold):
+        try:
+            ai_service.parse_recipe_from_text(f"waffles {i}")
+        except RuntimeError:
+            pass
+    assert breaker.state == resilience.OPEN
+
+    time.sleep(0.06)
+    model = use_model(StubModel())
+    assert ai_service.parse_recipe_from_text("crepes")["name"] == "Pancakes"
+    assert model.calls == 1
+    assert breaker.state == resilience.CLOSED
+
+
+def test_bulkhead_rejects_calls_beyond_the_cap():
+    bulkhead = ai_service._dependency.bulkhead
+    bulkhead.queue_timeout_s = 0.05
+    use_model(StubModel(delay_s=0.3))
+    texts = [f"stew {i}" for i in range(bulkhead.max_concurrent + 2)]
+    with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+        futures = [pool.submit(ai_service.parse_recipe_from_text, text) for text in texts]
+    rejected = [f for f in futures if isinstance(f.exception(), resilience.BulkheadFull)]
+    assert len(rejected) == 2
+    assert resilience.stats()["gemini"]["peak_in_flight"] == bulkhead.max_concurrent
+
+
+def test_disk_cache_evicts_least_recently_read():
+    cache = DiskCache(os.path.join(_tmpdir.name, "evict.sqlite3"), max_bytes=250)
+    for key in ("a", "b"):
+        cache.set(key, b"x" * 100)
+    assert cache.get("a") is not None
+    cache.set("c", b"x" * 100)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.evictions == 1
+
+
+def test_disk_cache_survives_reopen():
+    path = os.path.join(_tmpdir.name, "reopen.sqlite3")
+    DiskCache(path).set("k", b"value")
+    assert DiskCache(path).get("k") == b"value"
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            setup_function()
+            fn()
+            print(f"{name}: ok")
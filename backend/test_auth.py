@@ -0,0 +1,121 @@
+import asyncio
+import importlib
+import os
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+import jwt
+from fastapi import HTTPException
+
+import auth
+
+SECRET = "test-jwt-secret-with-at-least-32-bytes"
+
+
+def mint(sub="11111111-1111-1111-1111-111111111111", expires_in=3600, secret=SECRET, **claims):
+    payload = {"sub": sub, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + expires_in, **claims}
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+def current_user(token):
+    return asyncio.run(auth.get_current_user(f"Bearer {token}"))
+
+
+def setup_function():
+    auth.JWT_SECRET = SECRET
+    auth.REMOTE_FALLBACK = False
+    auth._verified_tokens.clear()
+
+
+def test_valid_token_is_verified_locally():
+    user = current_user(mint(email="cook@example.com"))
+    assert user.id == "11111111-1111-1111-1111-111111111111"
+    assert user.email == "cook@example.com"
+
+
+def test_verified_token_is_cached():
+    token = mint()
+    hits = auth._verified_tokens.hits
+    current_user(token)
+    current_user(token)
+    assert auth._verified_tokens.hits == hits + 1
+
+
+def test_expired_token_is_rejected():
+    try:
+        current_user(mint(expires_in=-10))
+    except HTTPException as e:
+        assert e.status_code == 401
+    else:
+        raise AssertionError("expired token accepted")
+
+
+def test_wrong_secret_is_rejected():
+    try:
+        current_user(mint(secret="some-other-secret-that-is-also-long-enough"))
+    except HTTPException as e:
+        assert e.status_code == 401
+    else:
+        raise AssertionError("forged token accepted")
+
+
+def test_remote_fallback_is_opt_in():
+    calls = []
+
+    class Remote:
+        user = auth.AuthUser(id="remote")
+
+    class FakeAuth:
+        async def get_user(self, token):
+            calls.append(token)
+            return Remote()
+
+    class FakeClient:
+        auth = FakeAuth()
+
+    async def get_client():
+        return FakeClient()
+
+    original = auth.get_async_supabase
+    auth.get_async_supabase = get_client
+    try:
+        token = mint(secret="rotated-secret-not-known-to-the-backend!")
+        try:
+            current_user(token)
+        except HTTPException:
+            pass
+        assert calls == []
+
+        auth.REMOTE_FALLBACK = True
+        assert current_user(token).id == "remote"
+        assert calls == [token]
+    finally:
+        auth.get_async_supabase = original
+
+
+def test_remote_fallback_defaults_on_until_a_secret_is_set():
+    saved = {k: os.environ.pop(k, None) for k in ("SUPABASE_JWT_SECRET", "AUTH_REMOTE_FALLBACK")}
+    try:
+        importlib.reload(auth)
+        assert auth.REMOTE_FALLBACK is True
+
+        os.environ["SUPABASE_JWT_SECRET"] = SECRET
+        importlib.reload(auth)
+        assert auth.REMOTE_FALLBACK is False
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        importlib.reload(auth)
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            setup_function()
+            fn()
+            print(f"{name}: ok")
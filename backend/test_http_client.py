@@ -0,0 +1,226 @@
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+import requests
+from requests.adapters import BaseAdapter
+
+import services.http_client as http_client
+import services.spoonacular_service as spoonacular_service
+from services.http_client import QuotaExhausted, TokenBucket
+
+URL = "https://api.example.test/items"
+
+
+class FakeClock:
+    """Stands in for the `time` module: sleeping only moves the clock."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class MaxJitter:
+    """Full jitter always picks the top of the window, so delays are exact."""
+
+    @staticmethod
+    def uniform(low, high):
+        return high
+
+
+class ScriptedAdapter(BaseAdapter):
+    """Answers each request with the next status (or raises the next exception)."""
+
+    def __init__(self, clock, *script, latency_s=0.0):
+        super().__init__()
+        self.clock = clock
+        self.script = list(script)
+        self.latency_s = latency_s
+        self.timeouts = []
+
+    def send(self, request, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        self.clock.now += self.latency_s
+        step = self.script.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        status, headers = step if isinstance(step, tuple) else (step, {})
+        res = requests.Response()
+        res.status_code = status
+        res.headers.update(headers)
+        res.url = request.url
+        res.request = request
+        res._content = b"{}"
+        return res
+
+    def close(self):
+        pass
+
+
+_time, _random, _session = http_client.time, http_client.random, http_client._session
+
+
+def setup_function():
+    global clock
+    clock = FakeClock()
+    http_client.time = clock
+    http_client.random = MaxJitter
+
+
+def teardown_function():
+    http_client.time, http_client.random, http_client._session = _time, _random, _session
+
+
+def use(*script, latency_s=0.0):
+    adapter = ScriptedAdapter(clock, *script, latency_s=latency_s)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    http_client._session = session
+    return adapter
+
+
+def test_retries_with_exponential_backoff_then_succeeds():
+    adapter = use(503, 502, 200)
+
+    res = http_client.get(URL, retries=3)
+
+    assert res.status_code == 200
+    assert len(adapter.timeouts) == 3
+    assert clock.sleeps == [http_client.BACKOFF_BASE_S, http_client.BACKOFF_BASE_S * 2]
+
+
+def test_backoff_is_capped():
+    use(*[500] * 8, 200)
+
+    http_client.get(URL, retries=8)
+
+    assert max(clock.sleeps) == http_client.BACKOFF_MAX_S
+
+
+def test_retry_after_is_honoured():
+    use((429, {"Retry-After": "1.5"}), 200)
+
+    assert http_client.get(URL).status_code == 200
+    assert clock.sleeps == [1.5]
+
+
+def test_last_response_is_returned_once_retries_run_out():
+    adapter = use(503, 503, 503)
+
+    assert http_client.get(URL, retries=2).status_code == 503
+    assert len(adapter.timeouts) == 3
+
+
+def test_client_errors_are_not_retried():
+    adapter = use(404)
+
+    assert http_client.get(URL).status_code == 404
+    assert len(adapter.timeouts) == 1
+    assert clock.sleeps == []
+
+
+def test_connection_errors_are_retried_then_raised():
+    use(requests.ConnectionError("reset"), 200)
+    assert http_client.get(URL).status_code == 200
+
+    use(*[requests.ConnectionError("refused")] * 3)
+    try:
+        http_client.get(URL, retries=2)
+    except requests.ConnectionError:
+        pass
+    else:
+        raise AssertionError("expected ConnectionError")
+
+
+def test_timeouts_are_clipped_to_the_deadline_and_no_retry_overruns_it():
+    adapter = use(503, 200, latency_s=0.375)
+
+    # 0.5s left: the first attempt leaves 0.125s, less than the 0.25s backoff
+    res = http_client.get(URL, deadline=clock.now + 0.5, timeout=(3.0, 10.0))
+
+    assert res.status_code == 503
+    assert adapter.timeouts == [(0.5, 0.5)]
+    assert clock.sleeps == []
+
+
+def test_expired_deadline_raises_before_sending():
+    adapter = use(200)
+    try:
+        http_client.get(URL, deadline=clock.now)
+    except requests.Timeout:
+        pass
+    else:
+        raise AssertionError("expected Timeout")
+    assert adapter.timeouts == []
+
+
+def test_every_attempt_spends_from_the_limiter():
+    bucket = TokenBucket(capacity=3, refill_per_s=0)
+    use(503, 200)
+
+    assert http_client.get(URL, limiter=bucket, cost=1.5).status_code == 200
+    assert bucket.available == 0
+    try:
+        http_client.get(URL, limiter=bucket)
+    except QuotaExhausted:
+        pass
+    else:
+        raise AssertionError("expected QuotaExhausted")
+
+
+def test_token_bucket_refills_continuously_up_to_capacity():
+    bucket = TokenBucket(capacity=10, refill_per_s=2)
+    assert bucket.try_acquire(10)
+    assert not bucket.try_acquire(1)
+
+    clock.now += 1.25
+    assert bucket.available == 2.5
+    assert bucket.try_acquire(2.5)
+
+    clock.now += 3600
+    assert bucket.available == 10
+
+
+def test_sync_only_ever_lowers_the_local_count():
+    bucket = TokenBucket(capacity=150, refill_per_s=0)
+    bucket.sync(40)
+    assert bucket.available == 40
+    bucket.sync(120)
+    assert bucket.available == 40
+    bucket.sync(-5)
+    assert bucket.available == 0
+
+
+def test_spoonacular_quota_follows_the_quota_left_header():
+    original = spoonacular_service._quota
+    spoonacular_service._quota = TokenBucket(capacity=150, refill_per_s=0)
+    try:
+        def response(headers):
+            res = requests.Response()
+            res.headers.update(headers)
+            return res
+
+        spoonacular_service._sync_quota(response({"X-API-Quota-Left": "12.5"}))
+        assert spoonacular_service._quota.available == 12.5
+        spoonacular_service._sync_quota(response({"X-API-Quota-Left": "not a number"}))
+        spoonacular_service._sync_quota(response({}))
+        assert spoonacular_service._quota.available == 12.5
+    finally:
+        spoonacular_service._quota = original
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            setup_function()
+            fn()
+            teardown_function()
+            print(f"{name}: ok")
@@ -0,0 +1,159 @@
+import io
+from types import SimpleNamespace
+
+import cloudinary.exceptions
+from PIL import Image
+
+import providers
+import resilience
+import services.cloudinary_service as cloudinary_service
+
+
+class FakeUploader:
+    """Stands in for cloudinary.uploader: keeps what was sent, keyed by public_id."""
+
+    def __init__(self):
+        self.assets = {}
+        self.calls = 0
+        self.bytes_sent = 0
+
+    def upload(self, file, public_id=None, folder=None, **options):
+        data = file.read()
+        self.calls += 1
+        self.bytes_sent += len(data)
+        full_id = f"{folder}/{public_id}"
+        url = f"https://res.cloudinary.test/{full_id}.webp"
+        self.assets[full_id] = {"secure_url": url, "data": data}
+        return {"secure_url": url, "public_id": full_id}
+
+
+class FakeAdminApi:
+    def __init__(self, uploader):
+        self.uploader = uploader
+        self.lookups = 0
+
+    def resource(self, public_id, **options):
+        self.lookups += 1
+        if public_id not in self.uploader.assets:
+            raise cloudinary.exceptions.NotFound(f"Resource not found - {public_id}")
+        return self.uploader.assets[public_id]
+
+
+def make_photo(width=4032, height=3024, fmt="JPEG", mode="RGB"):
+    img = Image.linear_gradient("L").resize((width, height)).convert(mode)
+    if mode == "RGBA":
+        img.putalpha(Image.linear_gradient("L").resize((width, height)))
+    out = io.BytesIO()
+    img.save(out, format=fmt, quality=92)
+    return out.getvalue()
+
+
+def setup_function():
+    global uploader, admin_api
+    uploader = FakeUploader()
+    admin_api = FakeAdminApi(uploader)
+    providers.override("cloudinary", SimpleNamespace(uploader=uploader, admin_api=admin_api))
+    cloudinary_service._known.clear()
+    resilience.reset("cloudinary")
+
+
+def test_large_photo_is_downscaled_to_webp():
+    photo = make_photo()
+    url = cloudinary_service.upload_image(io.BytesIO(photo), "dinner.jpg")
+    (asset,) = uploader.assets.values()
+    assert url == asset["secure_url"]
+    with Image.open(io.BytesIO(asset["data"])) as sent:
+        assert sent.format == "WEBP"
+        assert max(sent.size) == cloudinary_service.IMAGE_MAX_DIM
+        assert sent.size[0] > sent.size[1]
+    assert uploader.bytes_sent < len(photo)
+
+
+def test_small_image_keeps_its_size_and_alpha():
+    logo = make_photo(200, 100, fmt="PNG", mode="RGBA")
+    cloudinary_service.upload_image(logo, "logo.png")
+    (asset,) = uploader.assets.values()
+    with Image.open(io.BytesIO(asset["data"])) as sent:
+        assert sent.size == (200, 100)
+        assert sent.mode == "RGBA"
+
+
+def test_identical_photo_is_uploaded_once():
+    photo = make_photo(1200, 900)
+    first = cloudinary_service.upload_image(io.BytesIO(photo), "a.jpg")
+    second = cloudinary_service.upload_image(io.BytesIO(photo), "renamed.jpg")
+    assert first == second
+    assert uploader.calls == 1
+    # Served from memory, no Admin API call
+    assert admin_api.lookups == 1
+
+
+def test_existing_asset_is_found_after_restart():
+    photo = make_photo(1200, 900)
+    url = cloudinary_service.upload_image(io.BytesIO(photo), "a.jpg")
+    cloudinary_service._known.clear()
+    assert cloudinary_service.upload_image(io.BytesIO(photo), "a.jpg") == url
+    assert uploader.calls == 1
+    assert admin_api.lookups == 2
+
+
+def test_different_photos_get_different_ids():
+    cloudinary_service.upload_image(make_photo(1200, 900), "a.jpg")
+    cloudinary_service.upload_image(make_photo(900, 1200), "a.jpg")
+    assert uploader.calls == 2
+
+
+def test_non_image_is_rejected():
+    try:
+        cloudinary_service.upload_image(b"definitely not a photo", "notes.txt")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    assert uploader.calls == 0
+
+
+def test_oversized_upload_is_rejected_before_decoding():
+    original = cloudinary_service.MAX_UPLOAD_BYTES
+    cloudinary_service.MAX_UPLOAD_BYTES = 1024
+    try:
+        cloudinary_service.upload_image(make_photo(800, 600), "big.jpg")
+        assert False, "expected ValueError"
+    except ValueError as e:
+        assert "larger than" in str(e)
+    finally:
+        cloudinary_service.MAX_UPLOAD_BYTES = original
+    assert admin_api.lookups == 0
+
+
+def test_lookups_that_find_nothing_do_not_trip_the_breaker():
+    for i in range(cloudinary_service._dependency.breaker.failure_threshold + 1):
+        cloudinary_service.upload_image(make_photo(64 + i, 48), f"{i}.jpg")
+    assert resilience.get("cloudinary").breaker.state == resilience.CLOSED
+    assert uploader.calls == admin_api.lookups
+
+
+def test_open_circuit_rejects_before_resizing():
+    def failing_upload(file, **options):
+        raise cloudinary.exceptions.Error("503 Service Unavailable")
+
+    uploader.upload = failing_upload
+    for i in range(cloudinary_service._dependency.breaker.failure_threshold):
+        try:
+            cloudinary_service.upload_image(make_photo(64 + i, 48), f"{i}.jpg")
+        except cloudinary.exceptions.Error:
+            pass
+    lookups = admin_api.lookups
+    try:
+        cloudinary_service.upload_image(make_photo(), "dinner.jpg")
+        assert False, "expected CircuitOpen"
+    except resilience.CircuitOpen:
+        pass
+    assert admin_api.lookups == lookups
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            setup_function()
+            fn()
+            print(f"{name}: ok")
@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+import db
+import ingredient_index
+from ingredient_index import IngredientIndex
+
+
+def row(name, api_id=None):
+    return {"id": str(uuid.uuid4()), "api_id": api_id, "name": name, "calories_per_g": 1.0, "protein_per_g": 0.1}
+
+
+class FakeTable:
+    """Sorted `ingredients` rows behind just the builder calls _load_rows makes."""
+
+    def __init__(self, rows, delay_s=0.0):
+        self.rows = sorted(rows, key=lambda r: r["id"])
+        self.delay_s = delay_s
+        self.requests = []
+        self._after = None
+        self._limit = None
+
+    def table(self, name):
+        return self
+
+    def select(self, fields):
+        self._after, self._limit = None, None
+        return self
+
+    def order(self, column, desc=False):
+        assert column == "id" and not desc
+        return self
+
+    def or_(self, filters):
+        # pagination.after with a single key: id.gt."<last id>"
+        op, value = filters.split(".", 1)[1].split(".", 1)
+        assert op == "gt"
+        self._after = value.strip('"')
+        return self
+
+    def range(self, start, end):
+        raise AssertionError("the index loads by keyset, not OFFSET")
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def execute(self):
+        time.sleep(self.delay_s)
+        self.requests.append(self._after)
+        rows = [r for r in self.rows if self._after is None or r["id"] > self._after]
+        return SimpleNamespace(data=rows[:self._limit])
+
+
+_get_supabase = db.get_supabase
+
+
+def use_table(table):
+    db.get_supabase = lambda: table
+    return table
+
+
+def setup_function():
+    ingredient_index._index = None
+    ingredient_index._reloading = False
+    ingredient_index._failed_at = None
+
+
+def teardown_function():
+    db.get_supabase = _get_supabase
+
+
+def wait_for_index():
+    for _ in range(200):
+        index = ingredient_index.get_index()
+        if index is not None:
+            return index
+        time.sleep(0.01)
+    raise AssertionError("index never loaded")
+
+
+def test_ranks_exact_prefix_substring_and_typos():
+    index = IngredientIndex([row("Egg"), row("Eggplant"), row("Chicken egg noodles"), row("Red pepper")])
+
+    assert [r["name"] for r in index.search("egg")] == ["Egg", "Eggplant", "Chicken egg noodles"]
+    assert [r["name"] for r in index.search("pepp")] == ["Red pepper"]
+    assert [r["name"] for r in index.search("pepprr")] == ["Red pepper"]
+
+
+def test_first_search_does_not_wait_for_the_load():
+    use_table(FakeTable([row("Egg")], delay_s=0.2))
+
+    started = time.monotonic()
+    assert ingredient_index.get_index() is None
+    assert time.monotonic() - started < 0.1
+    assert [r["name"] for r in wait_for_index().search("egg")] == ["Egg"]
+
+
+def test_load_pages_by_keyset():
+    rows = [row(f"ingredient {i}") for i in range(25)]
+    original = ingredient_index.LOAD_PAGE_SIZE
+    ingredient_index.LOAD_PAGE_SIZE = 10
+    try:
+        table = use_table(FakeTable(rows))
+        loaded = ingredient_index._load_rows()
+    finally:
+        ingredient_index.LOAD_PAGE_SIZE = original
+
+    assert [r["id"] for r in loaded] == [r["id"] for r in table.rows]
+    # Three pages, each starting after the previous page's last id
+    assert table.requests == [None, table.rows[9]["id"], table.rows[19]["id"]]
+
+
+def test_failed_load_is_not_retried_on_every_search():
+    calls = []
+
+    class Broken:
+        def table(self, name):
+            calls.append(name)
+            raise RuntimeError("connection refused")
+
+    use_table(Broken())
+    assert ingredient_index.get_index() is None
+    for _ in range(100):
+        if ingredient_index._failed_at is not None and not ingredient_index._reloading:
+            break
+        time.sleep(0.01)
+    assert ingredient_index.get_index() is None
+    assert ingredient_index.get_index() is None
+    time.sleep(0.05)
+    assert len(calls) == 1
+
+
+def test_search_is_safe_while_rows_are_added():
+    index = IngredientIndex([row(f"apple {i}") for i in range(200)])
+    errors = []
+    done = threading.Event()
+
+    def add():
+        for i in range(2000):
+            index.add([row(f"apple pie {i}", api_id=str(i))])
+        done.set()
+
+    def search():
+        try:
+            while not done.is_set():
+                assert len(index.search("appl", limit=50)) == 50
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add)] + [threading.Thread(target=search) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert index.search("apple pie 1999")[0]["name"] == "apple pie 1999"
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            setup_function()
+            fn()
+            teardown_function()
+            print(f"{name}: ok")
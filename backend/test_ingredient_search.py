@@ -0,0 +1,232 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+import requests
+from requests.adapters import BaseAdapter
+
+import resilience
+import services.http_client as http_client
+import services.spoonacular_service as spoonacular_service
+from routers import recipes
+from services.http_client import TokenBucket
+
+
+def local(id, name, api_id=None):
+    return {"id": id, "name": name, "api_id": api_id, "calories_per_g": 1.0, "protein_per_g": 0.1, "image_url": None}
+
+
+def api(api_id, name):
+    return {"api_id": api_id, "name": name, "calories_per_g": 2.0, "protein_per_g": 0.2, "image_url": None}
+
+
+# Dedup edge cases: repeated local names (any case), local rows with and
+# without api_id, API matches by id or by name, and an API id equal to a
+# local-only row's uuid (the uuid is its display key but not a seen id)
+LOCAL = [
+    local("u1", "Egg", api_id="1123"),
+    local("u2", "egg"),
+    local("u3", "Egg white"),
+    local("u4", "Quail egg", api_id="9999"),
+]
+API = [
+    api("1123", "egg"),
+    api("2000", "EGG WHITE"),
+    api("9999", "quail eggs"),
+    api("u3", "egg substitute"),
+    api("3000", "egg yolk"),
+    api("3000", "egg yolk, raw"),
+    api("4000", "Egg Yolk"),
+]
+
+
+def old_merge(local_results, api_results):
+    """The merge loop of the original /ingredients/search, verbatim in substance."""
+    final_list, seen_ids, seen_names = [], set(), set()
+    for item in local_results:
+        uid = item.get('api_id') or str(item['id'])
+        if uid in seen_ids or item['name'].lower() in seen_names:
+            continue
+        final_list.append({"api_id": uid, "name": item['name'], "calories_per_g": item['calories_per_g'],
+                           "protein_per_g": item['protein_per_g'], "image_url": item.get('image_url')})
+        if item.get('api_id'):
+            seen_ids.add(str(item['api_id']))
+        seen_names.add(item['name'].lower())
+    for item in api_results:
+        uid, name = str(item['api_id']), item['name'].lower()
+        if uid in seen_ids or name in seen_names:
+            continue
+        final_list.append(item)
+        seen_ids.add(uid)
+        seen_names.add(name)
+    return final_list
+
+
+class Script:
+    """Stands in for the local search and the Spoonacular iterator, logging when each delivers."""
+
+    def __init__(self, local_results, api_results, local_after_api=False, api_delay_s=0.0):
+        self.local_results, self.api_results = local_results, api_results
+        self.local_after_api, self.api_delay_s = local_after_api, api_delay_s
+        self.events = []
+        self.release = threading.Event()
+
+    async def search_local(self, db, q):
+        # Optionally hold the local results until every API match was produced
+        give_up = time.monotonic() + 2.0
+        while self.local_after_api and self.events.count("api") < len(self.api_results) and time.monotonic() < give_up:
+            await asyncio.sleep(0.005)
+        self.events.append("local")
+        return self.local_results
+
+    def iter_search_food(self, q, deadline_s=None):
+        if self.api_delay_s:
+            self.release.wait(self.api_delay_s)
+        for item in self.api_results:
+            self.events.append("api")
+            yield item
+
+    def search_food(self, q, deadline_s=None):
+        return list(self.iter_search_food(q, deadline_s))
+
+
+class CountingAdapter(BaseAdapter):
+    """Stands in for Spoonacular; any request that gets this far is a failure."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request.url)
+        raise requests.ConnectionError("unreachable")
+
+    def close(self):
+        pass
+
+
+_search_local, _iter_search_food, _search_food = recipes._search_local, recipes.iter_search_food, recipes.search_food
+_api_key, _quota, _session = spoonacular_service.API_KEY, spoonacular_service._quota, http_client._session
+
+
+def use(script):
+    recipes._search_local = script.search_local
+    recipes.iter_search_food = script.iter_search_food
+    recipes.search_food = script.search_food
+    return script
+
+
+def use_spoonacular(quota=150):
+    """The real Spoonacular client with `quota` points left, behind a CountingAdapter."""
+    recipes._search_local = Script(LOCAL[:2], []).search_local
+    spoonacular_service.API_KEY = "test-key"
+    spoonacular_service._quota = TokenBucket(capacity=150, refill_per_s=0)
+    spoonacular_service._quota.sync(quota)
+    spoonacular_service._query_cache.clear()
+    adapter = CountingAdapter()
+    session = requests.Session()
+    session.mount("https://", adapter)
+    http_client._session = session
+    return adapter
+
+
+def teardown_function():
+    recipes._search_local, recipes.iter_search_food, recipes.search_food = _search_local, _iter_search_food, _search_food
+    spoonacular_service.API_KEY, spoonacular_service._quota, http_client._session = _api_key, _quota, _session
+    resilience.reset("spoonacular")
+
+
+def stream(q="egg", budget_ms=None):
+    async def collect():
+        response = await recipes.stream_search_ingredients(q, budget_ms, None)
+        return [json.loads(line) async for line in response.body_iterator]
+    return asyncio.run(collect())
+
+
+def items(lines):
+    return [item for line in lines for item in line.get("items", [])]
+
+
+def test_stream_sends_local_matches_first_even_when_the_api_answers_sooner():
+    script = use(Script(LOCAL[:1], [api("5000", "duck egg"), api("6000", "goose egg")], local_after_api=True))
+
+    lines = stream()
+
+    assert script.events == ["api", "api", "local"]
+    assert [line["source"] for line in lines] == ["local", "api", "api", "done"]
+    assert [i["name"] for i in items(lines)] == ["Egg", "duck egg", "goose egg"]
+
+
+def test_stream_dedups_like_the_original_endpoint():
+    use(Script(LOCAL, API))
+
+    expected = old_merge(LOCAL, API)
+    assert items(stream()) == expected
+    assert asyncio.run(recipes.search_ingredients("egg", None, None)) == expected
+    # What those rules mean for this fixture
+    assert [i["api_id"] for i in expected] == ["1123", "u3", "9999", "u3", "3000"]
+
+
+def test_deadline_leaves_only_local_results():
+    script = use(Script(LOCAL[:2], API, api_delay_s=5.0))
+    try:
+        started = time.monotonic()
+        lines = stream(budget_ms=100)
+        elapsed = time.monotonic() - started
+    finally:
+        script.release.set()
+
+    assert [line["source"] for line in lines] == ["local", "done"]
+    assert items(lines) == old_merge(LOCAL[:2], [])
+    assert elapsed < 1.0
+
+
+def test_api_matches_arriving_before_the_deadline_are_kept():
+    script = use(Script([], API[:2], api_delay_s=0.01))
+    try:
+        lines = stream(budget_ms=2000)
+    finally:
+        script.release.set()
+    assert [line["source"] for line in lines] == ["local", "api", "api", "done"]
+    assert lines[0]["items"] == []
+
+
+def test_open_circuit_degrades_search_to_local_results():
+    adapter = use_spoonacular()
+    breaker = resilience.get("spoonacular").breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    lines = stream()
+
+    assert [line["source"] for line in lines] == ["local", "done"]
+    assert items(lines) == old_merge(LOCAL[:2], [])
+    assert asyncio.run(recipes.search_ingredients("egg", None, None)) == old_merge(LOCAL[:2], [])
+    assert adapter.sent == []
+    assert resilience.stats()["spoonacular"]["rejected_open"] == 2
+
+
+def test_spent_quota_degrades_search_without_tripping_the_breaker():
+    adapter = use_spoonacular(quota=0)
+    dependency = resilience.get("spoonacular")
+
+    for _ in range(dependency.breaker.failure_threshold + 1):
+        assert asyncio.run(recipes.search_ingredients("egg", None, None)) == old_merge(LOCAL[:2], [])
+    assert items(stream()) == old_merge(LOCAL[:2], [])
+
+    assert adapter.sent == []
+    assert dependency.breaker.state == resilience.CLOSED
+    assert dependency.stats()["failures"] == 0
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            teardown_function()
+            print(f"{name}: ok")
@@ -0,0 +1,277 @@
+import asyncio
+import os
+import uuid
+from datetime import date
+from types import SimpleNamespace
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+import orjson
+from postgrest.exceptions import APIError
+
+import listing_cache
+import usage_counter
+from models import MealPlanCreate
+from routers import meal_plans
+from serialization import ORJSONResponse
+
+ALICE, BOB = "11111111-1111-1111-1111-111111111111", "22222222-2222-2222-2222-222222222222"
+USER = SimpleNamespace(id=ALICE)
+AUTH = "Bearer test"
+
+
+class FakeVersions:
+    """Answers user_data_version with `shared`, or raises `error`; counts the calls."""
+
+    def __init__(self, shared=0, error=None):
+        self.shared, self.error = shared, error
+        self.calls = []
+
+    def rpc(self, db, fn, params, authorization):
+        self.calls.append((fn, authorization))
+        return self
+
+    async def fetch_rows(self, query):
+        if self.error is not None:
+            raise self.error
+        return self.shared
+
+
+_authed_rpc, _fetch_rows = listing_cache.authed_rpc, listing_cache.fetch_rows
+_route_fetch_rows = meal_plans.fetch_rows
+
+
+def use(fake):
+    listing_cache.authed_rpc, listing_cache.fetch_rows = fake.rpc, fake.fetch_rows
+    return fake
+
+
+class FakeQuery:
+    """The meal_plans reads and inserts the list and create routes make."""
+
+    def __init__(self, db):
+        self.db = db
+        self.headers = {}
+        self.filters = []
+        self.payload = None
+
+    def select(self, fields):
+        return self
+
+    def insert(self, payload):
+        self.payload = payload
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r[column] == str(value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda r: r[column] >= str(value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda r: r[column] <= str(value))
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def single(self):
+        return self
+
+    def rows(self):
+        return [r for r in self.db.plans if all(f(r) for f in self.filters)]
+
+    async def execute(self):
+        if self.payload is None:
+            return SimpleNamespace(data=self.rows()[0])
+        row = {"id": str(uuid.uuid4()), "recipe": None, "created_at": "2026-03-01T00:00:00+00:00", **self.payload}
+        self.db.plans.append(row)
+        # What the meal_plans trigger does
+        self.db.versions.shared += 1
+        return SimpleNamespace(data=[row])
+
+
+class FakeDb:
+    def __init__(self):
+        self.plans = []
+        self.reads = 0
+        self.versions = use(FakeVersions())
+
+    def table(self, name):
+        return FakeQuery(self)
+
+
+async def fake_fetch_rows(query):
+    # Only the list route reads through fetch_rows
+    query.db.reads += 1
+    return query.rows()
+
+
+def list_plans(db, if_none_match=None):
+    return asyncio.run(meal_plans.get_meal_plans(date(2026, 3, 2), date(2026, 3, 8), USER, AUTH, if_none_match, db))
+
+
+def plan(db, day):
+    meal_plan = MealPlanCreate(date=day, meal_type="Lunch", recipe_id=uuid.uuid4())
+    asyncio.run(meal_plans.create_meal_plan(meal_plan, USER, AUTH, db))
+
+
+def versions(user_id=ALICE):
+    return asyncio.run(listing_cache.versions(None, user_id, AUTH))
+
+
+def listing(body):
+    return ORJSONResponse(body)
+
+
+def setup_function():
+    listing_cache.clear()
+    listing_cache._versions.clear()
+    listing_cache._shared_missing_at = None
+    meal_plans.fetch_rows = fake_fetch_rows
+
+
+def teardown_function():
+    listing_cache.authed_rpc, listing_cache.fetch_rows = _authed_rpc, _fetch_rows
+    meal_plans.fetch_rows = _route_fetch_rows
+    usage_counter._pending.clear()
+    usage_counter._pending_total = 0
+
+
+def test_entries_are_served_while_the_shared_version_holds():
+    use(FakeVersions(shared=7))
+    key = listing_cache.key(ALICE, listing_cache.RECIPES, None, 20)
+    seen = versions()
+    assert seen == (0, 7)
+    assert listing_cache.get(key, seen) is None
+
+    fresh = listing_cache.put(key, listing([{"id": "r1"}]), seen)
+    cached = listing_cache.get(key, versions())
+
+    assert cached.body == fresh.body == b'[{"id":"r1"}]'
+    assert cached.headers["etag"] == fresh.headers["etag"]
+    assert listing_cache.get(key, versions(), if_none_match=fresh.headers["etag"]).status_code == 304
+
+
+def test_a_write_through_another_instance_misses():
+    fake = use(FakeVersions(shared=7))
+    key = listing_cache.key(ALICE, listing_cache.MEAL_PLANS, "2026-03-02", "2026-03-08")
+    listing_cache.put(key, listing([]), versions())
+
+    # Another instance wrote: the trigger moved the version, nothing was invalidated here
+    fake.shared = 8
+    assert listing_cache.get(key, versions()) is None
+
+
+def test_invalidate_drops_only_the_users_listed_kinds():
+    use(FakeVersions(shared=1))
+    recipes = listing_cache.key(ALICE, listing_cache.RECIPES, None, 20)
+    plans = listing_cache.key(ALICE, listing_cache.MEAL_PLANS, "2026-03-02", "2026-03-08")
+    bobs = listing_cache.key(BOB, listing_cache.MEAL_PLANS, "2026-03-02", "2026-03-08")
+    for key in (recipes, plans, bobs):
+        listing_cache.put(key, listing([]), versions(key[0]))
+
+    assert listing_cache.invalidate(ALICE, listing_cache.MEAL_PLANS) == 1
+    assert listing_cache.version(ALICE) == 1 and listing_cache.version(BOB) == 0
+    assert listing_cache.get(plans, versions()) is None
+    assert listing_cache.get(recipes, versions()) is not None
+    assert listing_cache.get(bobs, versions(BOB)) is not None
+
+    assert listing_cache.invalidate(ALICE) == 1
+    assert listing_cache.get(recipes, versions()) is None
+
+
+def test_put_drops_a_read_that_overlapped_an_invalidation():
+    use(FakeVersions(shared=3))
+    key = listing_cache.key(ALICE, listing_cache.RECIPES, None, 20)
+    seen = versions()
+
+    # A write lands while the read is still waiting on PostgREST
+    listing_cache.invalidate(ALICE)
+    stale = listing_cache.put(key, listing([{"id": "old"}]), seen)
+
+    assert stale.status_code == 200 and stale.body == b'[{"id":"old"}]'
+    assert listing_cache.get(key, versions()) is None
+    listing_cache.put(key, listing([{"id": "new"}]), versions())
+    assert listing_cache.get(key, versions()).body == b'[{"id":"new"}]'
+
+
+def test_nothing_is_cached_until_the_version_function_is_deployed():
+    fake = use(FakeVersions(error=APIError({"code": "PGRST202", "message": "Could not find the function"})))
+    key = listing_cache.key(ALICE, listing_cache.RECIPES, None, 20)
+
+    seen = versions()
+    assert seen == (0, None)
+    fresh = listing_cache.put(key, listing([]), seen)
+    assert "etag" in fresh.headers
+    assert listing_cache.get(key, versions()) is None
+    # Not asked again until SHARED_VERSION_RETRY_S has passed
+    assert len(fake.calls) == 1
+
+
+def test_route_answers_304_until_the_listing_changes():
+    db = FakeDb()
+    plan(db, date(2026, 3, 3))
+
+    first = list_plans(db)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert list_plans(db, if_none_match=etag).status_code == 304
+    assert db.reads == 1
+
+
+def test_304_from_an_instance_that_never_cached_the_listing():
+    db = FakeDb()
+    plan(db, date(2026, 3, 3))
+    etag = list_plans(db).headers["etag"]
+
+    # Another instance: empty cache, same data version
+    listing_cache.clear()
+    not_modified = list_plans(db, if_none_match=etag)
+
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert db.reads == 1
+
+
+def test_a_write_changes_the_etag_on_every_instance():
+    db = FakeDb()
+    plan(db, date(2026, 3, 3))
+    etag = list_plans(db).headers["etag"]
+
+    # Written through another instance: nothing here was invalidated
+    db.plans.append({"id": "other", "user_id": ALICE, "date": "2026-03-04", "meal_type": "Dinner",
+                     "recipe_id": str(uuid.uuid4()), "recipe": None, "created_at": "2026-03-01T00:00:00+00:00"})
+    db.versions.shared += 1
+    changed = list_plans(db, if_none_match=etag)
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [p["date"] for p in orjson.loads(changed.body)] == ["2026-03-03", "2026-03-04"]
+
+    # And through this one
+    plan(db, date(2026, 3, 5))
+    again = list_plans(db, if_none_match=changed.headers["etag"])
+    assert again.status_code == 200
+    assert len(orjson.loads(again.body)) == 3
+
+
+def test_other_version_errors_fail_the_read():
+    use(FakeVersions(error=APIError({"code": "57014", "message": "canceling statement due to statement timeout"})))
+    try:
+        versions()
+    except APIError:
+        pass
+    else:
+        raise AssertionError("expected APIError")
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            setup_function()
+            fn()
+            teardown_function()
+            print(f"{name}: ok")
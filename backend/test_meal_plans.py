@@ -0,0 +1,291 @@
+import asyncio
+import json
+import os
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+from fastapi import HTTPException
+
+import listing_cache
+import usage_counter
+from models import MealPlanCopyWeek, MealPlanCreate
+from routers import meal_plans
+
+USER = SimpleNamespace(id="11111111-1111-1111-1111-111111111111")
+AUTH = "Bearer test"
+PANCAKES, SALAD, STEW = str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4())
+
+
+class FakeQuery:
+    """The meal_plans reads, inserts and deletes the scheduling routes make."""
+
+    def __init__(self, db):
+        self.db = db
+        self.headers = {}
+        self.op = "select"
+        self.payload = None
+        self.filters = []
+
+    def select(self, fields):
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: str(r[column]) == str(value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda r: r[column] >= str(value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda r: r[column] <= str(value))
+        return self
+
+    def in_(self, column, values):
+        values = {str(v) for v in values}
+        self.filters.append(lambda r: str(r[column]) in values)
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def rows(self):
+        self.db.calls.append(("meal_plans", "select"))
+        rows = [dict(r) for r in self.db.plans if all(f(r) for f in self.filters)]
+        return sorted(rows, key=lambda r: r["date"])
+
+    async def execute(self):
+        self.db.calls.append(("meal_plans", self.op))
+        if self.op == "insert":
+            return SimpleNamespace(data=self.db.add(self.payload))
+        matched = [r for r in self.db.plans if all(f(r) for f in self.filters)]
+        if self.op == "delete":
+            self.db.plans = [r for r in self.db.plans if r not in matched]
+        return SimpleNamespace(data=matched)
+
+
+class FakeRpc:
+    """schedule_meal_plans / copy_meal_plan_week as database/schema.sql defines them."""
+
+    def __init__(self, db, fn, params):
+        self.db, self.fn, self.params = db, fn, params
+        self.request = SimpleNamespace(headers={})
+
+    async def execute(self):
+        self.db.calls.append(("rpc", self.fn))
+        self.db.rpc_params.append(self.params)
+        if self.db.rpc_error is not None:
+            raise self.db.rpc_error
+        p = self.params
+        if self.fn == "schedule_meal_plans":
+            items = p["p_items"]
+        else:
+            start, to, days = date.fromisoformat(p["p_from"]), date.fromisoformat(p["p_to"]), p["p_days"]
+            items = [
+                {"date": (date.fromisoformat(r["date"]) + (to - start)).isoformat(), "meal_type": r["meal_type"], "recipe_id": r["recipe_id"]}
+                for r in self.db.plans if start.isoformat() <= r["date"] < (start + timedelta(days=days)).isoformat()
+            ]
+            if p["p_replace"]:
+                end = (to + timedelta(days=days)).isoformat()
+                self.db.plans = [r for r in self.db.plans if not to.isoformat() <= r["date"] < end]
+        return SimpleNamespace(data=[r["id"] for r in self.db.add([{**i, "user_id": USER.id} for i in items])])
+
+
+class FakeDb:
+    def __init__(self, rpc_error=None):
+        self.plans = []
+        self.calls = []
+        self.rpc_params = []
+        self.rpc_error = rpc_error
+
+    def table(self, name):
+        return FakeQuery(self)
+
+    def rpc(self, fn, params):
+        return FakeRpc(self, fn, params)
+
+    def add(self, items):
+        rows = [{"id": str(uuid.uuid4()), "recipe": None, "created_at": "2026-03-01T00:00:00+00:00", **i} for i in items]
+        self.plans.extend(rows)
+        return rows
+
+    def slots(self):
+        return sorted((r["date"], r["meal_type"], r["recipe_id"]) for r in self.plans)
+
+
+NOT_DEPLOYED = Exception("{'code': 'PGRST202', 'message': 'Could not find the function'}")
+
+
+def week(db, start, recipes):
+    """One Lunch a day from `start`, cycling through `recipes`."""
+    db.add([{"user_id": USER.id, "date": (start + timedelta(days=i)).isoformat(), "meal_type": "Lunch", "recipe_id": r}
+            for i, r in enumerate(recipes)])
+    db.calls.clear()
+
+
+def bulk(db, *slots):
+    items = [MealPlanCreate(date=d, meal_type=t, recipe_id=r) for d, t, r in slots]
+    return json.loads(asyncio.run(meal_plans.create_meal_plans_bulk(items, USER, AUTH, db)).body)
+
+
+def copy(db, **kwargs):
+    return json.loads(asyncio.run(meal_plans.copy_meal_plan_week(MealPlanCopyWeek(**kwargs), USER, AUTH, db)).body)
+
+
+async def fake_fetch_rows(query):
+    return query.rows()
+
+
+_fetch_rows = meal_plans.fetch_rows
+
+
+def setup_function():
+    meal_plans.fetch_rows = fake_fetch_rows
+    usage_counter._pending.clear()
+    usage_counter._pending_total = 0
+
+
+def teardown_function():
+    meal_plans.fetch_rows = _fetch_rows
+    usage_counter._pending.clear()
+    usage_counter._pending_total = 0
+
+
+def pending_usage():
+    deltas = usage_counter._pending.get(USER.id)
+    return deltas.counts if deltas else Counter()
+
+
+def test_bulk_is_one_transactional_rpc_and_one_refetch():
+    db = FakeDb()
+    version = listing_cache.version(USER.id)
+
+    created = bulk(db, (date(2026, 3, 2), "Breakfast", PANCAKES), (date(2026, 3, 2), "Lunch", SALAD),
+                   (date(2026, 3, 3), "Breakfast", PANCAKES))
+
+    assert db.calls == [("rpc", "schedule_meal_plans"), ("meal_plans", "select")]
+    assert db.rpc_params[0]["p_items"][1] == {"date": "2026-03-02", "meal_type": "Lunch", "recipe_id": SALAD}
+    assert [(p["date"], p["meal_type"]) for p in created] == [("2026-03-02", "Breakfast"), ("2026-03-02", "Lunch"), ("2026-03-03", "Breakfast")]
+    # The function counts usage itself
+    assert pending_usage() == Counter()
+    assert listing_cache.version(USER.id) > version
+
+
+def test_bulk_falls_back_to_a_single_insert():
+    db = FakeDb(rpc_error=NOT_DEPLOYED)
+
+    created = bulk(db, (date(2026, 3, 2), "Breakfast", PANCAKES), (date(2026, 3, 2), "Lunch", SALAD),
+                   (date(2026, 3, 3), "Breakfast", PANCAKES))
+
+    assert db.calls == [("rpc", "schedule_meal_plans"), ("meal_plans", "insert"), ("meal_plans", "select")]
+    assert len(created) == 3
+    assert all(p["user_id"] == USER.id for p in db.plans)
+    assert pending_usage() == Counter({PANCAKES: 2, SALAD: 1})
+
+
+def test_other_rpc_errors_are_not_swallowed():
+    db = FakeDb(rpc_error=Exception("canceling statement due to statement timeout"))
+    try:
+        bulk(db, (date(2026, 3, 2), "Lunch", SALAD))
+    except Exception as e:
+        assert "timeout" in str(e)
+    else:
+        raise AssertionError("expected the RPC error")
+    assert ("meal_plans", "insert") not in db.calls
+
+
+def test_empty_and_oversized_bulk_requests():
+    db = FakeDb()
+    assert bulk(db) == []
+    assert db.calls == []
+
+    too_many = [(date(2026, 3, 2), "Lunch", SALAD)] * (meal_plans.MAX_BULK_ITEMS + 1)
+    try:
+        bulk(db, *too_many)
+    except HTTPException as e:
+        assert e.status_code == 400
+    else:
+        raise AssertionError("expected HTTPException")
+
+
+def test_copy_week_passes_the_range_to_the_function():
+    db = FakeDb()
+    week(db, date(2026, 3, 2), [PANCAKES, SALAD, STEW])
+
+    created = copy(db, from_date=date(2026, 3, 2), to_date=date(2026, 3, 9), days=3, replace=True)
+
+    assert db.calls == [("rpc", "copy_meal_plan_week"), ("meal_plans", "select")]
+    assert db.rpc_params == [{"p_from": "2026-03-02", "p_to": "2026-03-09", "p_days": 3, "p_replace": True}]
+    assert [(p["date"], p["recipe_id"]) for p in created] == [("2026-03-09", PANCAKES), ("2026-03-10", SALAD), ("2026-03-11", STEW)]
+
+
+def test_copy_week_fallback_shifts_dates_and_keeps_the_target_without_replace():
+    db = FakeDb(rpc_error=NOT_DEPLOYED)
+    week(db, date(2026, 3, 2), [PANCAKES, SALAD])
+    week(db, date(2026, 3, 9), [STEW])
+
+    created = copy(db, from_date=date(2026, 3, 2), to_date=date(2026, 3, 9), days=7)
+
+    assert [(p["date"], p["recipe_id"]) for p in created] == [("2026-03-09", PANCAKES), ("2026-03-10", SALAD)]
+    assert db.calls == [("rpc", "copy_meal_plan_week"), ("meal_plans", "select"), ("meal_plans", "insert"), ("meal_plans", "select")]
+    assert ("2026-03-09", "Lunch", STEW) in db.slots()
+    assert pending_usage() == Counter({PANCAKES: 1, SALAD: 1})
+
+
+def test_copy_week_fallback_with_replace_clears_the_target_week_first():
+    db = FakeDb(rpc_error=NOT_DEPLOYED)
+    week(db, date(2026, 3, 2), [PANCAKES])
+    week(db, date(2026, 3, 9), [STEW, STEW])
+
+    copy(db, from_date=date(2026, 3, 2), to_date=date(2026, 3, 9), days=7, replace=True)
+
+    writes = [c for c in db.calls if c[1] != "select"]
+    assert writes == [("rpc", "copy_meal_plan_week"), ("meal_plans", "delete"), ("meal_plans", "insert")]
+    assert db.slots() == [("2026-03-02", "Lunch", PANCAKES), ("2026-03-09", "Lunch", PANCAKES)]
+
+
+def test_overlapping_ranges_copy_the_source_as_it_was():
+    # Shift 4 days of plans by 2: the target overlaps the source's last 2 days
+    source = [PANCAKES, SALAD, STEW, PANCAKES]
+    for rpc_error in (None, NOT_DEPLOYED):
+        db = FakeDb(rpc_error=rpc_error)
+        week(db, date(2026, 3, 2), source)
+
+        copy(db, from_date=date(2026, 3, 2), to_date=date(2026, 3, 4), days=4, replace=True)
+
+        assert db.slots() == [
+            ("2026-03-02", "Lunch", PANCAKES), ("2026-03-03", "Lunch", SALAD),
+            ("2026-03-04", "Lunch", PANCAKES), ("2026-03-05", "Lunch", SALAD),
+            ("2026-03-06", "Lunch", STEW), ("2026-03-07", "Lunch", PANCAKES),
+        ], rpc_error
+
+
+def test_copy_onto_itself_is_rejected():
+    try:
+        copy(FakeDb(), from_date=date(2026, 3, 2), to_date=date(2026, 3, 2))
+    except HTTPException as e:
+        assert e.status_code == 400
+    else:
+        raise AssertionError("expected HTTPException")
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            setup_function()
+            fn()
+            teardown_function()
+            print(f"{name}: ok")
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+
+_pool = ThreadPoolExecutor(max_workers=2)
+
+
+def work(upstream, seconds=0.0):
+    with metrics.span(upstream):
+        time.sleep(seconds)
+
+
+router = APIRouter()
+
+
+@router.get("/things/{thing_id}")
+async def read_thing(thing_id: str):
+    work("test_db", 0.01)
+    work("test_db")
+    return {"id": thing_id}
+
+
+@router.get("/threads")
+async def read_in_threads():
+    # Only the bound call keeps the request's timings
+    _pool.submit(metrics.bind(work, "test_bound")).result()
+    _pool.submit(work, "test_unbound").result()
+    return {}
+
+
+@router.get("/fails")
+async def read_failing():
+    try:
+        with metrics.span("test_broken"):
+            raise RuntimeError("down")
+    except RuntimeError:
+        return {}
+
+
+app = FastAPI()
+app.add_middleware(metrics.TimingMiddleware)
+app.include_router(router, prefix="/v1")
+metrics.prefix_routes(router, "/v1")
+client = TestClient(app)
+
+_server_timing = metrics.SERVER_TIMING
+
+
+def teardown_function():
+    metrics.SERVER_TIMING = _server_timing
+
+
+def server_timing(response):
+    """Server-Timing entries as {name: (desc, dur_ms)}."""
+    entries = {}
+    for entry in response.headers["server-timing"].split(", "):
+        name, *params = entry.split(";")
+        params = dict(p.split("=", 1) for p in params)
+        entries[name] = (params.get("desc", "").strip('"'), float(params["dur"]))
+    return entries
+
+
+def sample(text, name, **labels):
+    """The value of one series in Prometheus text output, or None."""
+    for line in text.splitlines():
+        match = re.match(r"^(\w+)\{(.*)\} (\S+)$", line)
+        if match and match.group(1) == name and dict(re.findall(r'(\w+)="([^"]*)"', match.group(2))) == labels:
+            return float(match.group(3))
+    return None
+
+
+def test_server_timing_reports_the_request_and_each_upstream():
+    entries = server_timing(client.get("/v1/things/42"))
+
+    assert list(entries) == ["app", "test_db"]
+    assert entries["test_db"][0] == "2 calls"
+    assert entries["test_db"][1] >= 10.0
+    assert entries["app"][1] >= entries["test_db"][1]
+
+
+def test_spans_in_worker_threads_count_only_when_bound():
+    entries = server_timing(client.get("/v1/threads"))
+
+    assert entries["test_bound"][0] == "1 call"
+    assert "test_unbound" not in entries
+    # Both still reach the histogram
+    text = metrics.render({})
+    assert sample(text, "upstream_request_duration_seconds_count", upstream="test_bound") >= 1
+    assert sample(text, "upstream_request_duration_seconds_count", upstream="test_unbound") >= 1
+
+
+def test_server_timing_can_be_turned_off():
+    metrics.SERVER_TIMING = False
+    assert "server-timing" not in client.get("/v1/things/1").headers
+
+
+def test_prometheus_output_labels_routes_by_template():
+    before = metrics.render({})
+    for thing in ("a", "b", "c"):
+        client.get(f"/v1/things/{thing}")
+    client.get("/v1/fails")
+    client.get("/nowhere")
+    text = metrics.render({"parse": {"hits": 3, "misses": 1}, "empty": {}})
+
+    series = dict(method="GET", route="/v1/things/{thing_id}", status="200")
+    count = sample(text, "http_request_duration_seconds_count", **series)
+    assert count - (sample(before, "http_request_duration_seconds_count", **series) or 0) == 3
+    assert sample(text, "http_request_duration_seconds_bucket", le="+Inf", **series) == count
+    assert sample(text, "http_request_duration_seconds_count", method="GET", route="unmatched", status="404") >= 1
+    assert sample(text, "upstream_calls_per_request_bucket", route="/v1/things/{thing_id}", le="2") >= 3
+    assert sample(text, "upstream_errors_total", upstream="test_broken") >= 1
+    assert sample(text, "cache_hit_ratio", cache="parse") == 0.75
+    assert sample(text, "cache_hit_ratio", cache="empty") == 0.0
+    assert "# TYPE http_request_duration_seconds histogram" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_seconds", "Test.", ("kind",), (0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, 'a "quoted" kind')
+
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{kind="a \\"quoted\\" kind",le="0.1"} 1',
+        'test_seconds_bucket{kind="a \\"quoted\\" kind",le="1"} 2',
+        'test_seconds_bucket{kind="a \\"quoted\\" kind",le="+Inf"} 3',
+        'test_seconds_count{kind="a \\"quoted\\" kind"} 3',
+        'test_seconds_sum{kind="a \\"quoted\\" kind"} 5.550000',
+    ]
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    from main import app as main_app
+    main_client = TestClient(main_app)
+
+    main_client.get("/api/cache/stats")
+    response = main_client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert sample(response.text, "http_request_duration_seconds_count",
+                  method="GET", route="/api/cache/stats", status="200") >= 1
+    assert sample(response.text, "cache_hits_total", cache="listings") is not None
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            teardown_function()
+            print(f"{name}: ok")
@@ -0,0 +1,91 @@
+from datetime import date
+
+from nutrition import summarize
+
+START, END = date(2026, 3, 2), date(2026, 3, 8)
+
+
+def link(amount_g, calories_per_g, protein_per_g):
+    return {"amount_g": amount_g, "ingredients": {"calories_per_g": calories_per_g, "protein_per_g": protein_per_g}}
+
+
+# 200g oats (3.9 kcal, 0.17g protein per g) + 100g milk (0.6, 0.034)
+PORRIDGE = {"calories_per_serving": 999, "protein_g": 99, "recipe_ingredients": [link(200, 3.9, 0.17), link(100, 0.6, 0.034)]}
+# No ingredient links: stored per-serving values count
+TAKEAWAY = {"calories_per_serving": 850, "protein_g": 40, "recipe_ingredients": []}
+# A link whose ingredient row is gone counts as no ingredients
+ORPHANED = {"calories_per_serving": 300, "protein_g": 10, "recipe_ingredients": [{"amount_g": 50, "ingredients": None}]}
+
+
+def plan(day, meal_type, recipe):
+    return {"date": day, "meal_type": meal_type, "recipe": recipe}
+
+
+def test_ingredient_sums_win_over_stored_per_serving_values():
+    summary = summarize([plan("2026-03-02", "Breakfast", PORRIDGE)], START, END)
+
+    assert summary["totals"] == {"calories": 840.0, "protein_g": 37.4, "meals": 1}
+    assert summary["meal_types"]["Breakfast"] == {"calories": 840.0, "protein_g": 37.4, "count": 1}
+
+
+def test_recipes_without_ingredients_fall_back_to_calories_per_serving():
+    rows = [plan("2026-03-03", "Dinner", TAKEAWAY), plan("2026-03-03", "Snack", ORPHANED)]
+    summary = summarize(rows, START, END)
+
+    assert summary["days"]["date"] == ["2026-03-03"]
+    assert summary["days"]["calories"] == [1150.0]
+    assert summary["days"]["protein_g"] == [50.0]
+    assert summary["days"]["meals"]["Dinner"] == {"calories": [850.0], "protein_g": [40.0], "count": [1]}
+
+
+def test_days_meal_types_and_averages():
+    rows = [
+        plan("2026-03-02", "Breakfast", PORRIDGE),
+        plan("2026-03-02", "Dinner", TAKEAWAY),
+        plan("2026-03-04", "Dinner", TAKEAWAY),
+        plan("2026-03-04T00:00:00+00:00", "Dinner", TAKEAWAY),
+    ]
+    summary = summarize(rows, START, END)
+
+    assert summary["days"]["date"] == ["2026-03-02", "2026-03-04"]
+    assert summary["days"]["calories"] == [1690.0, 1700.0]
+    assert summary["days"]["meals"]["Dinner"]["count"] == [1, 2]
+    assert summary["meal_types"]["Dinner"] == {"calories": 2550.0, "protein_g": 120.0, "count": 3}
+    assert summary["meal_types"]["Lunch"] == {"calories": 0.0, "protein_g": 0.0, "count": 0}
+    assert summary["averages"]["days"] == 7
+    assert summary["averages"]["planned_days"] == 2
+    assert summary["averages"]["per_day"] == {"calories": round(3390 / 7, 1), "protein_g": round(157.4 / 7, 1)}
+    assert summary["averages"]["per_planned_day"] == {"calories": 1695.0, "protein_g": 78.7}
+
+
+def test_rows_outside_the_range_or_without_a_recipe_are_ignored():
+    rows = [
+        plan("2026-03-01", "Lunch", TAKEAWAY),
+        plan("2026-03-09", "Lunch", TAKEAWAY),
+        plan("2026-03-05", "Lunch", None),
+        plan("2026-03-05", "Brunch", TAKEAWAY),
+    ]
+    summary = summarize(rows, START, END)
+
+    assert summary["totals"] == {"calories": 0.0, "protein_g": 0.0, "meals": 0}
+    assert summary["days"]["date"] == []
+
+
+def test_empty_range():
+    summary = summarize([], START, START)
+
+    assert summary["start_date"] == summary["end_date"] == "2026-03-02"
+    assert summary["days"] == {
+        "date": [], "calories": [], "protein_g": [],
+        "meals": {t: {"calories": [], "protein_g": [], "count": []} for t in ["Breakfast", "Lunch", "Dinner", "Snack"]},
+    }
+    assert summary["totals"] == {"calories": 0.0, "protein_g": 0.0, "meals": 0}
+    assert summary["averages"]["per_day"] == {"calories": 0.0, "protein_g": 0.0}
+    assert summary["averages"]["per_planned_day"] == {"calories": 0.0, "protein_g": 0.0}
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"{name}: ok")
@@ -0,0 +1,148 @@
+import base64
+import re
+
+import orjson
+from fastapi import HTTPException
+
+import pagination
+
+RECIPE_ORDER = [("usage_count", True), ("id", False)]
+
+
+class FakeQuery:
+    """Records the or=() filter pagination.after builds, and applies it to rows."""
+
+    def __init__(self):
+        self.filter = None
+
+    def or_(self, filters):
+        self.filter = filters
+        return self
+
+    def matches(self, row):
+        return any(all(_term(row, t) for t in _terms(branch)) for branch in _split(self.filter))
+
+
+def _split(text):
+    # Top-level commas only; quoted literals and and(...) groups stay whole
+    parts, depth, quoted, current = [], 0, False, ""
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quoted and ch == "\\":
+            current += text[i:i + 2]
+            i += 2
+            continue
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(current)
+            current = ""
+            i += 1
+            continue
+        current += ch
+        i += 1
+    return parts + [current]
+
+
+def _terms(branch):
+    return _split(branch[4:-1]) if branch.startswith("and(") else [branch]
+
+
+def _term(row, term):
+    column, op, literal = re.match(r'(\w+)\.(eq|gt|lt)\.(".*")$', term).groups()
+    value = re.sub(r'\\(.)', r'\1', literal[1:-1])
+    actual = str(row[column]) if not isinstance(row[column], int) else row[column]
+    expected = int(value) if isinstance(row[column], int) else value
+    return {"eq": actual == expected, "gt": actual > expected, "lt": actual < expected}[op]
+
+
+def sort_rows(rows):
+    return sorted(rows, key=lambda r: (-r["usage_count"], r["id"]))
+
+
+def page_through(rows, limit):
+    """Follows cursors like the list routes do, over rows already in sort order."""
+    pages, cursor = [], None
+    while True:
+        remaining = rows
+        if cursor:
+            query = pagination.after(FakeQuery(), RECIPE_ORDER, cursor)
+            remaining = [r for r in rows if query.matches(r)]
+        page, cursor = pagination.split_page(remaining[:limit + 1], limit, RECIPE_ORDER)
+        pages.append([r["id"] for r in page])
+        if not cursor:
+            return pages
+
+
+def test_no_cursor_leaves_the_query_alone():
+    query = FakeQuery()
+    assert pagination.after(query, RECIPE_ORDER, None) is query
+    assert query.filter is None
+
+
+def test_filter_starts_strictly_after_the_cursor():
+    cursor = pagination.encode_cursor([3, "b"])
+    query = pagination.after(FakeQuery(), RECIPE_ORDER, cursor)
+    assert query.filter == 'usage_count.lt."3",and(usage_count.eq."3",id.gt."b")'
+
+
+def test_tied_sort_keys_are_neither_skipped_nor_repeated():
+    # Long runs of equal usage_count, split across page boundaries
+    rows = sort_rows([{"id": f"r{i:02d}", "usage_count": count} for i, count in enumerate([5] * 7 + [2] * 6 + [0] * 4)])
+
+    pages = page_through(rows, 3)
+
+    assert [len(p) for p in pages] == [3, 3, 3, 3, 3, 2]
+    assert [i for p in pages for i in p] == [r["id"] for r in rows]
+
+
+def test_split_page_only_returns_a_cursor_when_there_is_more():
+    rows = [{"id": "a", "usage_count": 2}, {"id": "b", "usage_count": 1}]
+
+    assert pagination.split_page(rows, 2, RECIPE_ORDER) == (rows, None)
+    page, cursor = pagination.split_page(rows, 1, RECIPE_ORDER)
+    assert page == rows[:1]
+    assert pagination.decode_cursor(cursor, RECIPE_ORDER) == [2, "a"]
+
+
+def test_cursor_values_are_quoted_literals():
+    # A crafted cursor cannot add filter terms of its own
+    cursor = pagination.encode_cursor([1, 'x",user_id.neq."0'])
+    query = pagination.after(FakeQuery(), RECIPE_ORDER, cursor)
+
+    assert query.filter == 'usage_count.lt."1",and(usage_count.eq."1",id.gt."x\\",user_id.neq.\\"0")'
+    assert len(_split(query.filter)) == 2
+    assert query.matches({"usage_count": 1, "id": 'y'})
+
+
+def test_malformed_or_tampered_cursors_are_rejected():
+    def b64(raw):
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    for cursor in [
+        "not base64!",
+        b64(b"not json"),
+        b64(orjson.dumps({"usage_count": 3, "id": "a"})),
+        b64(orjson.dumps([3])),
+        b64(orjson.dumps([3, "a", "extra"])),
+        b64(orjson.dumps([None, "a"])),
+    ]:
+        try:
+            pagination.after(FakeQuery(), RECIPE_ORDER, cursor)
+        except HTTPException as e:
+            assert e.status_code == 400
+            assert e.detail == "Invalid cursor"
+        else:
+            raise AssertionError(f"accepted {cursor!r}")
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"{name}: ok")
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+from fastapi import HTTPException
+
+import resilience
+from routers import recipes
+from routers.recipes import RecipeParseBatchRequest
+
+
+class FakeParser:
+    """Stands in for parse_recipe_from_text: "slow" texts wait for `release`, "down" ones are rejected."""
+
+    def __init__(self, delay_s=0.0):
+        self.delay_s = delay_s
+        self.release = threading.Event()
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            if text.startswith("slow"):
+                self.release.wait(5.0)
+            elif self.delay_s:
+                time.sleep(self.delay_s)
+            if text.startswith("down"):
+                raise resilience.CircuitOpen("gemini is unavailable", retry_after_s=12)
+            if text.startswith("bad"):
+                raise ValueError("Could not parse recipe")
+            return {"name": text, "calories_per_serving": 100}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+_parser, _concurrency, _timeout = recipes.parse_recipe_from_text, recipes.PARSE_CONCURRENCY, recipes.PARSE_ITEM_TIMEOUT_S
+
+
+def use(parser):
+    recipes.parse_recipe_from_text = parser
+    return parser
+
+
+def teardown_function():
+    recipes.parse_recipe_from_text = _parser
+    recipes.PARSE_CONCURRENCY, recipes.PARSE_ITEM_TIMEOUT_S = _concurrency, _timeout
+
+
+def parse(*texts):
+    async def collect():
+        response = await recipes.parse_recipes_batch(RecipeParseBatchRequest(texts=list(texts)), {"id": "u1"})
+        return [json.loads(line) async for line in response.body_iterator]
+    return asyncio.run(collect())
+
+
+def by_index(lines):
+    return {line["index"]: line for line in lines if "index" in line}
+
+
+def test_every_text_gets_a_line_and_the_summary_comes_last():
+    use(FakeParser())
+
+    lines = parse("pancakes", "", "bad input", "stew")
+
+    assert lines[-1] == {"done": True, "parsed": 2, "failed": 2}
+    items = by_index(lines[:-1])
+    assert sorted(items) == [0, 1, 2, 3]
+    assert items[0]["recipe"]["name"] == "pancakes"
+    assert items[1] == {"index": 1, "error": "Empty text"}
+    assert items[2] == {"index": 2, "error": "Could not parse recipe"}
+    assert items[3]["recipe"]["name"] == "stew"
+
+
+def test_a_slow_item_times_out_without_holding_up_the_rest():
+    parser = use(FakeParser())
+    recipes.PARSE_ITEM_TIMEOUT_S = 0.1
+    try:
+        started = time.monotonic()
+        lines = parse("slow soup", "salad")
+        elapsed = time.monotonic() - started
+    finally:
+        parser.release.set()
+
+    # Completion order: the quick item streams first
+    assert lines[0]["index"] == 1 and "recipe" in lines[0]
+    assert lines[1] == {"index": 0, "error": "Timed out after 0.1s"}
+    assert lines[2] == {"done": True, "parsed": 1, "failed": 1}
+    assert elapsed < 1.0
+
+
+def test_unavailable_is_reported_per_item():
+    use(FakeParser())
+
+    lines = parse("down once", "curry")
+
+    items = by_index(lines)
+    assert items[0] == {"index": 0, "error": "gemini is unavailable"}
+    assert items[1]["recipe"]["name"] == "curry"
+    assert lines[-1] == {"done": True, "parsed": 1, "failed": 1}
+
+
+def test_at_most_parse_concurrency_calls_run_at_once():
+    parser = use(FakeParser(delay_s=0.05))
+    recipes.PARSE_CONCURRENCY = 2
+
+    lines = parse(*[f"recipe {i}" for i in range(6)])
+
+    assert parser.peak == 2
+    assert lines[-1] == {"done": True, "parsed": 6, "failed": 0}
+
+
+def test_oversized_batches_are_rejected():
+    try:
+        parse(*["soup"] * (recipes.MAX_PARSE_BATCH + 1))
+    except HTTPException as e:
+        assert e.status_code == 400
+    else:
+        raise AssertionError("expected HTTPException")
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            teardown_function()
+            print(f"{name}: ok")
@@ -0,0 +1,109 @@
+from collections import Counter
+from datetime import date, timedelta
+
+import planner
+
+START = date(2026, 1, 5)
+
+
+def recipe(recipe_id, category, calories, protein=0.0):
+    return {"id": recipe_id, "category": category, "calories_per_serving": calories, "protein_g": protein}
+
+
+LIBRARY = [
+    recipe("oats", "Breakfast", 450, 20),
+    recipe("eggs", "Breakfast", 500, 30),
+    recipe("yogurt", "Breakfast", 400, 25),
+    recipe("wrap", "Lunch", 700, 40),
+    recipe("salad", "Lunch", 650, 35),
+    recipe("soup", "Lunch", 600, 30),
+    recipe("curry", "Dinner", 850, 45),
+    recipe("salmon", "Dinner", 800, 50),
+    recipe("chili", "Dinner", 900, 55),
+    recipe("apple", "Snack", 100, 1),
+]
+
+
+def by_day(items):
+    days = {}
+    for item in items:
+        days.setdefault(item["date"], []).append(item)
+    return days
+
+
+def test_fills_every_slot_with_a_recipe_of_the_right_category():
+    items = planner.generate(LIBRARY, START, START + timedelta(days=6), 2000, 120, seed=1)
+    categories = {r["id"]: r["category"] for r in LIBRARY}
+
+    assert len(items) == 7 * 3
+    assert Counter((i["date"], i["meal_type"]) for i in items).most_common(1)[0][1] == 1
+    for item in items:
+        assert categories[item["recipe_id"]] == item["meal_type"]
+    for meals in by_day(items).values():
+        assert len({m["recipe_id"] for m in meals}) == len(meals)
+
+
+def test_days_land_near_the_calorie_target():
+    calories = {r["id"]: r["calories_per_serving"] for r in LIBRARY}
+    items = planner.generate(LIBRARY, START, START + timedelta(days=6), 2000, seed=1)
+
+    for meals in by_day(items).values():
+        total = sum(calories[m["recipe_id"]] for m in meals)
+        assert abs(total - 2000) / 2000 < 0.1
+
+
+def test_recipes_are_not_repeated_within_the_variety_window():
+    items = planner.generate(LIBRARY, START, START + timedelta(days=8), 2000, min_gap_days=3, seed=1)
+
+    last_seen = {}
+    for item in sorted(items, key=lambda i: i["date"]):
+        day = date.fromisoformat(item["date"])
+        if item["recipe_id"] in last_seen:
+            assert (day - last_seen[item["recipe_id"]]).days >= 3
+        last_seen[item["recipe_id"]] = day
+
+
+def test_small_libraries_repeat_the_best_recipes_instead_of_the_worst():
+    # Three dinners cannot cover a 5-day window; the fallback should go back
+    # to the recipes that fit, not keep the 2000 kcal one day after day
+    library = [recipe("bad", "Dinner", 2000), recipe("good", "Dinner", 600), recipe("ok", "Dinner", 650)]
+    items = planner.generate(library, START, START + timedelta(days=9), 600,
+                             meal_types=["Dinner"], min_gap_days=5, seed=1)
+    chosen = [i["recipe_id"] for i in sorted(items, key=lambda i: i["date"])]
+
+    assert len(chosen) == 10
+    assert all(not (a == b == "bad") for a, b in zip(chosen, chosen[1:]))
+    assert chosen.count("bad") <= 2
+
+
+def test_existing_meals_are_kept_and_count_towards_the_day():
+    existing = [{"date": START.isoformat(), "meal_type": "Dinner", "recipe_id": "chili"}]
+    items = planner.generate(LIBRARY, START, START, 2000, existing=existing, seed=1)
+
+    assert {i["meal_type"] for i in items} == {"Breakfast", "Lunch"}
+    assert "chili" not in {i["recipe_id"] for i in items}
+
+
+def test_slots_without_a_fitting_recipe_stay_empty():
+    items = planner.generate([recipe("curry", "Dinner", 800)], START, START, 2000,
+                             meal_types=["Breakfast", "Dinner"], seed=1)
+
+    assert [(i["meal_type"], i["recipe_id"]) for i in items] == [("Dinner", "curry")]
+
+
+def test_nothing_to_plan():
+    assert planner.generate([], START, START, 2000) == []
+    assert planner.generate(LIBRARY, START, START - timedelta(days=1), 2000) == []
+    assert planner.generate([recipe("x", "Unknown", 500)], START, START, 2000) == []
+
+
+def test_same_seed_gives_the_same_plan():
+    args = (LIBRARY, START, START + timedelta(days=6), 2000, 120)
+    assert planner.generate(*args, seed=7) == planner.generate(*args, seed=7)
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"{name}: ok")
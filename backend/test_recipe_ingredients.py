@@ -0,0 +1,232 @@
+import asyncio
+import json
+import os
+import re
+import uuid
+from types import SimpleNamespace
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+from models import RecipeCreate
+from routers import recipes
+
+USER = SimpleNamespace(id="11111111-1111-1111-1111-111111111111")
+AUTH = "Bearer test"
+
+
+class FakeQuery:
+    """Just enough of postgrest's request builder to run the recipe routes."""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.headers = {}
+        self.op = "select"
+        self.payload = None
+        self.filters = []
+
+    # Like postgrest, each operation starts a fresh builder from the table
+    def _start(self, op, payload=None):
+        query = FakeQuery(self.db, self.table)
+        query.op, query.payload = op, payload
+        return query
+
+    def select(self, *args, **kwargs):
+        return self._start("select")
+
+    def insert(self, payload, **kwargs):
+        return self._start("insert", payload)
+
+    def upsert(self, payload, **kwargs):
+        return self._start("upsert", payload)
+
+    def update(self, payload):
+        return self._start("update", payload)
+
+    def delete(self):
+        return self._start("delete")
+
+    def eq(self, col, value):
+        self.filters.append(lambda r: str(r.get(col)) == str(value))
+        return self
+
+    def in_(self, col, values):
+        values = {str(v) for v in values}
+        self.filters.append(lambda r: str(r.get(col)) in values)
+        return self
+
+    def or_(self, expr):
+        clauses = []
+        for col, raw in re.findall(r'(\w+)\.in\.\(((?:"(?:[^"\\]|\\.)*",?)*)\)', expr):
+            values = {v.replace('\\"', '"') for v in re.findall(r'"((?:[^"\\]|\\.)*)"', raw)}
+            clauses.append((col, values))
+        self.filters.append(lambda r: any(str(r.get(c)) in vs for c, vs in clauses))
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def _match(self, row):
+        return all(f(row) for f in self.filters)
+
+    async def execute(self):
+        self.db.calls.append((self.table, self.op))
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.op in ("insert", "upsert"):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            created = [{"id": str(uuid.uuid4()), "usage_count": 0, **p} for p in payload]
+            rows.extend(created)
+            return SimpleNamespace(data=created)
+        matched = [r for r in rows if self._match(r)]
+        if self.table == "recipe_ingredients" and self.op == "select":
+            ingredients = {r["id"]: r for r in self.db.tables.get("ingredients", [])}
+            return SimpleNamespace(data=[{**r, "ingredients": ingredients.get(r["ingredient_id"])} for r in matched])
+        if self.op == "update":
+            for r in matched:
+                r.update(self.payload)
+        elif self.op == "delete":
+            self.db.tables[self.table] = [r for r in rows if not self._match(r)]
+        return SimpleNamespace(data=[dict(r) for r in matched])
+
+
+class FakeRpc:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+        self.request = SimpleNamespace(headers={})
+
+    async def execute(self):
+        self.db.calls.append(("rpc", self.name))
+        if not self.db.has_rpc:
+            raise Exception("{'code': 'PGRST202', 'message': 'Could not find the function'}")
+        p = self.params
+        links = self.db.tables["recipe_ingredients"]
+        links[:] = [l for l in links if not (l["recipe_id"] == p["p_recipe_id"] and l["ingredient_id"] in p["p_deletes"])]
+        for upd in p["p_updates"]:
+            for l in links:
+                if l["recipe_id"] == p["p_recipe_id"] and l["ingredient_id"] == upd["ingredient_id"]:
+                    l["amount_g"] = upd["amount_g"]
+        links.extend({"recipe_id": p["p_recipe_id"], **row} for row in p["p_inserts"])
+        return SimpleNamespace(data=None)
+
+
+class FakeSupabase:
+    def __init__(self, has_rpc=True):
+        self.tables = {}
+        self.calls = []
+        self.has_rpc = has_rpc
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+
+def make_recipe(n_ingredients, offset=0):
+    return RecipeCreate(
+        name="Bowl",
+        category="Lunch",
+        ingredients=[
+            {"name": f"ingredient {i}", "api_id": str(1000 + i), "calories_per_g": 1.0, "protein_per_g": 0.1, "amount_g": 50}
+            for i in range(offset, offset + n_ingredients)
+        ],
+    )
+
+
+def use_fake(**kwargs):
+    return FakeSupabase(**kwargs)
+
+
+def create(recipe, fake):
+    response = asyncio.run(recipes.create_recipe(recipe, USER, AUTH, fake))
+    return json.loads(response.body)
+
+
+def update(recipe_id, recipe, fake):
+    response = asyncio.run(recipes.update_recipe(recipe_id, recipe, USER, AUTH, fake))
+    return json.loads(response.body)
+
+
+def test_create_recipe_round_trips_do_not_grow_with_ingredients():
+    counts = []
+    for n in (1, 5, 20):
+        fake = use_fake()
+        create(make_recipe(n), fake)
+        counts.append(len(fake.calls))
+        assert len(fake.tables["recipe_ingredients"]) == n
+    # recipe insert, ingredient lookup, ingredient upsert, link insert
+    assert counts == [4, 4, 4]
+
+
+def test_create_recipe_reuses_existing_ingredients():
+    fake = use_fake()
+    create(make_recipe(10), fake)
+    fake.calls.clear()
+    create(make_recipe(10), fake)
+    assert ("ingredients", "upsert") not in fake.calls
+    assert len(fake.tables["ingredients"]) == 10
+
+
+def test_names_with_commas_and_quotes_resolve():
+    fake = use_fake()
+    recipe = RecipeCreate(name="Odd", category="Other", ingredients=[
+        {"name": 'cheese, "aged"', "calories_per_g": 4.0, "protein_per_g": 0.25, "amount_g": 30},
+    ])
+    create(recipe, fake)
+    create(recipe, fake)
+    assert len(fake.tables["ingredients"]) == 1
+
+
+def create_then_update(recipe, updated, **kwargs):
+    fake = use_fake(**kwargs)
+    created = create(recipe, fake)
+    fake.calls.clear()
+    update(created["id"], updated, fake)
+    links = sorted((l["ingredient_id"], l["amount_g"]) for l in fake.tables["recipe_ingredients"])
+    return fake, links
+
+
+def ingredient_writes(fake):
+    return [c for c in fake.calls if c[0] in ("ingredients", "recipe_ingredients", "rpc") and c[1] != "select"]
+
+
+def test_metadata_only_update_writes_no_ingredients():
+    recipe = make_recipe(5)
+    renamed = recipe.model_copy(update={"name": "Renamed bowl"})
+    fake, _ = create_then_update(recipe, renamed)
+    assert ingredient_writes(fake) == []
+    assert fake.tables["recipes"][0]["name"] == "Renamed bowl"
+
+
+def test_amount_change_is_one_atomic_rpc():
+    recipe = make_recipe(5)
+    changed = make_recipe(5)
+    changed.ingredients[2].amount_g = 125
+    fake, links = create_then_update(recipe, changed)
+    assert ingredient_writes(fake) == [("rpc", "apply_recipe_ingredient_diff")]
+    assert sorted(a for _, a in links) == [50, 50, 50, 50, 125]
+
+
+def test_added_and_removed_ingredients():
+    fake, links = create_then_update(make_recipe(5), make_recipe(5, offset=3))
+    assert ingredient_writes(fake) == [("ingredients", "upsert"), ("rpc", "apply_recipe_ingredient_diff")]
+    names = {i["id"]: i["name"] for i in fake.tables["ingredients"]}
+    assert sorted(names[i] for i, _ in links) == [f"ingredient {i}" for i in range(3, 8)]
+
+
+def test_falls_back_without_rpc():
+    changed = make_recipe(4, offset=1)
+    changed.ingredients[0].amount_g = 80
+    fake, links = create_then_update(make_recipe(4), changed, has_rpc=False)
+    names = {i["id"]: i["name"] for i in fake.tables["ingredients"]}
+    assert sorted((names[i], a) for i, a in links) == [
+        ("ingredient 1", 80), ("ingredient 2", 50), ("ingredient 3", 50), ("ingredient 4", 50),
+    ]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"{name}: ok")
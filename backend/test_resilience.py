@@ -0,0 +1,196 @@
+import resilience
+from resilience import CLOSED, HALF_OPEN, OPEN, BulkheadFull, CircuitOpen
+
+
+class FakeClock:
+    """Stands in for the `time` module."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+_time = resilience.time
+
+
+def setup_function():
+    global clock
+    clock = FakeClock()
+    resilience.time = clock
+
+
+def teardown_function():
+    resilience.time = _time
+
+
+class Outage(Exception):
+    pass
+
+
+class NotFound(Exception):
+    pass
+
+
+def dependency(**settings):
+    settings = {"max_concurrent": 2, "queue_timeout_s": 0.0, "failure_threshold": 3, "reset_s": 30.0, **settings}
+    return resilience.Dependency("upstream", ignore=(NotFound,), **settings)
+
+
+def call(dep, error=None):
+    """One guarded call; returns what happened to it."""
+    try:
+        with dep.guard():
+            if error is not None:
+                raise error
+    except Exception as e:
+        return type(e).__name__
+    return "ok"
+
+
+def test_consecutive_failures_open_the_circuit():
+    dep = dependency()
+
+    assert [call(dep, Outage()) for _ in range(2)] == ["Outage", "Outage"]
+    assert dep.breaker.state == CLOSED
+    assert call(dep, Outage()) == "Outage"
+    assert dep.breaker.state == OPEN
+
+    assert call(dep) == "CircuitOpen"
+    stats = dep.stats()
+    assert stats["calls"] == 3 and stats["failures"] == 3 and stats["rejected_open"] == 1
+    assert stats["times_opened"] == 1
+
+
+def test_a_success_resets_the_failure_count():
+    dep = dependency()
+    for outcome in (Outage(), Outage(), None, Outage(), Outage()):
+        call(dep, outcome)
+    assert dep.breaker.state == CLOSED
+    assert dep.breaker.failures == 2
+
+
+def test_ignored_errors_pass_through_without_counting():
+    dep = dependency()
+    for _ in range(5):
+        assert call(dep, NotFound()) == "NotFound"
+    assert dep.breaker.state == CLOSED
+    assert dep.breaker.failures == 0
+    assert dep.stats()["failures"] == 0
+
+
+def test_retry_after_counts_down_while_open():
+    dep = dependency()
+    for _ in range(3):
+        call(dep, Outage())
+
+    clock.now += 20
+    try:
+        with dep.guard():
+            pass
+    except CircuitOpen as e:
+        assert e.retry_after_s == 10
+    else:
+        raise AssertionError("expected CircuitOpen")
+
+
+def test_half_open_lets_one_probe_through_and_success_closes():
+    dep = dependency()
+    for _ in range(3):
+        call(dep, Outage())
+    clock.now += 30
+
+    with dep.guard():
+        assert dep.breaker.state == HALF_OPEN
+        # Everyone else is still turned away while the probe is out
+        assert call(dep) == "CircuitOpen"
+    assert dep.breaker.state == CLOSED
+    assert call(dep) == "ok"
+
+
+def test_a_failed_probe_reopens_for_another_reset_period():
+    dep = dependency()
+    for _ in range(3):
+        call(dep, Outage())
+    clock.now += 30
+
+    assert call(dep, Outage()) == "Outage"
+    assert dep.breaker.state == OPEN
+    assert dep.breaker.opened_at == clock.now
+    clock.now += 29
+    assert call(dep) == "CircuitOpen"
+    clock.now += 1
+    assert call(dep) == "ok"
+    # One outage, reopened once
+    assert dep.stats()["times_opened"] == 2
+
+
+def test_an_ignored_error_on_the_probe_frees_it_for_the_next_caller():
+    dep = dependency()
+    for _ in range(3):
+        call(dep, Outage())
+    clock.now += 30
+
+    assert call(dep, NotFound()) == "NotFound"
+    assert dep.breaker.state == HALF_OPEN
+    assert call(dep) == "ok"
+    assert dep.breaker.state == CLOSED
+
+
+def test_a_full_bulkhead_rejects_and_releases_the_probe():
+    dep = dependency(max_concurrent=1)
+    for _ in range(3):
+        call(dep, Outage())
+    clock.now += 30
+
+    # The only slot is taken: the probe is turned away before it goes out
+    assert dep.bulkhead.acquire()
+    try:
+        with dep.guard():
+            pass
+    except BulkheadFull:
+        pass
+    else:
+        raise AssertionError("expected BulkheadFull")
+    assert dep.breaker.state == HALF_OPEN
+    dep.bulkhead.release()
+
+    # So the next caller may probe, instead of the circuit staying stuck
+    assert call(dep) == "ok"
+    assert dep.breaker.state == CLOSED
+    assert dep.stats()["rejected_full"] == 1
+
+
+def test_the_bulkhead_caps_calls_in_flight():
+    dep = dependency()
+    with dep.guard():
+        with dep.guard():
+            assert call(dep) == "BulkheadFull"
+            assert dep.bulkhead.in_flight == 2
+    assert dep.bulkhead.in_flight == 0
+    assert dep.stats()["peak_in_flight"] == 2
+    assert call(dep) == "ok"
+
+
+def test_reset_closes_the_circuit_and_clears_counters():
+    dep = resilience.register("test_upstream", failure_threshold=1)
+    try:
+        call(dep, Outage())
+        assert resilience.stats()["test_upstream"]["state"] == OPEN
+
+        resilience.reset("test_upstream")
+
+        assert resilience.get("test_upstream").breaker.state == CLOSED
+        assert resilience.stats()["test_upstream"]["failures"] == 0
+    finally:
+        del resilience._dependencies["test_upstream"]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            setup_function()
+            fn()
+            teardown_function()
+            print(f"{name}: ok")
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import re
+from datetime import date
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+from postgrest.exceptions import APIError
+
+import shopping_list
+
+USER = "11111111-1111-1111-1111-111111111111"
+AUTH = "Bearer test"
+FLOUR = {"id": "i-flour", "name": "flour", "api_id": "20081", "image_url": None}
+EGG = {"id": "i-egg", "name": "egg", "api_id": "1123", "image_url": "egg.jpg"}
+
+PLANS = [
+    # Pancakes on three days, an omelette once, and one plan outside the range
+    {"id": "p1", "date": "2026-03-02", "recipe_id": "pancakes"},
+    {"id": "p2", "date": "2026-03-03", "recipe_id": "pancakes"},
+    {"id": "p3", "date": "2026-03-03", "recipe_id": "omelette"},
+    {"id": "p4", "date": "2026-03-05", "recipe_id": "pancakes"},
+    {"id": "p5", "date": "2026-03-20", "recipe_id": "omelette"},
+]
+LINKS = [
+    # Pancakes list flour twice (batter and dusting)
+    {"recipe_id": "pancakes", "amount_g": 100, "ingredients": FLOUR},
+    {"recipe_id": "pancakes", "amount_g": 50, "ingredients": FLOUR},
+    {"recipe_id": "pancakes", "amount_g": 60, "ingredients": EGG},
+    {"recipe_id": "omelette", "amount_g": 120, "ingredients": EGG},
+    # Link whose ingredient row is gone
+    {"recipe_id": "omelette", "amount_g": 10, "ingredients": None},
+]
+
+
+class FakeQuery:
+    """The table reads _aggregate builds, answered from PLANS and LINKS."""
+
+    def __init__(self, db, table):
+        self.db, self.table = db, table
+        self.headers = {}
+        self.filters = []
+        self.after = None
+        self.limit_n = None
+
+    def select(self, fields):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column, value) == value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda r: r[column] >= str(value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda r: r[column] <= str(value))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda r: r[column] in set(values))
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def or_(self, filters):
+        # pagination.after over (date, id): date.gt."d",and(date.eq."d",id.gt."i")
+        self.after = tuple(re.findall(r'gt\."([^"]*)"', filters))
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def rows(self):
+        self.db.reads.append(self.table)
+        rows = PLANS if self.table == "meal_plans" else LINKS
+        rows = [r for r in rows if all(f(r) for f in self.filters)]
+        if self.table == "meal_plans":
+            rows = sorted(rows, key=lambda r: (r["date"], r["id"]))
+            if self.after:
+                rows = [r for r in rows if (r["date"], r["id"]) > self.after]
+        return rows[:self.limit_n] if self.limit_n else rows
+
+
+class FakeDb:
+    def __init__(self):
+        self.reads = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+async def fake_fetch_rows(query):
+    return query.rows()
+
+
+def aggregate(db=None):
+    return asyncio.run(shopping_list._aggregate(db or FakeDb(), USER, date(2026, 3, 2), date(2026, 3, 8), AUTH))
+
+
+_fetch_rows = shopping_list.fetch_rows
+
+
+def setup_function():
+    shopping_list.fetch_rows = fake_fetch_rows
+
+
+def teardown_function():
+    shopping_list.fetch_rows = _fetch_rows
+
+
+def test_totals_scale_with_how_often_a_recipe_is_planned():
+    items = aggregate()
+
+    assert [i["name"] for i in items] == ["egg", "flour"]
+    egg, flour = items
+    # 3 pancakes x 60g + 1 omelette x 120g
+    assert egg == {"ingredient_id": "i-egg", "name": "egg", "amount_g": 300.0, "meals": 4, "api_id": "1123", "image_url": "egg.jpg"}
+    # Both flour lines, on each of the 3 pancake days
+    assert flour["amount_g"] == 450.0
+
+
+def test_an_ingredient_listed_twice_counts_one_meal():
+    flour = aggregate()[1]
+    assert flour["meals"] == 3
+
+
+def test_plan_and_recipe_reads_are_paged_and_chunked():
+    page_size, chunk = shopping_list.PAGE_SIZE, shopping_list.RECIPE_CHUNK
+    shopping_list.PAGE_SIZE, shopping_list.RECIPE_CHUNK = 2, 1
+    try:
+        db = FakeDb()
+        items = aggregate(db)
+    finally:
+        shopping_list.PAGE_SIZE, shopping_list.RECIPE_CHUNK = page_size, chunk
+
+    assert [(i["name"], i["amount_g"], i["meals"]) for i in items] == [("egg", 300.0, 4), ("flour", 450.0, 3)]
+    # 4 plans in the range over pages of 2 (+ look-ahead), then one read per recipe
+    assert db.reads == ["meal_plans", "meal_plans", "recipe_ingredients", "recipe_ingredients"]
+
+
+def test_nothing_planned():
+    items = asyncio.run(shopping_list._aggregate(FakeDb(), USER, date(2026, 4, 1), date(2026, 4, 7), AUTH))
+    assert items == []
+
+
+def test_database_function_is_called_once_for_the_whole_list():
+    calls = []
+    rows = [{"ingredient_id": f"i{n:04d}", "name": f"item {n:04d}", "amount_g": n, "meals": 1} for n in range(2500)]
+
+    class FunctionQuery:
+        def __init__(self, fn, params):
+            self.fn, self.params, self.ordering = fn, params, []
+            calls.append(self)
+
+        def order(self, column, desc=False):
+            self.ordering.append(column)
+            return self
+
+        def rows(self):
+            return rows
+
+    original = shopping_list.authed_rpc
+    shopping_list.authed_rpc = lambda db, fn, params, authorization: FunctionQuery(fn, params)
+    try:
+        async def collect():
+            return [i async for i in shopping_list.iter_items(FakeDb(), USER, date(2026, 3, 2), date(2026, 3, 8), AUTH)]
+        items = asyncio.run(collect())
+    finally:
+        shopping_list.authed_rpc = original
+
+    # More rows than PAGE_SIZE, still a single aggregation
+    assert len(calls) == 1
+    assert calls[0].params == {"p_start": "2026-03-02", "p_end": "2026-03-08"}
+    assert calls[0].ordering == ["name", "ingredient_id"]
+    assert [i["ingredient_id"] for i in items] == [r["ingredient_id"] for r in rows]
+
+
+def test_missing_database_function_falls_back_to_aggregating():
+    def not_deployed():
+        raise APIError({"code": "PGRST202", "message": "Could not find the function"})
+
+    def missing_rpc(db, fn, params, authorization):
+        query = FakeQuery(db, "rpc")
+        query.rows = not_deployed
+        return query
+
+    original = shopping_list.authed_rpc
+    shopping_list.authed_rpc = missing_rpc
+    try:
+        async def collect():
+            return [i async for i in shopping_list.iter_items(FakeDb(), USER, date(2026, 3, 2), date(2026, 3, 8), AUTH)]
+        items = asyncio.run(collect())
+    finally:
+        shopping_list.authed_rpc = original
+
+    assert [(i["name"], i["amount_g"], i["meals"]) for i in items] == [("egg", 300.0, 4), ("flour", 450.0, 3)]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            setup_function()
+            fn()
+            teardown_function()
+            print(f"{name}: ok")
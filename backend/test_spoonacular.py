@@ -1,9 +1,12 @@
-from services.spoonacular_service import search_food
-import requests
 import os
 from dotenv import load_dotenv
 
+# Before the service imports: spoonacular_service reads SPOONACULAR_API_KEY at import
 load_dotenv()
+
+from services.spoonacular_service import search_food
+from services import http_client
+
 API_KEY = os.getenv("SPOONACULAR_API_KEY")
 BASE_URL = "https://api.spoonacular.com"
 
@@ -11,7 +14,7 @@ def test_single_endpoints():
     print("Testing Search...")
     search_url = f"{BASE_URL}/food/ingredients/search"
     params = {"apiKey": API_KEY, "query": "chicken", "number": 1}
-    res = requests.get(search_url, params=params)
+    res = http_client.get(search_url, params=params)
     print(f"Search Status: {res.status_code}")
     if res.status_code == 200:
         data = res.json()
@@ -23,7 +26,7 @@ def test_single_endpoints():
             print(f"Testing Info for {id}...")
             info_url = f"{BASE_URL}/food/ingredients/{id}/information"
             info_params = {"apiKey": API_KEY, "amount": 100, "unit": "g"}
-            res_info = requests.get(info_url, params=info_params)
+            res_info = http_client.get(info_url, params=info_params)
             print(f"Info Status: {res_info.status_code}")
             if res_info.status_code == 200:
                 print("Single Info Success")
@@ -36,7 +39,7 @@ def test_bulk_endpoint():
     # Trying the endpoint I used
     url = f"{BASE_URL}/food/ingredients/informationBulk"
     params = {"apiKey": API_KEY, "ids": "7961,4542", "amount": 100}
-    res = requests.get(url, params=params)
+    res = http_client.get(url, params=params)
     print(f"Bulk Status: {res.status_code}")
     if res.status_code != 200:
         print(f"Error: {res.text}")
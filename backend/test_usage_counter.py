@@ -0,0 +1,181 @@
+import asyncio
+import os
+from collections import Counter
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+
+import listing_cache
+import usage_counter
+
+ALICE, BOB = "11111111-1111-1111-1111-111111111111", "22222222-2222-2222-2222-222222222222"
+
+
+class FakeRpc:
+    def __init__(self, db, fn, params):
+        self.db, self.fn, self.params = db, fn, params
+        self.request = type("Request", (), {"headers": {}})()
+
+    async def execute(self):
+        self.db.calls.append((self.fn, self.params, self.request.headers.get("authorization")))
+        error = self.db.errors.get(self.fn)
+        if callable(error):
+            error = error(self.params)
+        if error is not None:
+            raise error
+
+
+class FakeDb:
+    """
+    Records the RPCs usage_counter sends; `errors` maps function name to what
+    it raises, or to a function of the params returning that (or None).
+    """
+
+    def __init__(self, **errors):
+        self.calls = []
+        self.errors = errors
+
+    def rpc(self, fn, params):
+        return FakeRpc(self, fn, params)
+
+    def batches(self):
+        return {auth: {c["recipe_id"]: c["n"] for c in params["p_counts"]}
+                for fn, params, auth in self.calls if fn == "increment_recipe_usage_batch"}
+
+
+def setup_function():
+    usage_counter._pending.clear()
+    usage_counter._pending_total = 0
+    usage_counter._task = None
+    usage_counter._wakeup = None
+    usage_counter._flushed = usage_counter._failed_flushes = usage_counter._dropped = 0
+
+
+def test_record_aggregates_per_user_and_keeps_the_latest_token():
+    usage_counter.record(ALICE, "r1", "Bearer a1")
+    usage_counter.record(ALICE, "r1", "Bearer a2")
+    usage_counter.record(ALICE, "r2", "Bearer a2", n=3)
+    usage_counter.record(BOB, "r1", "Bearer b")
+
+    assert usage_counter._pending[ALICE].counts == Counter({"r1": 2, "r2": 3})
+    assert usage_counter._pending[ALICE].authorization == "Bearer a2"
+    stats = usage_counter.stats()
+    assert (stats["pending"], stats["pending_users"]) == (6, 2)
+
+
+def test_flush_sends_one_batch_per_user_and_invalidates_listings():
+    usage_counter.record(ALICE, "r1", "Bearer a")
+    usage_counter.record(ALICE, "r1", "Bearer a")
+    usage_counter.record(BOB, "r2", "Bearer b")
+    version = listing_cache.version(ALICE)
+    db = FakeDb()
+
+    assert asyncio.run(usage_counter.flush(db)) == 3
+    assert db.batches() == {"Bearer a": {"r1": 2}, "Bearer b": {"r2": 1}}
+    assert listing_cache.version(ALICE) > version
+    assert usage_counter.stats()["pending"] == 0
+    assert usage_counter.stats()["flushed"] == 3
+    assert asyncio.run(usage_counter.flush(db)) == 0
+
+
+def test_flush_falls_back_to_one_call_per_use_without_the_batch_function():
+    usage_counter.record(ALICE, "r1", "Bearer a", n=2)
+    db = FakeDb(increment_recipe_usage_batch=Exception("PGRST202 Could not find the function"))
+
+    assert asyncio.run(usage_counter.flush(db)) == 2
+    single = [(params, auth) for fn, params, auth in db.calls if fn == "increment_recipe_usage"]
+    assert single == [({"row_id": "r1"}, "Bearer a")] * 2
+
+
+def test_fallback_only_retries_the_calls_that_failed():
+    usage_counter.record(ALICE, "r1", "Bearer a", n=2)
+    usage_counter.record(ALICE, "r2", "Bearer a", n=3)
+    version = listing_cache.version(ALICE)
+    db = FakeDb(
+        increment_recipe_usage_batch=Exception("PGRST202 Could not find the function"),
+        increment_recipe_usage=lambda params: Exception("timeout") if params["row_id"] == "r2" else None,
+    )
+
+    assert asyncio.run(usage_counter.flush(db)) == 2
+    assert usage_counter._pending[ALICE].counts == Counter({"r2": 3})
+    stats = usage_counter.stats()
+    assert (stats["pending"], stats["flushed"], stats["failed_flushes"]) == (3, 2, 1)
+    # r1 was written, so the listing order may have changed
+    assert listing_cache.version(ALICE) > version
+
+    db.errors["increment_recipe_usage"] = None
+    db.calls.clear()
+    assert asyncio.run(usage_counter.flush(db)) == 3
+    single = [params["row_id"] for fn, params, _ in db.calls if fn == "increment_recipe_usage"]
+    assert single == ["r2"] * 3
+
+
+def test_failed_flush_is_merged_back_with_newer_counts():
+    usage_counter.record(ALICE, "r1", "Bearer old", n=2)
+    assert asyncio.run(usage_counter.flush(FakeDb(increment_recipe_usage_batch=Exception("timeout")))) == 0
+    usage_counter.record(ALICE, "r1", "Bearer new")
+
+    assert usage_counter._pending[ALICE].counts == Counter({"r1": 3})
+    assert usage_counter.stats()["failed_flushes"] == 1
+    db = FakeDb()
+    assert asyncio.run(usage_counter.flush(db)) == 3
+    assert db.batches() == {"Bearer new": {"r1": 3}}
+
+
+def test_counts_are_dropped_after_repeated_failures():
+    usage_counter.record(ALICE, "r1", "Bearer a", n=4)
+    broken = FakeDb(increment_recipe_usage_batch=Exception("timeout"))
+    for _ in range(usage_counter.MAX_FAILED_FLUSHES):
+        asyncio.run(usage_counter.flush(broken))
+
+    stats = usage_counter.stats()
+    assert (stats["pending"], stats["dropped"]) == (0, 4)
+    assert stats["failed_flushes"] == usage_counter.MAX_FAILED_FLUSHES
+
+
+def test_middleware_flushes_when_no_flusher_runs():
+    db = FakeDb()
+
+    async def route(scope, receive, send):
+        usage_counter.record(ALICE, "r1", "Bearer a")
+
+    async def flush_with_fake(db_arg=None):
+        return await original(db)
+
+    original, usage_counter.flush = usage_counter.flush, flush_with_fake
+    try:
+        app = usage_counter.FlushMiddleware(route)
+        asyncio.run(app({"type": "http"}, None, None))
+    finally:
+        usage_counter.flush = original
+
+    assert db.batches() == {"Bearer a": {"r1": 1}}
+    assert usage_counter.stats()["pending"] == 0
+
+
+def test_middleware_leaves_counts_to_a_running_flusher():
+    async def route(scope, receive, send):
+        usage_counter.record(ALICE, "r1", "Bearer a")
+
+    async def run():
+        usage_counter.start()
+        try:
+            await usage_counter.FlushMiddleware(route)({"type": "http"}, None, None)
+            return usage_counter.stats()["pending"]
+        finally:
+            usage_counter._task.cancel()
+
+    original = usage_counter.FLUSH_PER_REQUEST
+    usage_counter.FLUSH_PER_REQUEST = False
+    try:
+        assert asyncio.run(run()) == 1
+    finally:
+        usage_counter.FLUSH_PER_REQUEST = original
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            setup_function()
+            fn()
+            print(f"{name}: ok")
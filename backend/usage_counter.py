@@ -0,0 +1,221 @@
+import asyncio
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+
+import listing_cache
+
+# Write-behind aggregation of recipe usage_count increments.
+#
+# Scheduling a meal used to run increment_recipe_usage inline and drop the
+# count on any error. Now routes call `record()`, which only bumps an
+# in-memory counter, and a background task flushes the counters every
+# USAGE_FLUSH_INTERVAL_S (or sooner once USAGE_FLUSH_SIZE increments are
+# pending) as one increment_recipe_usage_batch RPC per user. Each user's batch
+# is sent with the token from their latest request, so the update still runs
+# under their RLS. A failed batch is merged back and retried on the next flush,
+# up to MAX_FAILED_FLUSHES times. Pending counts are flushed on shutdown.
+#
+# Serverless instances (Vercel) may be frozen or recycled between requests,
+# and counts still in memory then would be lost. FlushMiddleware therefore
+# flushes at the end of each request when no lifespan flusher runs on the
+# loop, or always with USAGE_FLUSH_PER_REQUEST (default on when VERCEL is set).
+
+FLUSH_INTERVAL_S = float(os.getenv("USAGE_FLUSH_INTERVAL_S", "5"))
+FLUSH_SIZE = int(os.getenv("USAGE_FLUSH_SIZE", "100"))
+FLUSH_PER_REQUEST = os.getenv("USAGE_FLUSH_PER_REQUEST", "true" if os.getenv("VERCEL") else "false").lower() == "true"
+MAX_FAILED_FLUSHES = 10
+
+
+class _UserDeltas:
+    def __init__(self, authorization: str):
+        self.counts: Counter = Counter()
+        self.authorization = authorization
+        self.failures = 0
+
+
+class _PartialFlush(Exception):
+    """Some of the one-call-per-use fallback calls failed; `failed` counts those per recipe."""
+
+    def __init__(self, failed: Counter, cause: BaseException):
+        super().__init__(f"{sum(failed.values())} increments failed, first: {cause}")
+        self.failed = failed
+
+
+_pending: Dict[str, _UserDeltas] = {}
+_pending_total = 0
+_lock = threading.Lock()
+_wakeup: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+_flushed = 0
+_failed_flushes = 0
+_dropped = 0
+
+
+def record(user_id: Any, recipe_id: Any, authorization: str, n: int = 1) -> None:
+    """Counts `n` uses of a recipe; the database is updated on the next flush."""
+    global _pending_total
+    user = str(user_id)
+    with _lock:
+        deltas = _pending.get(user)
+        if deltas is None:
+            deltas = _pending[user] = _UserDeltas(authorization)
+        deltas.authorization = authorization
+        deltas.counts[str(recipe_id)] += n
+        _pending_total += n
+        full = _pending_total >= FLUSH_SIZE
+
+    # Without a lifespan flusher, FlushMiddleware writes at the end of the request
+    if full and running():
+        _wakeup.set()
+
+
+async def _flush_user(db, user_id: str, deltas: _UserDeltas) -> None:
+    from db import authed_rpc
+    counts = [{"recipe_id": recipe_id, "n": n} for recipe_id, n in deltas.counts.items()]
+    try:
+        await authed_rpc(db, "increment_recipe_usage_batch", {"p_counts": counts}, deltas.authorization).execute()
+    except Exception as e:
+        # PGRST202: batch function not deployed yet, fall back to one call per use
+        if "PGRST202" not in str(e):
+            raise
+        uses = [c["recipe_id"] for c in counts for _ in range(c["n"])]
+        results = await asyncio.gather(*(
+            authed_rpc(db, "increment_recipe_usage", {"row_id": recipe_id}, deltas.authorization).execute()
+            for recipe_id in uses
+        ), return_exceptions=True)
+        # Those that went through are written; only the rest may be retried
+        errors = [(recipe_id, r) for recipe_id, r in zip(uses, results) if isinstance(r, BaseException)]
+        if errors:
+            raise _PartialFlush(Counter(recipe_id for recipe_id, _ in errors), errors[0][1])
+
+
+def _restore(user_id: str, deltas: _UserDeltas) -> None:
+    global _pending_total, _dropped
+    deltas.failures += 1
+    if deltas.failures >= MAX_FAILED_FLUSHES:
+        with _lock:
+            _dropped += sum(deltas.counts.values())
+        print(f"Dropping usage counts for user {user_id} after {deltas.failures} failed flushes")
+        return
+    with _lock:
+        current = _pending.get(user_id)
+        if current is None:
+            _pending[user_id] = deltas
+        else:
+            # Newer increments arrived meanwhile; keep their token
+            current.counts.update(deltas.counts)
+            current.failures = max(current.failures, deltas.failures)
+        _pending_total += sum(deltas.counts.values())
+
+
+async def flush(db=None) -> int:
+    """Sends every pending increment now; returns how many were written."""
+    global _pending, _pending_total, _flushed, _failed_flushes
+    with _lock:
+        batch, _pending, _pending_total = _pending, {}, 0
+    if not batch:
+        return 0
+
+    if db is None:
+        from db import get_async_supabase
+        db = await get_async_supabase()
+
+    results = await asyncio.gather(
+        *(_flush_user(db, user_id, deltas) for user_id, deltas in batch.items()),
+        return_exceptions=True,
+    )
+    written = 0
+    for (user_id, deltas), result in zip(batch.items(), results):
+        if isinstance(result, BaseException):
+            _failed_flushes += 1
+            print(f"Error flushing usage counts for user {user_id}: {result}")
+            if not isinstance(result, _PartialFlush):
+                _restore(user_id, deltas)
+                continue
+            sent = sum(deltas.counts.values())
+            deltas.counts = result.failed
+            _restore(user_id, deltas)
+            written += sent - sum(result.failed.values())
+        else:
+            written += sum(deltas.counts.values())
+        # usage_count orders the recipe listing
+        listing_cache.invalidate(user_id, listing_cache.RECIPES, listing_cache.MEAL_PLANS)
+    _flushed += written
+    return written
+
+
+async def _run(wakeup: asyncio.Event) -> None:
+    while True:
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=FLUSH_INTERVAL_S)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
+        try:
+            await flush()
+        except Exception as e:
+            print(f"Usage counter flush error: {e}")
+
+
+def running() -> bool:
+    """Whether the periodic flusher runs on the current event loop."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return _task is not None and not _task.done() and _task.get_loop() is loop
+
+
+def start() -> None:
+    """Starts the periodic flusher on the running event loop."""
+    global _task, _wakeup
+    loop = asyncio.get_running_loop()
+    if _task is not None and not _task.done() and _task.get_loop() is loop:
+        return
+    _wakeup = asyncio.Event()
+    _task = loop.create_task(_run(_wakeup), name="usage-counter-flush")
+
+
+async def stop() -> None:
+    """Stops the flusher and writes whatever is still pending."""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    await flush()
+
+
+class FlushMiddleware:
+    """ASGI middleware: writes pending counts before a request returns unless a flusher will."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if scope["type"] == "http" and _pending_total and (FLUSH_PER_REQUEST or not running()):
+                try:
+                    await flush()
+                except Exception as e:
+                    print(f"Usage counter flush error: {e}")
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        pending = _pending_total
+        users = len(_pending)
+    return {
+        "pending": pending,
+        "pending_users": users,
+        "flushed": _flushed,
+        "failed_flushes": _failed_flushes,
+        "dropped": _dropped,
+    }
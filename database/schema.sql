@@ -54,3 +54,247 @@ create policy "Users can update their own meal plans" on public.meal_plans
 
 create policy "Users can delete their own meal plans" on public.meal_plans
   for delete using (auth.uid() = user_id);
+
+-- Shared ingredient cache (per-gram macros resolved from Spoonacular)
+create table if not exists public.ingredients (
+  id uuid default gen_random_uuid() primary key,
+  api_id text,
+  name text not null,
+  calories_per_g float default 0,
+  protein_per_g float default 0,
+  image_url text,
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+create table if not exists public.recipe_ingredients (
+  recipe_id uuid references public.recipes on delete cascade not null,
+  ingredient_id uuid references public.ingredients not null,
+  amount_g float not null
+);
+
+-- The old insert path could store one api_id several times. Keep the oldest
+-- row per api_id, point recipe links at it and delete the rest, so the
+-- unique index below can be built on existing databases.
+with dupes as (
+  select id, first_value(id) over (partition by api_id order by created_at, id) as keep_id
+  from public.ingredients
+  where api_id is not null
+)
+update public.recipe_ingredients ri
+set ingredient_id = d.keep_id
+from dupes d
+where ri.ingredient_id = d.id and d.id <> d.keep_id;
+
+delete from public.ingredients i
+using (
+  select id, first_value(id) over (partition by api_id order by created_at, id) as keep_id
+  from public.ingredients
+  where api_id is not null
+) d
+where i.id = d.id and d.id <> d.keep_id;
+
+-- One row per Spoonacular id, so the backend can write through with
+-- `upsert(on_conflict=api_id)`. NULL api_ids (custom ingredients) are exempt.
+create unique index if not exists ingredients_api_id_key on public.ingredients (api_id);
+
+-- GET /api/recipes/ingredients?q= filters with name ILIKE '%q%'; a trigram
+-- index keeps that from scanning the whole shared table.
+create extension if not exists pg_trgm;
+create index if not exists ingredients_name_trgm_idx on public.ingredients using gin (name gin_trgm_ops);
+
+-- Applies an ingredient diff computed by update_recipe in one transaction.
+-- Runs as the caller, so recipes/recipe_ingredients RLS still applies.
+create or replace function public.apply_recipe_ingredient_diff(
+  p_recipe_id uuid,
+  p_deletes uuid[],
+  p_updates jsonb,
+  p_inserts jsonb
+) returns void
+language plpgsql
+as $$
+begin
+  if not exists (select 1 from public.recipes where id = p_recipe_id and user_id = auth.uid()) then
+    raise exception 'Recipe not found' using errcode = 'P0002';
+  end if;
+
+  delete from public.recipe_ingredients
+  where recipe_id = p_recipe_id and ingredient_id = any(p_deletes);
+
+  update public.recipe_ingredients ri
+  set amount_g = (u->>'amount_g')::float
+  from jsonb_array_elements(p_updates) u
+  where ri.recipe_id = p_recipe_id and ri.ingredient_id = (u->>'ingredient_id')::uuid;
+
+  insert into public.recipe_ingredients (recipe_id, ingredient_id, amount_g)
+  select p_recipe_id, (i->>'ingredient_id')::uuid, (i->>'amount_g')::float
+  from jsonb_array_elements(p_inserts) i;
+end;
+$$;
+
+-- Keyset pagination: GET /api/recipes pages by (usage_count desc, id) within a
+-- user, GET /api/recipes/ingredients by (name, id). Cursors need non-null keys.
+update public.recipes set usage_count = 0 where usage_count is null;
+alter table public.recipes alter column usage_count set not null;
+create index if not exists recipes_user_usage_id_idx on public.recipes (user_id, usage_count desc, id);
+create index if not exists ingredients_name_id_idx on public.ingredients (name, id);
+
+-- Bulk scheduling for POST /api/meal-plans/bulk: one insert, one usage_count
+-- update per distinct recipe, all in one transaction. Runs as the caller, so
+-- RLS still applies; returns the new meal plan ids.
+create or replace function public.schedule_meal_plans(p_items jsonb)
+returns setof uuid
+language plpgsql
+as $$
+begin
+  return query
+  with inserted as (
+    insert into public.meal_plans (user_id, date, meal_type, recipe_id)
+    select auth.uid(), (i->>'date')::date, i->>'meal_type', (i->>'recipe_id')::uuid
+    from jsonb_array_elements(p_items) i
+    returning id, recipe_id
+  ), usage as (
+    update public.recipes r
+    set usage_count = r.usage_count + u.n
+    from (select recipe_id, count(*) as n from inserted group by recipe_id) u
+    where r.id = u.recipe_id
+  )
+  select id from inserted;
+end;
+$$;
+
+-- POST /api/meal-plans/copy-week: copies p_days days of the caller's plans
+-- starting at p_from to the same weekdays starting at p_to, optionally
+-- clearing the target range first. One transaction; returns the new ids.
+create or replace function public.copy_meal_plan_week(
+  p_from date,
+  p_to date,
+  p_days integer default 7,
+  p_replace boolean default false
+) returns setof uuid
+language plpgsql
+as $$
+declare
+  v_items jsonb;
+begin
+  -- Read the source first, in case it overlaps the range being replaced
+  select coalesce(jsonb_agg(jsonb_build_object(
+    'date', m.date + (p_to - p_from),
+    'meal_type', m.meal_type,
+    'recipe_id', m.recipe_id
+  )), '[]'::jsonb)
+  into v_items
+  from public.meal_plans m
+  where m.user_id = auth.uid() and m.date >= p_from and m.date < p_from + p_days;
+
+  if p_replace then
+    delete from public.meal_plans
+    where user_id = auth.uid() and date >= p_to and date < p_to + p_days;
+  end if;
+
+  return query select * from public.schedule_meal_plans(v_items);
+end;
+$$;
+
+-- Batched usage_count increments from the backend's write-behind counter:
+-- p_counts is [{"recipe_id": ..., "n": ...}]. Runs as the caller, so only
+-- their own recipes are updated.
+create or replace function public.increment_recipe_usage_batch(p_counts jsonb)
+returns void
+language sql
+as $$
+  update public.recipes r
+  set usage_count = r.usage_count + (c->>'n')::integer
+  from jsonb_array_elements(p_counts) c
+  where r.id = (c->>'recipe_id')::uuid;
+$$;
+
+-- GET /api/meal-plans/shopping-list: grams of each ingredient needed for the
+-- caller's meal plans in [p_start, p_end], one row per ingredient. The API
+-- calls it once, ordered by (name, ingredient_id); a cursor per page would
+-- re-run the aggregation for each one. Runs as the caller, so only their own
+-- plans are summed.
+create index if not exists meal_plans_user_date_idx on public.meal_plans (user_id, date);
+create index if not exists recipe_ingredients_recipe_id_idx on public.recipe_ingredients (recipe_id);
+
+create or replace function public.meal_plan_shopping_list(p_start date, p_end date)
+returns table (
+  ingredient_id uuid,
+  name text,
+  api_id text,
+  image_url text,
+  amount_g double precision,
+  meals bigint
+)
+language sql stable
+as $$
+  select i.id, i.name, i.api_id, i.image_url, sum(ri.amount_g), count(distinct m.id)
+  from public.meal_plans m
+  join public.recipe_ingredients ri on ri.recipe_id = m.recipe_id
+  join public.ingredients i on i.id = ri.ingredient_id
+  where m.user_id = auth.uid()
+    and m.date between p_start and p_end
+  group by i.id;
+$$;
+
+-- Per-user data version behind the API's listing cache. Triggers bump it on
+-- every change to a user's recipes, their ingredient links and meal plans,
+-- so each API instance can tell whether a cached listing is still current,
+-- whichever instance made the write.
+create table if not exists public.user_data_versions (
+  user_id uuid references auth.users on delete cascade primary key,
+  version bigint not null default 0
+);
+
+alter table public.user_data_versions enable row level security;
+
+create policy "Users can select their own data version" on public.user_data_versions
+  for select using (auth.uid() = user_id);
+
+-- Runs as the table owner: users cannot write their version row directly.
+create or replace function public.bump_user_data_version()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_user uuid;
+  v_row record;
+begin
+  v_row := case when tg_op = 'DELETE' then old else new end;
+  if tg_table_name = 'recipe_ingredients' then
+    select r.user_id into v_user from public.recipes r where r.id = v_row.recipe_id;
+  else
+    v_user := v_row.user_id;
+  end if;
+  -- A recipe deleted with its links is bumped by the recipes trigger
+  if v_user is not null then
+    insert into public.user_data_versions (user_id, version) values (v_user, 1)
+    on conflict (user_id) do update set version = public.user_data_versions.version + 1;
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists recipes_bump_user_data_version on public.recipes;
+create trigger recipes_bump_user_data_version
+  after insert or update or delete on public.recipes
+  for each row execute function public.bump_user_data_version();
+
+drop trigger if exists recipe_ingredients_bump_user_data_version on public.recipe_ingredients;
+create trigger recipe_ingredients_bump_user_data_version
+  after insert or update or delete on public.recipe_ingredients
+  for each row execute function public.bump_user_data_version();
+
+drop trigger if exists meal_plans_bump_user_data_version on public.meal_plans;
+create trigger meal_plans_bump_user_data_version
+  after insert or update or delete on public.meal_plans
+  for each row execute function public.bump_user_data_version();
+
+-- The caller's current data version (0 before their first write).
+create or replace function public.user_data_version()
+returns bigint
+language sql stable
+as $$
+  select coalesce((select version from public.user_data_versions where user_id = auth.uid()), 0);
+$$;
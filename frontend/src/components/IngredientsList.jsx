@@ -1,19 +1,32 @@
-import { useState } from 'react'
-import { useQuery } from '@tanstack/react-query'
+import { useEffect, useState } from 'react'
+import { useInfiniteQuery, keepPreviousData } from '@tanstack/react-query'
 import { api } from '../lib/api'
 import { Search, Beef, AlertCircle } from 'lucide-react'
 
 export default function IngredientsList() {
     const [searchQuery, setSearchQuery] = useState('')
+    const [filter, setFilter] = useState('')
 
-    const { data: ingredients = [], isLoading, error } = useQuery({
-        queryKey: ['ingredients'],
-        queryFn: () => api.get('/recipes/ingredients'),
-    })
+    // Debounce the filter so typing does not start a query per keystroke
+    useEffect(() => {
+        const delayDebounceFn = setTimeout(() => setFilter(searchQuery.trim()), 300)
+        return () => clearTimeout(delayDebounceFn)
+    }, [searchQuery])
 
-    const filteredIngredients = ingredients.filter(ing => 
-        ing.name.toLowerCase().includes(searchQuery.toLowerCase())
-    )
+    // The ingredient table is shared and unbounded, so load it a page at a
+    // time; the filter runs on the server so it covers every page
+    const { data, isLoading, error, fetchNextPage, hasNextPage, isFetchingNextPage } = useInfiniteQuery({
+        queryKey: ['ingredients', filter],
+        queryFn: ({ pageParam }) => api.getPage(
+            filter ? `/recipes/ingredients?q=${encodeURIComponent(filter)}` : '/recipes/ingredients',
+            pageParam,
+        ),
+        initialPageParam: null,
+        getNextPageParam: (lastPage) => lastPage.nextCursor || undefined,
+        // Keep showing the previous results (and the search box) while a new filter loads
+        placeholderData: keepPreviousData,
+    })
+    const filteredIngredients = data ? data.pages.flatMap(page => page.body) : []
 
     if (isLoading) {
         return (
@@ -80,12 +93,22 @@ export default function IngredientsList() {
                     </div>
                 ))}
 
-                {filteredIngredients.length === 0 && (
+                {filteredIngredients.length === 0 && !hasNextPage && (
                     <div className="col-span-full text-center py-12 text-gray-400">
                         No ingredients found matching "{searchQuery}"
                     </div>
                 )}
             </div>
+
+            {hasNextPage && (
+                <button
+                    onClick={() => fetchNextPage()}
+                    disabled={isFetchingNextPage}
+                    className="w-full py-3 rounded-xl bg-gray-100 dark:bg-gray-700 font-bold text-gray-600 dark:text-gray-300 hover:bg-gray-200 dark:hover:bg-gray-600 transition-colors disabled:opacity-50"
+                >
+                    {isFetchingNextPage ? 'Loading...' : 'Load more'}
+                </button>
+            )}
         </div>
     )
 }
@@ -31,9 +31,10 @@ export default function Planner() {
   })
 
   // 2. Fetch Recipes (Shared Cache!)
+  // The picker only shows names and calories, so skip the ingredient join
   const { data: recipes = [] } = useQuery({
-      queryKey: ['recipes'],
-      queryFn: () => api.get('/recipes/'),
+      queryKey: ['recipes', 'picker'],
+      queryFn: () => api.getAll('/recipes/?fields=name,calories_per_serving&limit=500'),
       staleTime: 1000 * 60 * 5,
   })
 
@@ -121,7 +122,7 @@ export default function Planner() {
                                         {meals.map(meal => (
                                             <div 
                                                 key={meal.id}
-                                                onClick={() => setSelectedRecipeForView(recipes.find(r => r.id === meal.recipe.id))}
+                                                onClick={() => setSelectedRecipeForView(meal.recipe)}
                                                 className="group relative bg-orange-50 dark:bg-orange-900/20 border border-orange-100 dark:border-orange-900/30 p-2 rounded-lg text-sm cursor-pointer hover:bg-orange-100 dark:hover:bg-orange-900/30 transition-colors"
                                             >
                                                 <div className="font-medium text-orange-900 dark:text-orange-100 line-clamp-2 pr-4 text-xs">
@@ -33,7 +33,7 @@ export default function RecipeList() {
   // 1. Fetch Recipes with Caching
   const { data: recipes = [], isLoading, error } = useQuery({
       queryKey: ['recipes'],
-      queryFn: () => api.get('/recipes/'),
+      queryFn: () => api.getAll('/recipes/'),
       staleTime: 1000 * 60 * 5, // Cache for 5 minutes
   })
 
@@ -12,18 +12,69 @@ async function getHeaders() {
   }
 }
 
+// Last body + ETag (+ next-page cursor) per GET endpoint, so unchanged
+// listings come back as 304
+const etagCache = new Map()
+const ETAG_CACHE_SIZE = 50
+
+function rememberEtag(key, entry) {
+  etagCache.delete(key)
+  etagCache.set(key, entry)
+  if (etagCache.size > ETAG_CACHE_SIZE) {
+    etagCache.delete(etagCache.keys().next().value)
+  }
+}
+
+async function getPage(endpoint) {
+  const headers = await getHeaders()
+  // ETags name the user's data version on the server, so entries are kept
+  // per user rather than per token and survive token refreshes
+  const { data: { session } } = await supabase.auth.getSession()
+  const key = `${session?.user?.id ?? ''}|${endpoint}`
+  const cached = etagCache.get(key)
+  if (cached) headers['If-None-Match'] = cached.etag
+
+  const response = await fetch(`${API_URL}${endpoint}`, { headers })
+  if (response.status === 304 && cached) {
+      return cached
+  }
+  if (!response.ok) {
+      const errorText = await response.text()
+      console.error('API Get Error:', response.status, errorText)
+      throw new Error(`API Error: ${response.status} ${errorText}`)
+  }
+  const page = {
+      body: await response.json(),
+      nextCursor: response.headers.get('X-Next-Cursor'),
+      etag: response.headers.get('ETag'),
+  }
+  if (page.etag) rememberEtag(key, page)
+  return page
+}
+
+function withCursor(endpoint, cursor) {
+  if (!cursor) return endpoint
+  return `${endpoint}${endpoint.includes('?') ? '&' : '?'}cursor=${encodeURIComponent(cursor)}`
+}
+
 export const api = {
-  get: async (endpoint) => {
-    const headers = await getHeaders()
-    const response = await fetch(`${API_URL}${endpoint}`, { headers })
-    if (!response.ok) {
-        const errorText = await response.text()
-        console.error('API Get Error:', response.status, errorText)
-        throw new Error(`API Error: ${response.status} ${errorText}`)
-    }
-    return response.json()
+  get: async (endpoint) => (await getPage(endpoint)).body,
+
+  // One page of a keyset-paginated list: { body, nextCursor }
+  getPage: (endpoint, cursor) => getPage(withCursor(endpoint, cursor)),
+
+  // Follows X-Next-Cursor until the list is exhausted
+  getAll: async (endpoint) => {
+    const rows = []
+    let cursor = null
+    do {
+        const page = await getPage(withCursor(endpoint, cursor))
+        rows.push(...page.body)
+        cursor = page.nextCursor
+    } while (cursor)
+    return rows
   },
-  
+
   post: async (endpoint, body) => {
     const headers = await getHeaders()
     let requestBody = body